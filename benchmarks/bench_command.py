@@ -0,0 +1,110 @@
+# -*- coding: utf8 -*-
+"""PDU encode/decode throughput of every command
+
+Usage: PYTHONPATH=. python benchmarks/bench_command.py
+"""
+
+from __future__ import print_function
+
+import timeit
+
+from smpplib import command, consts, relay, smpp
+
+# Realistic parameters of every command in command.COMMANDS.
+PARAMS = {
+    'bind_transmitter': dict(system_id='smppclient1', password='password', system_type='CMT',
+                             interface_version=0x34),
+    'bind_transmitter_resp': dict(system_id='SMSC', sc_interface_version=0x34),
+    'bind_receiver': dict(system_id='smppclient1', password='password', interface_version=0x34),
+    'bind_receiver_resp': dict(system_id='SMSC', sc_interface_version=0x34),
+    'bind_transceiver': dict(system_id='smppclient1', password='password', interface_version=0x34),
+    'bind_transceiver_resp': dict(system_id='SMSC', sc_interface_version=0x34),
+    'data_sm': dict(
+        source_addr_ton=consts.SMPP_TON_ALNUM, source_addr='Sender', dest_addr_ton=consts.SMPP_TON_INTL,
+        dest_addr_npi=consts.SMPP_NPI_ISDN, destination_addr='447700900123', registered_delivery=1,
+        data_coding=consts.SMPP_ENCODING_DEFAULT, message_payload=b'Your order has shipped' * 5,
+        user_message_reference=42, source_port=1000, destination_port=2000),
+    'data_sm_resp': dict(message_id='a1b2c3d4e5f6'),
+    'generic_nack': dict(status=consts.SMPP_ESME_RINVCMDID),
+    'submit_sm': dict(
+        source_addr_ton=consts.SMPP_TON_ALNUM, source_addr='Sender', dest_addr_ton=consts.SMPP_TON_INTL,
+        dest_addr_npi=consts.SMPP_NPI_ISDN, destination_addr='447700900123', esm_class=consts.SMPP_GSMFEAT_UDHI,
+        registered_delivery=1, data_coding=consts.SMPP_ENCODING_DEFAULT,
+        short_message=b'\x05\x00\x03\x42\x02\x01' + b'Lorem ipsum dolor sit amet ' * 5,
+        user_message_reference=42, sar_msg_ref_num=7, sar_total_segments=2, sar_segment_seqnum=1),
+    'submit_sm_resp': dict(message_id='a1b2c3d4e5f6'),
+    'submit_multi': dict(
+        source_addr_ton=consts.SMPP_TON_ALNUM, source_addr='Sender',
+        dest_address=command.make_dest_address(['4477009001%02d' % i for i in range(10)] + [u'friends'],
+                                               consts.SMPP_TON_INTL, consts.SMPP_NPI_ISDN),
+        registered_delivery=1, short_message=b'Meeting moved to 3pm', user_message_reference=42),
+    'submit_multi_resp': dict(message_id='a1b2c3d4e5f6', unsuccess_sme=[
+        command.UnsuccessSME(consts.SMPP_TON_INTL, consts.SMPP_NPI_ISDN, '447700900100', consts.SMPP_ESME_RINVDSTADR),
+    ]),
+    'deliver_sm': dict(
+        source_addr_ton=consts.SMPP_TON_INTL, source_addr='447700900123', destination_addr='Sender',
+        esm_class=consts.SMPP_MSGTYPE_DEFAULT | 0x04, data_coding=consts.SMPP_ENCODING_DEFAULT,
+        short_message=b'id:a1b2c3d4e5f6 sub:001 dlvrd:001 submit date:2401011200 done date:2401011201 '
+                      b'stat:DELIVRD err:000 text:Lorem ipsum',
+        receipted_message_id='a1b2c3d4e5f6', message_state=2, network_error_code=b'\x03\x00\x00',
+        user_message_reference=42),
+    'deliver_sm_resp': dict(),
+    'query_sm': dict(message_id='a1b2c3d4e5f6', source_addr_ton=consts.SMPP_TON_ALNUM, source_addr='Sender'),
+    'query_sm_resp': dict(message_id='a1b2c3d4e5f6', final_date='240101120100000+', message_state=2,
+                          error_code=0),
+    'unbind': dict(),
+    'unbind_resp': dict(),
+    'enquire_link': dict(),
+    'enquire_link_resp': dict(),
+    'alert_notification': dict(source_addr_ton=consts.SMPP_TON_INTL, source_addr='447700900123',
+                               esme_addr='Sender', ms_availability_status=0),
+}
+
+# deliver_sm optional parameters, the way some SMSCs pile them up on receipts.
+MANY_TLVS = dict(
+    user_message_reference=42, source_port=1000, destination_port=2000, sar_msg_ref_num=7,
+    sar_total_segments=3, sar_segment_seqnum=2, user_response_code=1, privacy_indicator=0,
+    payload_type=0, callback_num=b'\x01\x01447700900123', source_subaddress='abc',
+    dest_subaddress='def', language_indicator=1, its_session_info=0x0102,
+    network_error_code=b'\x03\x00\x00', message_state=2, receipted_message_id='a1b2c3d4e5f6',
+)
+
+
+def _make_pdu(command_name):
+    p = smpp.make_pdu(command_name, **PARAMS[command_name])
+    p.sequence = 1
+    return p
+
+
+def benchmarks():
+    """Return a list of (name, function) pairs"""
+    result = []
+    for command_name in sorted(command.COMMANDS):
+        raw = _make_pdu(command_name).generate()
+        result.append(('command encode %s' % command_name,
+                       lambda command_name=command_name: _make_pdu(command_name).generate()))
+        result.append(('command decode %s' % command_name,
+                       lambda raw=raw: smpp.parse_pdu(raw)))
+
+    p = smpp.make_pdu('deliver_sm', short_message=b'hi', **MANY_TLVS)
+    fixed = smpp.make_pdu('deliver_sm', short_message=b'hi').generate()
+    tlvs = p.generate()[len(fixed):]
+    result.append(('parse_optional_params %d TLVs' % len(MANY_TLVS),
+                   lambda: command.DeliverSM('deliver_sm').parse_optional_params(tlvs)))
+
+    # Header-only relaying, for comparison with decode + encode above.
+    raw = _make_pdu('submit_sm').generate()
+    mapper = relay.SequenceMapper()
+    result.append(('relay request+response submit_sm', lambda: mapper.response(mapper.request(raw))))
+    return result
+
+
+def main():
+    for name, func in benchmarks():
+        number = 2000
+        seconds = min(timeit.repeat(func, number=number, repeat=3))
+        print('%-40s %10.0f calls/s' % (name, number / seconds))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+# -*- coding: utf8 -*-
+"""End-to-end throughput against the local SMSC simulator
+
+Every run binds a number of transceivers, keeps up to a window of
+submit_sm in flight on each and reports messages per second, submit
+latency (send_message() to submit_sm_resp) and receipt latency
+(send_message() to the delivery receipt) percentiles. Runs sweep the
+cartesian product of --binds, --windows, --texts and --rtts.
+
+Both ends disable Nagle's algorithm (TCP_NODELAY); without it a window of
+small submit_sm waits on delayed ACKs and rtt=0 latencies read about 40 ms.
+
+Usage:
+    PYTHONPATH=. python benchmarks/bench_e2e.py --binds 1,4 --windows 1,10,100 --rtts 0,0.01 \\
+        --json results.json --csv results.csv
+"""
+
+from __future__ import print_function
+
+import argparse
+import csv
+import itertools
+import json
+import platform
+import socket
+import sys
+import threading
+import time
+
+from smpplib import consts, gsm, smpp
+from smpplib.client import Client
+from smpplib.metrics import Histogram, now_ns
+from smpplib.simulator import SMSCSimulator
+
+# (text, encoding); text outside the GSM alphabet goes as UCS-2.
+TEXTS = {
+    'gsm-short': (u'Your code is 123456', consts.SMPP_ENCODING_DEFAULT),
+    'gsm-long': (u'Your parcel arrives today between 10:00 and 12:00. ' * 4, consts.SMPP_ENCODING_DEFAULT),
+    'latin1-short': (u'Votre code est 123456', consts.SMPP_ENCODING_ISO88591),
+    'ucs2-short': (u'Ваш код 123456', consts.SMPP_ENCODING_DEFAULT),
+    'ucs2-long': (u'Ваша посылка прибудет сегодня с 10:00 до 12:00. ' * 4, consts.SMPP_ENCODING_DEFAULT),
+}
+
+FIELDS = (
+    'binds', 'window', 'text', 'rtt', 'messages', 'submits', 'seconds', 'messages_per_s', 'submits_per_s',
+    'submit_p50_ms', 'submit_p99_ms', 'receipt_p50_ms', 'receipt_p99_ms', 'errors',
+)
+
+
+class _NoDelayClient(Client):
+    """Client sending every PDU as soon as it is written"""
+
+    def _create_socket(self):
+        sock = super(_NoDelayClient, self)._create_socket()
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+
+class _Bind(object):
+    """One transceiver sending its share of messages with a fixed window
+
+    Every worker thread records into its own histograms, merged by run().
+    """
+
+    def __init__(self, address, window, text, encoding, messages):
+        self.client = _NoDelayClient(*address, timeout=30, allow_unknown_opt_params=True)
+        self.window = window
+        self.text = text
+        self.encoding = encoding
+        self.messages = messages
+        self.part_count = gsm.estimate_parts(text, encoding)[0]
+        self.submit_latency = Histogram()
+        self.receipt_latency = Histogram()
+        self.submits = 0
+        self.errors = 0
+        # sequence -> time sent of submit_sm awaiting submit_sm_resp
+        self._in_flight = {}
+        # message_id -> time sent of submit_sm awaiting a receipt
+        self._receipts = {}
+
+    def connect(self):
+        self.client.connect()
+        self.client.bind_transceiver(system_id='bench', password='bench')
+
+    def run(self):
+        client = self.client
+        sent = 0
+        while sent < self.messages or self._in_flight or self._receipts:
+            # A message goes only if all its parts fit, or alone if they never can.
+            if sent < self.messages and (
+                    not self._in_flight or len(self._in_flight) + self.part_count <= self.window):
+                start = now_ns()
+                for pdu in client.send_text(
+                        self.text, self.encoding, source_addr='Bench', destination_addr='447700900123',
+                        registered_delivery=1):
+                    self._in_flight[pdu.sequence] = start
+                sent += 1
+            else:
+                self._read()
+
+    def _read(self):
+        pdu = self.client.read_pdu()
+        now = now_ns()
+        if pdu.command == 'submit_sm_resp':
+            start = self._in_flight.pop(pdu.sequence)
+            self.submits += 1
+            self.submit_latency.record(now - start)
+            if pdu.is_error():
+                self.errors += 1
+            else:
+                self._receipts[pdu.message_id] = start
+        elif pdu.command == 'deliver_sm':
+            start = self._receipts.pop(pdu.receipted_message_id, None)
+            if start is not None:
+                self.receipt_latency.record(now - start)
+            resp = smpp.make_pdu('deliver_sm_resp', client=self.client)
+            resp.sequence = pdu.sequence
+            self.client.send_pdu(resp)
+
+    def close(self):
+        self.client.unbind()
+        self.client.disconnect()
+
+
+def run(binds, window, text_name, rtt, messages):
+    """Send messages over binds connections and return a result row"""
+    text, encoding = TEXTS[text_name]
+    # Every response and receipt is delayed by the whole round trip.
+    with SMSCSimulator(latency=rtt) as smsc:
+        workers = [
+            _Bind(smsc.address, window, text, encoding, messages // binds + (i < messages % binds))
+            for i in range(binds)
+        ]
+        for worker in workers:
+            worker.connect()
+        threads = [threading.Thread(target=worker.run) for worker in workers]
+
+        start = time.time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        seconds = time.time() - start
+
+        for worker in workers:
+            worker.close()
+
+    submit_latency = Histogram()
+    receipt_latency = Histogram()
+    for worker in workers:
+        submit_latency.merge(worker.submit_latency)
+        receipt_latency.merge(worker.receipt_latency)
+    submits = sum(worker.submits for worker in workers)
+    return dict(
+        binds=binds,
+        window=window,
+        text=text_name,
+        rtt=rtt,
+        messages=messages,
+        submits=submits,
+        seconds=round(seconds, 3),
+        messages_per_s=round(messages / seconds, 1),
+        submits_per_s=round(submits / seconds, 1),
+        submit_p50_ms=submit_latency.percentile(50) / 1e6,
+        submit_p99_ms=submit_latency.percentile(99) / 1e6,
+        receipt_p50_ms=receipt_latency.percentile(50) / 1e6,
+        receipt_p99_ms=receipt_latency.percentile(99) / 1e6,
+        errors=sum(worker.errors for worker in workers),
+    )
+
+
+def _list(kind):
+    return lambda value: [kind(item) for item in value.split(',')]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='End-to-end throughput against the local SMSC simulator')
+    parser.add_argument('--binds', type=_list(int), default=[1, 4], help='comma separated (default 1,4)')
+    parser.add_argument('--windows', type=_list(int), default=[1, 10, 100], help='comma separated (default 1,10,100)')
+    parser.add_argument('--texts', type=_list(str), default=['gsm-short', 'ucs2-long'],
+                        help='comma separated of %s (default gsm-short,ucs2-long)' % ', '.join(sorted(TEXTS)))
+    parser.add_argument('--rtts', type=_list(float), default=[0, 0.005],
+                        help='simulated round trip seconds, comma separated (default 0,0.005)')
+    parser.add_argument('--messages', type=int, default=2000, help='messages per run (default 2000)')
+    parser.add_argument('--json', help='write results to this JSON file')
+    parser.add_argument('--csv', help='write results to this CSV file')
+    args = parser.parse_args(argv)
+
+    rows = []
+    print(' '.join('%10s' % field[:10] for field in FIELDS), file=sys.stderr)
+    for binds, window, text_name, rtt in itertools.product(args.binds, args.windows, args.texts, args.rtts):
+        row = run(binds, window, text_name, rtt, args.messages)
+        rows.append(row)
+        print(' '.join('%10s' % row[field] for field in FIELDS), file=sys.stderr)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'implementation': platform.python_implementation(),
+                'machine': platform.machine(),
+                'results': rows,
+            }, f, indent=2, sort_keys=True)
+    if args.csv:
+        with open(args.csv, 'w') as f:
+            writer = csv.DictWriter(f, FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+if __name__ == '__main__':
+    main()
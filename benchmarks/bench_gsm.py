@@ -0,0 +1,87 @@
+# -*- coding: utf8 -*-
+"""GSM 7-bit codec and message splitting throughput
+
+Usage: PYTHONPATH=. python benchmarks/bench_gsm.py
+"""
+
+from __future__ import print_function
+
+import functools
+import timeit
+
+from smpplib import consts, gsm
+
+TEXTS = {
+    'short': u'Your code is 123456',
+    'long': u'Lorem ipsum dolor sit amet, {consectetur} adipiscing elit € ' * 20,
+}
+
+
+# make_parts() input in different alphabets, repeated for several lengths.
+ALPHABET_TEXTS = {
+    'gsm': u'Your parcel arrives today between 10:00 and 12:00. ',
+    'latin1': u'Votre colis arrive aujourd\'hui entre 10h et 12h. ',
+    'ucs2': u'Ваша посылка прибудет сегодня с 10:00 до 12:00. ',
+    'national': u'Kargonuz bugün 10:00 ile 12:00 arasında geliyor. ',
+}
+ALPHABET_ENCODINGS = {
+    'latin1': consts.SMPP_ENCODING_ISO88591,
+}
+
+
+def _cases():
+    """Return a list of (name, function, argument)"""
+    cache = gsm.PartsCache()
+    cases = []
+    for label, text in sorted(TEXTS.items()):
+        encoded = gsm.gsm_encode(text)
+        packed = gsm.gsm_pack(encoded)
+        cases.extend([
+            ('gsm_encode %s' % label, gsm.gsm_encode, text),
+            ('gsm_decode %s' % label, gsm.gsm_decode, encoded),
+            ('is_gsm_text %s' % label, gsm.is_gsm_text, text),
+            ('gsm_pack %s' % label, gsm.gsm_pack, encoded),
+            ('gsm_unpack %s' % label, gsm.gsm_unpack, packed),
+            ('make_parts %s' % label, gsm.make_parts, text),
+            ('estimate_parts %s' % label, gsm.estimate_parts, text),
+            ('make_parts cached %s' % label, lambda text: gsm.make_parts(text, cache=cache), text),
+            ('make_parts_batch %s' % label, gsm.make_parts_batch, [text] * 1000),
+        ])
+
+    for alphabet, text in sorted(ALPHABET_TEXTS.items()):
+        encoding = ALPHABET_ENCODINGS.get(alphabet, consts.SMPP_ENCODING_DEFAULT)
+        languages = [consts.SMPP_GSM_LANG_TURKISH] if alphabet == 'national' else []
+        for repeat in (1, 4, 16):
+            cases.append((
+                'make_parts %s %d chars' % (alphabet, len(text) * repeat),
+                lambda text, encoding=encoding, languages=languages: gsm.make_parts(
+                    text, encoding, national_languages=languages),
+                text * repeat,
+            ))
+    return cases
+
+
+def benchmarks():
+    """Return a list of (name, function) pairs"""
+    return [(name, functools.partial(func, arg)) for name, func, arg in _cases()]
+
+
+def bench(name, func, arg, number=20000):
+    if isinstance(arg, list):
+        number //= 1000
+    seconds = min(timeit.repeat(lambda: func(arg), number=number, repeat=3))
+    if isinstance(arg, list):
+        # Batch functions, count texts rather than calls.
+        number *= len(arg)
+        arg = arg[0]
+    print('%-32s %10.0f calls/s %12.0f chars/s' % (
+        name, number / seconds, number * len(arg) / seconds))
+
+
+def main():
+    for name, func, arg in _cases():
+        bench(name, func, arg)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+# -*- coding: utf8 -*-
+"""Memory footprint of PDU objects and make_parts() results
+
+Reports with tracemalloc the bytes kept alive per PDU constructed with
+make_pdu() and per PDU parsed with parse_pdu() for every command, per
+make_parts() result, and the peak of a table of in-flight submit_sm keyed
+by sequence number. The table is built with --in-flight-sample entries and
+scaled to --in-flight; make both equal to measure it exactly.
+
+With --budgets, a JSON file of {"python": ..., "count": ..., "in_flight":
+..., "budgets": {name: bytes}}, the measurements are made with the count and
+in_flight the budgets were set for; every result over its budget, and every
+budget no result has, is reported and the exit status is 1. Object sizes
+differ between interpreters, so budgets are refused unless "python" (such
+as "CPython 3.11") names the running one.
+
+Usage (Python 3 only):
+    PYTHONPATH=. python benchmarks/bench_memory.py --budgets benchmarks/memory_budgets.json
+"""
+
+from __future__ import print_function
+
+import argparse
+import gc
+import json
+import platform
+import sys
+import tracemalloc
+
+import bench_command
+import bench_gsm
+
+from smpplib import command, gsm, smpp
+
+
+def measure(factory, count):
+    """Return bytes kept alive per object returned by factory, averaged over count objects"""
+    gc.collect()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = [factory() for _ in range(count)]
+    size = tracemalloc.get_traced_memory()[0] - before - sys.getsizeof(objects)
+    del objects
+    return size / float(count)
+
+
+def in_flight_peak(entries):
+    """Return the peak bytes of a {sequence: SubmitSM} table with entries messages"""
+    parts = gsm.make_parts(bench_gsm.ALPHABET_TEXTS['gsm'])[0]
+    gc.collect()
+    tracemalloc.stop()
+    tracemalloc.start()
+    table = {}
+    for sequence in range(1, entries + 1):
+        p = smpp.make_pdu(
+            'submit_sm', source_addr='Sender', destination_addr='4477%08d' % sequence,
+            short_message=parts[0], registered_delivery=1)
+        p.sequence = sequence
+        table[sequence] = p
+    peak = tracemalloc.get_traced_memory()[1]
+    del table
+    return peak
+
+
+def run(count=1000, in_flight=1000000, in_flight_sample=100000):
+    """Return {name: bytes}"""
+    results = {}
+    tracemalloc.start()
+    try:
+        for name in sorted(command.COMMANDS):
+            params = bench_command.PARAMS[name]
+            raw = bench_command._make_pdu(name).generate()
+            results['make_pdu %s' % name] = measure(lambda: smpp.make_pdu(name, **params), count)
+            results['parse_pdu %s' % name] = measure(lambda: smpp.parse_pdu(raw), count)
+
+        for alphabet, text in sorted(bench_gsm.ALPHABET_TEXTS.items()):
+            for repeat in (1, 4):
+                results['make_parts %s %d chars' % (alphabet, len(text) * repeat)] = measure(
+                    lambda: gsm.make_parts(text * repeat), count)
+
+        sample = min(in_flight, in_flight_sample)
+        results['in-flight table %d' % in_flight] = in_flight_peak(sample) * in_flight // sample
+    finally:
+        tracemalloc.stop()
+    return results
+
+
+def interpreter():
+    """Return the implementation and major.minor version measured, e.g. 'CPython 3.11'"""
+    return '%s %d.%d' % ((platform.python_implementation(),) + tuple(sys.version_info[:2]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Memory footprint of PDU objects and make_parts() results')
+    parser.add_argument('--count', type=int, help='objects per measurement (default 1000)')
+    parser.add_argument('--in-flight', type=int, help='in-flight table size (default 1000000)')
+    parser.add_argument('--in-flight-sample', type=int, default=100000,
+                        help='in-flight entries actually built (default 100000)')
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--budgets', help='JSON file of {name: bytes} not to exceed')
+    args = parser.parse_args(argv)
+
+    budgets = None
+    if args.budgets:
+        with open(args.budgets) as f:
+            budgets = json.load(f)
+        if budgets.get('python') != interpreter():
+            parser.error('%s was measured on %s, not %s; measure new budgets with --output'
+                         % (args.budgets, budgets.get('python', 'an unknown interpreter'), interpreter()))
+        # Per-object averages shift with count, keep to what the budgets were set with.
+        for name in ('count', 'in_flight'):
+            if getattr(args, name) not in (None, budgets[name]):
+                parser.error('--%s must be %d, as in %s' % (name.replace('_', '-'), budgets[name], args.budgets))
+            setattr(args, name, budgets[name])
+    if args.count is None:
+        args.count = 1000
+    if args.in_flight is None:
+        args.in_flight = 1000000
+
+    results = run(args.count, args.in_flight, args.in_flight_sample)
+    for name, size in sorted(results.items()):
+        print('%-44s %14.0f bytes' % (name, size))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'unit': 'bytes', 'python': interpreter(), 'count': args.count, 'in_flight': args.in_flight,
+                       'results': results}, f, indent=2, sort_keys=True)
+
+    if budgets is not None:
+        failed = False
+        for name, budget in sorted(budgets['budgets'].items()):
+            if name not in results:
+                print('UNKNOWN BUDGET %s' % name, file=sys.stderr)
+                failed = True
+            elif results[name] > budget:
+                print('OVER BUDGET %-44s %12.0f > %12.0f bytes' % (name, results[name], budget), file=sys.stderr)
+                failed = True
+        if failed:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,50 @@
+"""Durable outbox throughput: put and commit, ack, and recovery
+
+Usage: PYTHONPATH=. python benchmarks/bench_outbox.py [DIRECTORY]
+
+DIRECTORY defaults to a temporary directory; pass one on the disk to
+measure.
+"""
+
+from __future__ import print_function
+
+import shutil
+import sys
+import tempfile
+import time
+
+from smpplib import smpp
+from smpplib.outbox import Outbox
+
+COUNT = 100000
+
+
+def main():
+    directory = tempfile.mkdtemp(dir=sys.argv[1] if len(sys.argv) > 1 else None)
+    try:
+        p = smpp.make_pdu('submit_sm', source_addr='Sender', destination_addr='447700900123',
+                          short_message=b'Your parcel arrives today between 10:00 and 12:00.')
+
+        outbox = Outbox(directory)
+        start = time.time()
+        for _ in range(COUNT):
+            outbox.put_pdu(p)
+        outbox.wait()
+        print('%-24s %10.0f entries/s' % ('put_pdu + commit', COUNT / (time.time() - start)))
+
+        start = time.time()
+        for entry_id in range(0, COUNT, 2):
+            outbox.ack(entry_id)
+        outbox.close()
+        print('%-24s %10.0f entries/s' % ('ack', COUNT / 2 / (time.time() - start)))
+
+        start = time.time()
+        outbox = Outbox(directory)
+        print('%-24s %10.0f entries/s' % ('recover', COUNT / (time.time() - start)))
+        outbox.close()
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
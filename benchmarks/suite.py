@@ -0,0 +1,103 @@
+"""Run all microbenchmarks, write JSON results and compare with a baseline
+
+Usage:
+    PYTHONPATH=. python benchmarks/suite.py --output results.json
+    PYTHONPATH=. python benchmarks/suite.py --baseline results.json --threshold 10
+
+Every benchmark is timed for at least --min-time seconds per round and
+the best of --repeat rounds is kept, as nanoseconds per call. With
+--baseline, benchmarks more than --threshold percent slower than the
+baseline are reported and the exit status is 1.
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import platform
+import sys
+import timeit
+
+import bench_command
+import bench_gsm
+
+MODULES = (bench_command, bench_gsm)
+
+
+def measure(func, min_time=0.1, repeat=5):
+    """Return the best time of func in nanoseconds per call"""
+    timer = timeit.Timer(func)
+    number = 1
+    while True:
+        seconds = timer.timeit(number)
+        if seconds >= min_time:
+            break
+        number *= 2 if seconds * 10 > min_time else 10
+    best = min([seconds] + timer.repeat(repeat - 1, number))
+    return best * 1e9 / number
+
+
+def run(name_filter=None, min_time=0.1, repeat=5):
+    """Return {name: nanoseconds per call} of all benchmarks matching name_filter"""
+    results = {}
+    for module in MODULES:
+        for name, func in module.benchmarks():
+            if name_filter and name_filter not in name:
+                continue
+            results[name] = measure(func, min_time, repeat)
+            print('%-44s %14.1f ns' % (name, results[name]), file=sys.stderr)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Return [(name, baseline ns, ns, change %)] of benchmarks slower than threshold percent"""
+    regressions = []
+    for name, ns in sorted(results.items()):
+        base = baseline.get(name)
+        if not base:
+            continue
+        change = (ns / base - 1) * 100
+        if change > threshold:
+            regressions.append((name, base, ns, change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--baseline', help='JSON results to compare with')
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help='fail on benchmarks slower than the baseline by this percent (default 10)')
+    parser.add_argument('--filter', help='only run benchmarks whose name contains this')
+    parser.add_argument('--min-time', type=float, default=0.1, help='seconds per round (default 0.1)')
+    parser.add_argument('--repeat', type=int, default=5, help='rounds, best is kept (default 5)')
+    args = parser.parse_args(argv)
+
+    results = run(args.filter, args.min_time, args.repeat)
+    document = {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'unit': 'ns/call',
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(document, f, indent=2, sort_keys=True)
+    else:
+        json.dump(document, sys.stdout, indent=2, sort_keys=True)
+        print()
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold)
+        for name, base, ns, change in regressions:
+            print('REGRESSION %-44s %12.1f -> %12.1f ns (+%.1f%%)' % (name, base, ns, change), file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
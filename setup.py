@@ -19,6 +19,7 @@ setup(
     install_requires=['six'],
     extras_require=dict(
         tests=('typing; python_version < "3.5"', 'pytest', 'mock'),
+        numpy=('numpy',),
     ),
     zip_safe=True,
     classifiers=(
@@ -16,4 +16,7 @@
 # License along with this library; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
 
-from smpplib import client, command, exceptions, pdu, smpp
+from smpplib import (
+    capture, client, command, exceptions, framer, metrics, outbox, pdu, profiling, reassembly, relay, session,
+    simulator, smpp,
+)
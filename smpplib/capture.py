@@ -0,0 +1,181 @@
+"""Recording and replaying SMPP traffic
+
+A capture file starts with MAGIC followed by one record per PDU:
+
+    length      4 bytes  -- length of the raw PDU
+    direction   1 byte   -- INBOUND or OUTBOUND
+    bind_id     2 bytes  -- connection the PDU belongs to
+    timestamp   8 bytes  -- nanoseconds since the epoch
+    raw PDU     length bytes
+
+all big endian. Pass a CaptureWriter to Client as capture=... to record
+everything it sends and reads; CaptureReader memory-maps a file and
+iterates it lazily, replay() sends recorded PDUs again.
+"""
+
+import collections
+import mmap
+import struct
+import threading
+import time
+
+from smpplib import exceptions, smpp
+
+MAGIC = b'SMPPCAP\x01'
+
+INBOUND = 0
+OUTBOUND = 1
+
+_record_header = struct.Struct('>LBHQ')
+
+
+class Record(collections.namedtuple('Record', 'timestamp direction bind_id data')):
+    """Captured PDU, timestamp in nanoseconds and data the raw PDU"""
+
+    __slots__ = ()
+
+    def parse(self, **kwargs):
+        """Return the PDU, kwargs are passed to smpp.parse_pdu()"""
+        return smpp.parse_pdu(self.data, **kwargs)
+
+
+class CaptureWriter(object):
+    """Append records to a capture file from a background thread
+
+    write() only queues the record, so recording costs the caller little;
+    the queue is written out every flush_interval seconds and on close().
+    """
+
+    def __init__(self, path, flush_interval=0.1):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._file = open(path, 'ab')
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+        self._pending = []
+        self._lock = threading.Lock()
+        # Held from taking the queue until it is written, so batches keep their order.
+        self._write_lock = threading.Lock()
+        self._bind_ids = 0
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._flush_loop)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def next_bind_id(self):
+        """Return a new id for a connection to record under"""
+        with self._lock:
+            self._bind_ids = (self._bind_ids + 1) & 0xFFFF
+            return self._bind_ids
+
+    def write(self, data, direction, bind_id=0, timestamp=None):
+        """Queue a raw PDU, timestamp in nanoseconds defaults to now"""
+        if timestamp is None:
+            timestamp = int(time.time() * 1e9)
+        record = _record_header.pack(len(data), direction, bind_id, timestamp) + data
+        with self._lock:
+            self._pending.append(record)
+
+    def flush(self):
+        """Write out queued records"""
+        with self._write_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+            if pending:
+                self._file.write(b''.join(pending))
+                self._file.flush()
+
+    def _flush_loop(self):
+        while not self._closed.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        """Write out queued records and close the file"""
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._thread.join()
+        self.flush()
+        self._file.close()
+
+
+class CaptureReader(object):
+    """Iterate the records of a capture file without reading it into memory"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            self._file.close()
+            raise exceptions.PDUError('%s is not a capture file' % path)
+        if self._map[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise exceptions.PDUError('%s is not a capture file' % path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def __iter__(self):
+        data = self._map
+        size = len(data)
+        pos = len(MAGIC)
+        # A record cut short by a crash while writing ends the capture.
+        while pos + _record_header.size <= size:
+            length, direction, bind_id, timestamp = _record_header.unpack_from(data, pos)
+            pos += _record_header.size
+            if pos + length > size:
+                break
+            yield Record(timestamp, direction, bind_id, data[pos:pos + length])
+            pos += length
+
+    def pdus(self, direction=None, **kwargs):
+        """Yield (record, parsed PDU), of one direction only if given"""
+        for record in self:
+            if direction is None or record.direction == direction:
+                yield record, record.parse(**kwargs)
+
+
+def replay(records, send, direction=OUTBOUND, speed=1.0, clock=time.time, sleep=time.sleep):
+    """Call send(raw PDU) for records of direction, return the number sent
+
+    Records are paced as captured, speed=2 replays twice as fast and
+    speed=None as fast as possible. For example, to play recorded client
+    traffic against a simulator:
+
+        client.connect()
+        with CaptureReader(path) as reader:
+            replay(reader, client._socket.sendall)
+
+    or recorded SMSC traffic into a session:
+
+        replay(reader, session.receive_data, direction=INBOUND)
+    """
+    count = 0
+    start = first = None
+    for record in records:
+        if direction is not None and record.direction != direction:
+            continue
+        if speed:
+            if first is None:
+                first, start = record.timestamp, clock()
+            delay = start + (record.timestamp - first) / 1e9 / speed - clock()
+            if delay > 0:
+                sleep(delay)
+        send(record.data)
+        count += 1
+    return count
@@ -25,30 +25,12 @@ import socket
 import struct
 import warnings
 
-from smpplib import consts, exceptions, smpp
+from smpplib import consts, exceptions, framer, profiling, session, smpp
+from smpplib.capture import INBOUND, OUTBOUND
+from smpplib.session import ESMEMixin, SimpleSequenceGenerator
 
 
-class SimpleSequenceGenerator(object):
-
-    MIN_SEQUENCE = 0x00000001
-    MAX_SEQUENCE = 0x7FFFFFFF
-
-    def __init__(self):
-        self._sequence = self.MIN_SEQUENCE
-
-    @property
-    def sequence(self):
-        return self._sequence
-
-    def next_sequence(self):
-        if self._sequence == self.MAX_SEQUENCE:
-            self._sequence = self.MIN_SEQUENCE
-        else:
-            self._sequence += 1
-        return self._sequence
-
-
-class Client(object):
+class Client(ESMEMixin):
     """SMPP client class"""
 
     state = consts.SMPP_CLIENT_STATE_CLOSED
@@ -69,11 +51,28 @@ class Client(object):
         logger_name=None,
         ssl_context=None,
         allow_unknown_opt_params=None,
+        reassembler=None,
+        message_payload=False,
+        metrics=None,
+        capture=None,
+        outbox=None,
     ):
         self.host = host
         self.port = int(port)
         self._ssl_context = ssl_context
         self.timeout = timeout
+        self.reassembler = reassembler
+        # The SMSC accepts long messages in message_payload, see send_text().
+        self.message_payload = message_payload
+        self._payload_texts = {}
+        # Optional metrics.Metrics, fed with every PDU sent and received.
+        self.metrics = metrics
+        # Optional capture.CaptureWriter recording every PDU sent and read.
+        self.capture = capture
+        self.capture_bind_id = capture.next_bind_id() if capture is not None else 0
+        # Optional outbox.Outbox, sent from whenever a submit_sm_resp frees the window
+        # and on read timeouts.
+        self.outbox = outbox
         self.logger = logging.getLogger(logger_name or 'smpp.Client.{}'.format(id(self)))
         if sequence_generator is None:
             sequence_generator = SimpleSequenceGenerator()
@@ -151,6 +150,11 @@ class Client(object):
             self._socket.close()
             self._socket = None
         self.state = consts.SMPP_CLIENT_STATE_CLOSED
+        self._payload_texts.clear()
+        if self.metrics is not None:
+            self.metrics.connection_lost()
+        if self.outbox is not None:
+            self.outbox.connection_lost()
 
     def _bind(self, command_name, **kwargs):
         """Send bind_transmitter command to the SMSC"""
@@ -200,14 +204,15 @@ class Client(object):
     def send_pdu(self, p):
         """Send PDU to the SMSC"""
 
-        if self.state not in consts.COMMAND_STATES[p.command]:
-            raise exceptions.PDUError("Command %s failed: %s" % (
-                p.command,
-                consts.DESCRIPTIONS[consts.SMPP_ESME_RINVBNDSTS],
-            ))
+        session.check_command_state(p.command, self.state)
 
         self.logger.debug('Sending %s PDU', p.command)
+        profiler = profiling.profiler
+        if profiler is not None:
+            start = profiler.clock()
         generated = p.generate()
+        if profiler is not None:
+            start = profiler.lap('generate', start)
         self.logger.debug('>>%s (%d bytes)', binascii.b2a_hex(generated), len(generated))
 
         try:
@@ -215,7 +220,13 @@ class Client(object):
         except socket.error as e:
             self.logger.warning(e)
             raise exceptions.ConnectionError()
+        if profiler is not None:
+            profiler.lap('sendall', start)
+        if self.capture is not None:
+            self.capture.write(generated, OUTBOUND, self.capture_bind_id)
 
+        if self.metrics is not None:
+            self.metrics.pdu_sent(p)
         return True
 
     def _recv_exact(self, exact_size):
@@ -244,6 +255,10 @@ class Client(object):
         self.logger.debug('Waiting for PDU...')
 
         raw_len = self._recv_exact(4)
+        # Time from the first bytes on, not the wait for the SMSC.
+        profiler = profiling.profiler
+        if profiler is not None:
+            start = profiler.clock()
 
         try:
             length = struct.unpack('>L', raw_len)[0]
@@ -251,7 +266,17 @@ class Client(object):
             self.logger.warning('Receive broken pdu... %s', repr(raw_len))
             raise exceptions.PDUError('Broken PDU')
 
+        try:
+            framer.check_command_length(length)
+        except exceptions.PDUError:
+            self.logger.warning('Receive broken pdu... %s', repr(raw_len))
+            raise
+
         raw_pdu = raw_len + self._recv_exact(length - 4)
+        if profiler is not None:
+            start = profiler.lap('recv', start)
+        if self.capture is not None:
+            self.capture.write(raw_pdu, INBOUND, self.capture_bind_id)
 
         self.logger.debug('<<%s (%d bytes)', binascii.b2a_hex(raw_pdu), len(raw_pdu))
 
@@ -260,14 +285,14 @@ class Client(object):
             client=self,
             allow_unknown_opt_params=self.allow_unknown_opt_params,
         )
+        if profiler is not None:
+            profiler.lap('parse_pdu', start)
 
         self.logger.debug('Read %s PDU', pdu.command)
 
-        if pdu.is_error():
-            return pdu
-
-        elif pdu.command in consts.STATE_SETTERS:
-            self.state = consts.STATE_SETTERS[pdu.command]
+        if self.metrics is not None:
+            self.metrics.pdu_received(pdu)
+        self.state = session.next_state(pdu, self.state)
 
         return pdu
 
@@ -277,18 +302,16 @@ class Client(object):
 
     def _message_received(self, pdu):
         """Handler for received message event"""
-        status = self.message_received_handler(pdu=pdu)
+        complete, message = self._reassemble(pdu)
+        # Parts of an incomplete message are acknowledged right away.
+        status = None
+        if complete and message is None:
+            status = self.message_received_handler(pdu=pdu)
+        elif complete:
+            status = self.message_received_handler(pdu=pdu, message=message)
         if status is None:
             status = consts.SMPP_ESME_ROK
-        dsmr = smpp.make_pdu('deliver_sm_resp', client=self, status=status)
-        dsmr.sequence = pdu.sequence
-        self.send_pdu(dsmr)
-
-    def _enquire_link_received(self, pdu):
-        """Response to enquire_link"""
-        ler = smpp.make_pdu('enquire_link_resp', client=self)
-        ler.sequence = pdu.sequence
-        self.send_pdu(ler)
+        self.respond(pdu, status=status)
 
     def _alert_notification(self, pdu):
         """Handler for alert notification event"""
@@ -347,6 +370,11 @@ class Client(object):
             try:
                 pdu = self.read_pdu()
             except socket.timeout:
+                if self.metrics is not None:
+                    self.metrics.read_timeouts += 1
+                if self.outbox is not None and self.state in consts.COMMAND_STATES['submit_sm']:
+                    # Entries committed or due for a retry while the window was idle.
+                    self.outbox.fill(self)
                 if not auto_send_enquire_link:
                     raise
                 self.logger.debug('Socket timeout, listening again')
@@ -354,26 +382,39 @@ class Client(object):
                 self.send_pdu(pdu)
                 return
 
+            if pdu.command == 'submit_sm_resp' and self._payload_rejected(pdu):
+                return
+
+            if pdu.command == 'submit_sm_resp' and self.outbox is not None and self.outbox.response(pdu):
+                self.outbox.fill(self)
+
+            profiler = profiling.profiler
+            if profiler is not None:
+                start = profiler.clock()
+
             if pdu.is_error():
                 self.error_pdu_handler(pdu)
 
             if pdu.command == 'unbind':  # unbind_res
                 self.logger.info('Unbind command received')
                 return
-            elif pdu.command == 'submit_sm_resp':
+            elif pdu.command in ('submit_sm_resp', 'submit_multi_resp'):
                 self.message_sent_handler(pdu=pdu)
             elif pdu.command == 'deliver_sm':
                 self._message_received(pdu)
             elif pdu.command == 'query_sm_resp':
                 self.query_resp_handler(pdu)
             elif pdu.command == 'enquire_link':
-                self._enquire_link_received(pdu)
+                self.respond(pdu)
             elif pdu.command == 'enquire_link_resp':
                 pass
             elif pdu.command == 'alert_notification':
                 self._alert_notification(pdu)
             else:
                 self.logger.warning('Unhandled SMPP command "%s"', pdu.command)
+
+            if profiler is not None:
+                profiler.lap('handler', start)
         except exceptions.PDUError as e:
             if ignore_error_codes and len(e.args) > 1 and e.args[1] in ignore_error_codes:
                 self.logger.warning('(%d) %s. Ignored.', e.args[1], e.args[0])
@@ -392,32 +433,3 @@ class Client(object):
         """Listen for PDUs and act"""
         while True:
             self.read_once(ignore_error_codes, auto_send_enquire_link)
-
-    def send_message(self, **kwargs):
-        """Send message
-
-        Required Arguments:
-            source_addr_ton -- Source address TON
-            source_addr -- Source address (string)
-            dest_addr_ton -- Destination address TON
-            destination_addr -- Destination address (string)
-            short_message -- Message text (string)
-        """
-
-        ssm = smpp.make_pdu('submit_sm', client=self, **kwargs)
-        self.send_pdu(ssm)
-        return ssm
-
-    def query_message(self, **kwargs):
-        """Query message state
-
-        Required Arguments:
-            message_id -- SMSC assigned Message ID
-            source_addr_ton -- Original source address TON
-            source_addr_npi -- Original source address NPI
-            source_addr -- Original source address (string)
-        """
-
-        qsm = smpp.make_pdu('query_sm', client=self, **kwargs)
-        self.send_pdu(qsm)
-        return qsm
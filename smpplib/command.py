@@ -19,6 +19,7 @@
 
 """SMPP Commands module"""
 
+import collections
 import logging
 import struct
 
@@ -29,46 +30,31 @@ from smpplib.ptypes import flag, ostr
 
 logger = logging.getLogger('smpplib.command')
 
+OPTIONAL_PARAM_NAMES = dict((code, name) for name, code in six.iteritems(consts.OPTIONAL_PARAMS))
 
-def factory(command_name, **kwargs):
-    """Return instance of a specific command class"""
+
+def get_command_class(command_name):
+    """Return class implementing a specific command"""
 
     try:
-        return {
-            'bind_transmitter': BindTransmitter,
-            'bind_transmitter_resp': BindTransmitterResp,
-            'bind_receiver': BindReceiver,
-            'bind_receiver_resp': BindReceiverResp,
-            'bind_transceiver': BindTransceiver,
-            'bind_transceiver_resp': BindTransceiverResp,
-            'data_sm': DataSM,
-            'data_sm_resp': DataSMResp,
-            'generic_nack': GenericNAck,
-            'submit_sm': SubmitSM,
-            'submit_sm_resp': SubmitSMResp,
-            'deliver_sm': DeliverSM,
-            'deliver_sm_resp': DeliverSMResp,
-            'query_sm': QuerySM,
-            'query_sm_resp': QuerySMResp,
-            'unbind': Unbind,
-            'unbind_resp': UnbindResp,
-            'enquire_link': EnquireLink,
-            'enquire_link_resp': EnquireLinkResp,
-            'alert_notification': AlertNotification,
-        }[command_name](command_name, **kwargs)
+        return COMMANDS[command_name]
     except KeyError:
         raise exceptions.UnknownCommandError('Command "%s" is not supported' % command_name)
 
 
+def factory(command_name, **kwargs):
+    """Return instance of a specific command class"""
+    return get_command_class(command_name)(command_name, **kwargs)
+
+
 def get_optional_name(code):
     """Return optional_params name by given code. If code is unknown, raise
     UnkownCommandError exception"""
 
-    for key, value in six.iteritems(consts.OPTIONAL_PARAMS):
-        if value == code:
-            return key
-
-    raise exceptions.UnknownCommandError('Unknown SMPP command code "0x%x"' % code)
+    try:
+        return OPTIONAL_PARAM_NAMES[code]
+    except KeyError:
+        raise exceptions.UnknownCommandError('Unknown SMPP command code "0x%x"' % code)
 
 
 def get_optional_code(name):
@@ -116,9 +102,14 @@ class Command(pdu.PDU):
         if hasattr(self, 'prep') and callable(self.prep):
             self.prep()
 
+        return self._generate_fields(self.params_order)
+
+    def _generate_fields(self, fields):
+        """Generate binary data for the given fields"""
+
         body = consts.EMPTY_STRING
 
-        for field in self.params_order:
+        for field in fields:
             param = self.params[field]
             if self.field_is_optional(field):
                 if param.type is int:
@@ -297,10 +288,19 @@ class Command(pdu.PDU):
     def parse_params(self, data):
         """Parse data into the object structure"""
 
-        pos = 0
+        pos = self._parse_fields(data, 0, self.params_order)
+        if pos < len(data):
+            self.parse_optional_params(data[pos:])
+
+    def _parse_fields(self, data, pos, fields):
+        """
+        Parse mandatory fields starting at pos.
+        Return position of the first byte not parsed.
+        """
+
         dlen = len(data)
 
-        for field in self.params_order:
+        for field in fields:
             param = self.params[field]
             if pos == dlen or self.field_is_optional(field):
                 break
@@ -311,8 +311,8 @@ class Command(pdu.PDU):
                 data, pos = self._parse_string(field, data, pos)
             elif param.type is ostr:
                 data, pos = self._parse_ostring(field, data, pos)
-        if pos < dlen:
-            self.parse_optional_params(data[pos:])
+
+        return pos
 
     def parse_optional_params(self, data):
         """Parse optional parameters.
@@ -749,6 +749,255 @@ class SubmitSMResp(Command):
         self._set_vars(**(dict.fromkeys(self.params)))
 
 
+# Destination of a submit_multi: an SME address or a distribution list name
+SMEAddress = collections.namedtuple('SMEAddress', 'dest_addr_ton dest_addr_npi destination_addr')
+DistributionList = collections.namedtuple('DistributionList', 'dl_name')
+
+# Destination a submit_multi could not be delivered to
+UnsuccessSME = collections.namedtuple(
+    'UnsuccessSME', 'dest_addr_ton dest_addr_npi destination_addr error_status_code')
+
+
+def make_dest_address(destinations, dest_addr_ton=None, dest_addr_npi=None):
+    """Return submit_multi destination list, plain addresses become SMEAddress"""
+
+    return [
+        dest if isinstance(dest, (SMEAddress, DistributionList))
+        else SMEAddress(dest_addr_ton, dest_addr_npi, dest)
+        for dest in destinations
+    ]
+
+
+def _generate_cstring(value, max_length):
+    """Generate C-Octet String value from text or bytes"""
+
+    if value is None:
+        value = consts.EMPTY_STRING
+    elif isinstance(value, six.text_type):
+        value = six.b(value)
+    return value[:max_length - 1] + consts.NULL_STRING
+
+
+def _parse_cstring(data, pos):
+    """Parse C-Octet String, return (value, pos) tuple"""
+
+    end = data.find(consts.NULL_STRING, pos)
+    if end == -1:
+        raise exceptions.PDUError('Unterminated string at %d' % pos)
+    return data[pos:end], end + 1
+
+
+class SubmitMulti(Command):
+    """submit_multi command class
+
+    Submits one short message to up to 255 SME addresses and/or
+    distribution lists. Destinations are given in dest_address as a list of
+    SMEAddress and DistributionList tuples."""
+
+    # List of SMEAddress and DistributionList tuples
+    dest_address = None
+
+    # Message length in octets
+    sm_length = 0
+
+    # Up to 254 octets of short message user data
+    short_message = None
+
+    params = {
+        'service_type': Param(type=str, max=6),
+        'source_addr_ton': Param(type=int, size=1),
+        'source_addr_npi': Param(type=int, size=1),
+        'source_addr': Param(type=str, max=21),
+        'number_of_dests': Param(type=int, size=1),
+        'esm_class': Param(type=int, size=1),
+        'protocol_id': Param(type=int, size=1),
+        'priority_flag': Param(type=int, size=1),
+        'schedule_delivery_time': Param(type=str, max=17),
+        'validity_period': Param(type=str, max=17),
+        'registered_delivery': Param(type=int, size=1),
+        'replace_if_present_flag': Param(type=int, size=1),
+        'data_coding': Param(type=int, size=1),
+        'sm_default_msg_id': Param(type=int, size=1),
+        'sm_length': Param(type=int, size=1),
+        'short_message': Param(type=ostr, max=254, len_field='sm_length'),
+
+        # Optional params
+        'user_message_reference': Param(type=int, size=2),
+        'source_port': Param(type=int, size=2),
+        'source_addr_subunit': Param(type=int, size=1),
+        'destination_port': Param(type=int, size=2),
+        'dest_addr_subunit': Param(type=int, size=1),
+        'sar_msg_ref_num': Param(type=int, size=2),
+        'sar_total_segments': Param(type=int, size=1),
+        'sar_segment_seqnum': Param(type=int, size=1),
+        'payload_type': Param(type=int, size=1),
+        'message_payload': Param(type=ostr, max=260),
+        'privacy_indicator': Param(type=int, size=1),
+        'callback_num': Param(type=ostr, min=4, max=19),
+        'callback_num_pres_ind': Param(type=int, size=1),
+        'callback_num_atag': Param(type=str, max=65),
+        'source_subaddress': Param(type=str, min=2, max=23),
+        'dest_subaddress': Param(type=str, min=2, max=23),
+        'display_time': Param(type=int, size=1),
+        'sms_signal': Param(type=int, size=2),
+        'ms_validity': Param(type=int, size=1),
+        'ms_msg_wait_facilities': Param(type=int, size=1),
+        'alert_on_message_delivery': Param(type=flag),
+        'language_indicator': Param(type=int, size=1),
+    }
+
+    # The destination list goes between these two groups of fields
+    params_order_head = (
+        'service_type', 'source_addr_ton', 'source_addr_npi',
+        'source_addr', 'number_of_dests',
+    )
+
+    params_order_tail = (
+        'esm_class', 'protocol_id', 'priority_flag',
+        'schedule_delivery_time', 'validity_period', 'registered_delivery',
+        'replace_if_present_flag', 'data_coding', 'sm_default_msg_id',
+        'sm_length', 'short_message',
+
+        # Optional params
+        'user_message_reference', 'source_port', 'source_addr_subunit',
+        'destination_port', 'dest_addr_subunit', 'sar_msg_ref_num',
+        'sar_total_segments', 'sar_segment_seqnum', 'payload_type',
+        'message_payload', 'privacy_indicator', 'callback_num',
+        'callback_num_pres_ind', 'callback_num_atag', 'source_subaddress',
+        'dest_subaddress', 'display_time', 'sms_signal', 'ms_validity',
+        'ms_msg_wait_facilities', 'alert_on_message_delivery',
+        'language_indicator',
+    )
+
+    params_order = params_order_head + params_order_tail
+
+    def __init__(self, command, **kwargs):
+        super(SubmitMulti, self).__init__(command, **kwargs)
+        self._set_vars(**(dict.fromkeys(self.params)))
+        if self.dest_address is None:
+            self.dest_address = []
+
+    def prep(self):
+        """Prepare to generate binary data"""
+
+        if not 0 < len(self.dest_address) <= consts.SMPP_MAX_DESTINATIONS:
+            raise ValueError('`dest_address` must have 1 to %d destinations' % consts.SMPP_MAX_DESTINATIONS)
+        self.number_of_dests = len(self.dest_address)
+
+        if self.short_message:
+            if getattr(self, 'message_payload', None):
+                raise ValueError('`message_payload` can not be used with `short_message`')
+            self.sm_length = len(self.short_message)
+        else:
+            self.sm_length = 0
+
+    def generate_params(self):
+        """Generate binary data from the object"""
+
+        self.prep()
+
+        return b''.join((
+            self._generate_fields(self.params_order_head),
+            self._generate_dest_address(),
+            self._generate_fields(self.params_order_tail),
+        ))
+
+    def _generate_dest_address(self):
+        """Generate the destination list"""
+
+        chunks = []
+        for dest in self.dest_address:
+            if isinstance(dest, DistributionList):
+                chunks.append(six.int2byte(consts.SMPP_DEST_FLAG_DL))
+                chunks.append(_generate_cstring(dest.dl_name, 21))
+            else:
+                chunks.append(struct.pack(
+                    '>BBB',
+                    consts.SMPP_DEST_FLAG_SME,
+                    dest.dest_addr_ton or 0,
+                    dest.dest_addr_npi or 0,
+                ))
+                chunks.append(_generate_cstring(dest.destination_addr, 21))
+        return b''.join(chunks)
+
+    def parse_params(self, data):
+        """Parse data into the object structure"""
+
+        pos = self._parse_fields(data, 0, self.params_order_head)
+        pos = self._parse_dest_address(data, pos)
+        pos = self._parse_fields(data, pos, self.params_order_tail)
+        if pos < len(data):
+            self.parse_optional_params(data[pos:])
+
+    def _parse_dest_address(self, data, pos):
+        """Parse the destination list, return position after it"""
+
+        self.dest_address = []
+        for _ in range(self.number_of_dests or 0):
+            dest_flag = six.indexbytes(data, pos)
+            if dest_flag == consts.SMPP_DEST_FLAG_SME:
+                ton, npi = struct.unpack('>BB', data[pos + 1:pos + 3])
+                addr, pos = _parse_cstring(data, pos + 3)
+                self.dest_address.append(SMEAddress(ton, npi, addr))
+            elif dest_flag == consts.SMPP_DEST_FLAG_DL:
+                dl_name, pos = _parse_cstring(data, pos + 1)
+                self.dest_address.append(DistributionList(dl_name))
+            else:
+                raise exceptions.PDUError(
+                    'Invalid dest_flag %d' % dest_flag,
+                    consts.SMPP_ESME_RINVDESTFLAG,
+                )
+        return pos
+
+
+class SubmitMultiResp(Command):
+    """Response command for submit_multi
+
+    unsuccess_sme lists UnsuccessSME tuples for destinations the SMSC did
+    not accept."""
+
+    # List of UnsuccessSME tuples
+    unsuccess_sme = None
+
+    params = {
+        'message_id': Param(type=str, max=65),
+        'no_unsuccess': Param(type=int, size=1),
+    }
+
+    params_order = ('message_id', 'no_unsuccess')
+
+    def __init__(self, command, **kwargs):
+        super(SubmitMultiResp, self).__init__(command, need_sequence=False, **kwargs)
+        self._set_vars(**(dict.fromkeys(self.params)))
+        if self.unsuccess_sme is None:
+            self.unsuccess_sme = []
+
+    def generate_params(self):
+        """Generate binary data from the object"""
+
+        self.no_unsuccess = len(self.unsuccess_sme)
+
+        chunks = [self._generate_fields(self.params_order)]
+        for sme in self.unsuccess_sme:
+            chunks.append(struct.pack('>BB', sme.dest_addr_ton or 0, sme.dest_addr_npi or 0))
+            chunks.append(_generate_cstring(sme.destination_addr, 21))
+            chunks.append(struct.pack('>L', sme.error_status_code))
+        return b''.join(chunks)
+
+    def parse_params(self, data):
+        """Parse data into the object structure"""
+
+        pos = self._parse_fields(data, 0, self.params_order)
+
+        self.unsuccess_sme = []
+        for _ in range(self.no_unsuccess or 0):
+            ton, npi = struct.unpack('>BB', data[pos:pos + 2])
+            addr, pos = _parse_cstring(data, pos + 2)
+            error_status_code, = struct.unpack('>L', data[pos:pos + 4])
+            pos += 4
+            self.unsuccess_sme.append(UnsuccessSME(ton, npi, addr, error_status_code))
+
+
 class DeliverSM(SubmitSM):
     """deliver_sm command class, similar to submit_sm
     but has different optional params"""
@@ -978,3 +1227,30 @@ class AlertNotification(Command):
     def __init__(self, command, **kwargs):
         super(AlertNotification, self).__init__(command, **kwargs)
         self._set_vars(**(dict.fromkeys(self.params)))
+
+
+# Command name -> command class map used by factory()
+COMMANDS = {
+    'bind_transmitter': BindTransmitter,
+    'bind_transmitter_resp': BindTransmitterResp,
+    'bind_receiver': BindReceiver,
+    'bind_receiver_resp': BindReceiverResp,
+    'bind_transceiver': BindTransceiver,
+    'bind_transceiver_resp': BindTransceiverResp,
+    'data_sm': DataSM,
+    'data_sm_resp': DataSMResp,
+    'generic_nack': GenericNAck,
+    'submit_sm': SubmitSM,
+    'submit_sm_resp': SubmitSMResp,
+    'submit_multi': SubmitMulti,
+    'submit_multi_resp': SubmitMultiResp,
+    'deliver_sm': DeliverSM,
+    'deliver_sm_resp': DeliverSMResp,
+    'query_sm': QuerySM,
+    'query_sm_resp': QuerySMResp,
+    'unbind': Unbind,
+    'unbind_resp': UnbindResp,
+    'enquire_link': EnquireLink,
+    'enquire_link_resp': EnquireLinkResp,
+    'alert_notification': AlertNotification,
+}
@@ -36,17 +36,20 @@ commands = {
 }
 
 
+# Reverse map (numeric -> human-readable)
+command_names = dict((code, name) for name, code in six.iteritems(commands))
+
+
 def get_command_name(code):
     """
     Return command name by given code.
     If code is unknown, raise UnknownCommandError exception.
     """
 
-    for key, value in six.iteritems(commands):
-        if value == code:
-            return key
-
-    raise exceptions.UnknownCommandError("Unknown SMPP command code '0x%x'" % code)
+    try:
+        return command_names[code]
+    except KeyError:
+        raise exceptions.UnknownCommandError("Unknown SMPP command code '0x%x'" % code)
 
 
 def get_command_code(name):
@@ -10,10 +10,28 @@ UCS2_LENGTH = 140
 
 MULTIPART_HEADER_SIZE = 6
 
-SEVENBIT_PART_SIZE = SEVENBIT_LENGTH - 7  # TODO: where does 7 come from?
+# The UDH is counted in septets in a 7-bit message: 6 octets take 7 septets.
+SEVENBIT_PART_SIZE = SEVENBIT_LENGTH - (MULTIPART_HEADER_SIZE * 8 + 6) // 7
 EIGHTBIT_PART_SIZE = 140 - MULTIPART_HEADER_SIZE
 UCS2_PART_SIZE = 140 - MULTIPART_HEADER_SIZE  # must be an even number anyway
 
+# The concatenation header with a 16-bit reference is one octet longer.
+MULTIPART16_HEADER_SIZE = 7
+
+SEVENBIT_PART16_SIZE = SEVENBIT_LENGTH - (MULTIPART16_HEADER_SIZE * 8 + 6) // 7
+EIGHTBIT_PART16_SIZE = 140 - MULTIPART16_HEADER_SIZE
+UCS2_PART16_SIZE = (140 - MULTIPART16_HEADER_SIZE) // 2 * 2
+
+# A whole message in the message_payload TLV, limited by its 16-bit length.
+MESSAGE_PAYLOAD_MAX_LENGTH = 0xFFFF
+
+
+# PDU framing.
+PDU_HEADER_SIZE = 16
+# Upper bound for command_length of a received PDU. The biggest legitimate
+# PDU (a 64K message_payload TLV plus mandatory fields) fits comfortably.
+MAX_PDU_LENGTH = 128 * 1024
+
 
 # SMPP error codes.
 SMPP_ESME_ROK = 0x00000000
@@ -118,6 +136,15 @@ DESCRIPTIONS = {
     SMPP_ESME_RUNKNOWNERR: 'Unknown Error',
 }
 
+# submit_sm_resp statuses of SMSCs not accepting message_payload.
+MESSAGE_PAYLOAD_REJECTED_STATUSES = frozenset((
+    SMPP_ESME_RINVMSGLEN,
+    SMPP_ESME_RINVOPTPARSTREAM,
+    SMPP_ESME_ROPTPARNOTALLWD,
+    SMPP_ESME_RINVPARLEN,
+    SMPP_ESME_RINVOPTPARAMVAL,
+))
+
 
 # Internal client state.
 SMPP_CLIENT_STATE_CLOSED = 0
@@ -174,6 +201,12 @@ SMPP_LANG_ES = 0x03
 SMPP_LANG_DE = 0x04
 
 
+# National language identifiers of GSM 7-bit shift tables (3GPP TS 23.038).
+SMPP_GSM_LANG_TURKISH = 0x01
+SMPP_GSM_LANG_SPANISH = 0x02
+SMPP_GSM_LANG_PORTUGUESE = 0x03
+
+
 # ESM class values.
 SMPP_MSGMODE_DEFAULT = 0x00  # Default SMSC mode (e.g. Store and Forward)
 SMPP_MSGMODE_DATAGRAM = 0x01  # Datagram mode
@@ -182,6 +215,7 @@ SMPP_MSGMODE_STOREFORWARD = 0x03  # Explicit Store and Forward mode
 
 
 SMPP_MSGTYPE_DEFAULT = 0x00  # Default message type (i.e. normal message)
+SMPP_MSGTYPE_SMSC_RECEIPT = 0x04  # Message contains SMSC Delivery Receipt
 SMPP_MSGTYPE_DELIVERYACK = 0x08  # Message containts ESME Delivery acknowledgement
 SMPP_MSGTYPE_USERACK = 0x10  # Message containts ESME Manual/User acknowledgement
 
@@ -192,6 +226,14 @@ SMPP_GSMFEAT_REPLYPATH = 0x80  # Set Reply Path (only relevant for GSM net)
 SMPP_GSMFEAT_UDHIREPLYPATH = 0xC0  # Set UDHI and Reply Path (for GSM net)
 
 
+# submit_multi destination flags.
+SMPP_DEST_FLAG_SME = 0x01  # SME Address
+SMPP_DEST_FLAG_DL = 0x02  # Distribution List Name
+
+# number_of_dests of submit_multi is a single octet.
+SMPP_MAX_DESTINATIONS = 255
+
+
 # SMPP Protocol ID.
 SMPP_PID_DEFAULT = 0x00  # Default
 SMPP_PID_RIP = 0x41  # Replace if present on handset
@@ -204,6 +246,8 @@ SMPP_UDHIEIE_RESERVED = 0x02
 SMPP_UDHIEIE_PORT8 = 0x04
 SMPP_UDHIEIE_PORT16 = 0x05
 SMPP_UDHIEIE_CONCATENATED16 = 0x08
+SMPP_UDHIEIE_NATIONAL_SINGLE_SHIFT = 0x24
+SMPP_UDHIEIE_NATIONAL_LOCKING_SHIFT = 0x25
 
 
 # `ms_availability_status` parameter from `alert_notification` operation.
@@ -282,8 +326,8 @@ COMMAND_STATES = {
     ),
     'submit_sm': (SMPP_CLIENT_STATE_BOUND_TX, SMPP_CLIENT_STATE_BOUND_TRX),
     'submit_sm_resp': (SMPP_CLIENT_STATE_BOUND_TX, SMPP_CLIENT_STATE_BOUND_TRX),
-    'submit_sm_multi': (SMPP_CLIENT_STATE_BOUND_TX, SMPP_CLIENT_STATE_BOUND_TRX),
-    'submit_sm_multi_resp': (SMPP_CLIENT_STATE_BOUND_TX, SMPP_CLIENT_STATE_BOUND_TRX),
+    'submit_multi': (SMPP_CLIENT_STATE_BOUND_TX, SMPP_CLIENT_STATE_BOUND_TRX),
+    'submit_multi_resp': (SMPP_CLIENT_STATE_BOUND_TX, SMPP_CLIENT_STATE_BOUND_TRX),
     'data_sm': (
         SMPP_CLIENT_STATE_BOUND_TX,
         SMPP_CLIENT_STATE_BOUND_RX,
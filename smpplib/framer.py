@@ -0,0 +1,93 @@
+"""Incremental PDU framing, independent of any transport"""
+
+import struct
+
+from smpplib import consts, exceptions, smpp
+
+_command_length = struct.Struct('>L')
+
+
+def check_command_length(length, max_length=consts.MAX_PDU_LENGTH):
+    """Raise PDUError if command_length can not belong to a valid PDU"""
+
+    if length < consts.PDU_HEADER_SIZE or length > max_length:
+        raise exceptions.PDUError(
+            'Invalid command_length %d' % length,
+            consts.SMPP_ESME_RINVCMDLEN,
+        )
+    return length
+
+
+class PDUFramer(object):
+    """Split a byte stream into PDUs.
+
+    Feed it chunks of any size as they come from a socket, an asyncio
+    transport or a capture file; complete PDUs are returned as soon as all
+    of their bytes are available, the remainder is kept for the next call.
+    Keyword arguments are passed to smpp.parse_pdu().
+    """
+
+    def __init__(self, max_length=consts.MAX_PDU_LENGTH, **kwargs):
+        self.max_length = max_length
+        self.parse_kwargs = kwargs
+        self._buffer = bytearray()
+
+    def __len__(self):
+        """Return the number of buffered bytes of an incomplete PDU"""
+        return len(self._buffer)
+
+    def feed_raw(self, data):
+        """Buffer data and return a list of complete raw PDUs
+
+        An invalid command_length raises PDUError. The PDUs before it are
+        returned first and the error is raised by the next call; the
+        stream can not be framed past it, so every later call raises too.
+        """
+
+        buf = self._buffer
+        buf += data
+        end = len(buf)
+        pos = 0
+        raw_pdus = []
+
+        while end - pos >= 4:
+            try:
+                length = check_command_length(
+                    _command_length.unpack_from(buf, pos)[0], self.max_length)
+            except exceptions.PDUError:
+                if not raw_pdus:
+                    raise
+                break
+            if end - pos < length:
+                break
+            raw_pdus.append(bytes(buf[pos:pos + length]))
+            pos += length
+
+        if pos:
+            del buf[:pos]
+
+        return raw_pdus
+
+    def feed(self, data):
+        """Buffer data and return a list of complete parsed PDUs
+
+        A PDU failing to parse raises its error once the PDUs before it
+        are returned, and is dropped; the PDUs after it stay buffered for
+        the next call (feed(b'') will do). PDUs parse_pdu() returns None
+        for are left out.
+        """
+        raw_pdus = self.feed_raw(data)
+        pdus = []
+        for index, raw_pdu in enumerate(raw_pdus):
+            try:
+                p = smpp.parse_pdu(raw_pdu, **self.parse_kwargs)
+            except Exception:
+                if not pdus:
+                    self._buffer[:0] = b''.join(raw_pdus[index + 1:])
+                    raise
+                # Raised by the next call, which parses this PDU again.
+                self._buffer[:0] = b''.join(raw_pdus[index:])
+                break
+            if p is not None:
+                pdus.append(p)
+        return pdus
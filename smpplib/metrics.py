@@ -0,0 +1,219 @@
+"""PDU counters, in-flight gauge and response latency histograms
+
+Pass a Metrics instance to Client or Session as metrics=...; read it with
+snapshot() or export it with prometheus().
+"""
+
+import time
+
+from smpplib import command_codes, consts
+
+# Nanosecond clock of Metrics and profiling, for timing code alongside them.
+try:
+    now_ns = time.perf_counter_ns
+except AttributeError:  # Python < 3.7
+    _monotonic = getattr(time, 'monotonic', time.time)  # Python 2 has no monotonic clock
+
+    def now_ns():
+        return int(_monotonic() * 1e9)
+
+
+# Commands answering a request, matched to it by sequence number.
+_RESPONSES = frozenset(
+    name for name in command_codes.commands if name.endswith('_resp') or name == 'generic_nack')
+
+
+def _escape_label(value):
+    """Escape a label value for the Prometheus text format"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Histogram(object):
+    """Fixed-memory log-linear histogram of nanosecond values
+
+    Every power of two is split into 2 ** sub_bits linear buckets, so a
+    value is known within 1 / 2 ** sub_bits of itself; values from
+    2 ** max_bits ns (about 18 minutes by default) up share the last bucket,
+    which has no upper bound; overflow_max is the largest of them.
+    """
+
+    def __init__(self, sub_bits=3, max_bits=40):
+        self.sub_bits = sub_bits
+        self.max_bits = max_bits
+        self.counts = [0] * ((max_bits - sub_bits + 1) << sub_bits)
+        self.count = 0
+        self.sum = 0
+        self.overflow_max = 0
+
+    def record(self, value):
+        """Add a value in nanoseconds, negative ones as 0"""
+        if value < 0:
+            # A clock stepped back, as time.time() can.
+            value = 0
+        self.count += 1
+        self.sum += value
+        sub_bits = self.sub_bits
+        index = value
+        exponent = value.bit_length() - sub_bits - 1
+        if exponent > 0:
+            index = (exponent << sub_bits) + (value >> exponent)
+        try:
+            self.counts[index] += 1
+        except IndexError:
+            self.counts[-1] += 1
+            if value > self.overflow_max:
+                self.overflow_max = value
+
+    def merge(self, other):
+        """Add the values recorded by other, a Histogram of the same shape"""
+        if (other.sub_bits, other.max_bits) != (self.sub_bits, self.max_bits):
+            raise ValueError('Histograms of different sub_bits or max_bits can not be merged')
+        self.counts = [count + other_count for count, other_count in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.sum += other.sum
+        self.overflow_max = max(self.overflow_max, other.overflow_max)
+
+    def bucket_bounds(self, index):
+        """Return (lower, upper) nanoseconds of a bucket"""
+        sub_buckets = 1 << self.sub_bits
+        if index < 2 * sub_buckets:
+            return index, index + 1
+        exponent = (index >> self.sub_bits) - 1
+        mantissa = (index & (sub_buckets - 1)) + sub_buckets
+        return mantissa << exponent, (mantissa + 1) << exponent
+
+    def percentile(self, percent):
+        """Return the upper bound in nanoseconds below which percent of values are
+
+        In the last bucket, the largest value recorded past its bound is
+        returned if there is one.
+        """
+        if not self.count:
+            return 0
+        rank = self.count * percent / 100.0
+        seen = 0
+        last = len(self.counts) - 1
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                break
+        else:
+            index = last
+        upper = self.bucket_bounds(index)[1]
+        if index == last:
+            return max(upper, self.overflow_max)
+        return upper
+
+    def cumulative(self):
+        """Return [(upper bound ns, count of values below)] at every power of two"""
+        result = []
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            upper = self.bucket_bounds(index)[1]
+            if upper & (upper - 1) == 0:
+                result.append((upper, seen))
+        return result
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'overflow_max': self.overflow_max,
+            'buckets': [(self.bucket_bounds(index), count) for index, count in enumerate(self.counts) if count],
+        }
+
+
+class Metrics(object):
+    """Counters of a single SMPP connection
+
+    sent and received count PDUs by command, errors counts PDUs received
+    with an error status by status code, in_flight is the number of
+    requests awaiting their response and latency holds a Histogram of
+    request to response times per request command.
+    """
+
+    def __init__(self, clock=now_ns):
+        self.clock = clock
+        self.sent = {}
+        self.received = {}
+        self.errors = {}
+        self.latency = {}
+        self.read_timeouts = 0
+        # sequence -> (command, time sent) of requests awaiting a response
+        self._pending = {}
+
+    @property
+    def in_flight(self):
+        return len(self._pending)
+
+    def pdu_sent(self, pdu):
+        command = pdu.command
+        sent = self.sent
+        sent[command] = sent.get(command, 0) + 1
+        if command not in _RESPONSES:
+            self._pending[pdu.sequence] = (command, self.clock())
+
+    def pdu_received(self, pdu):
+        command = pdu.command
+        received = self.received
+        received[command] = received.get(command, 0) + 1
+        if pdu.status:
+            self.errors[pdu.status] = self.errors.get(pdu.status, 0) + 1
+        if command in _RESPONSES:
+            pending = self._pending.pop(pdu.sequence, None)
+            if pending is not None:
+                histogram = self.latency.get(pending[0])
+                if histogram is None:
+                    histogram = self.latency[pending[0]] = Histogram()
+                histogram.record(self.clock() - pending[1])
+
+    def connection_lost(self):
+        """Forget requests which will never be answered"""
+        self._pending.clear()
+
+    def snapshot(self):
+        """Return all metrics as a dict of plain values"""
+        return {
+            'sent': dict(self.sent),
+            'received': dict(self.received),
+            'errors': dict(self.errors),
+            'in_flight': self.in_flight,
+            'read_timeouts': self.read_timeouts,
+            'latency': dict((command, histogram.snapshot()) for command, histogram in self.latency.items()),
+        }
+
+    def prometheus(self, prefix='smpp'):
+        """Return metrics in the Prometheus text exposition format"""
+        lines = []
+
+        def add(name, kind, help_text, samples):
+            lines.append('# HELP %s_%s %s' % (prefix, name, help_text))
+            lines.append('# TYPE %s_%s %s' % (prefix, name, kind))
+            for suffix, labels, value in samples:
+                label_text = ','.join('%s="%s"' % (label, _escape_label(text)) for label, text in labels)
+                lines.append('%s_%s%s%s %s' % (
+                    prefix, name, suffix, '{%s}' % label_text if label_text else '', value))
+
+        add('pdus_sent_total', 'counter', 'PDUs sent by command.', [
+            ('', [('command', command)], count) for command, count in sorted(self.sent.items())])
+        add('pdus_received_total', 'counter', 'PDUs received by command.', [
+            ('', [('command', command)], count) for command, count in sorted(self.received.items())])
+        add('errors_total', 'counter', 'PDUs received with an error status.', [
+            ('', [('status', '0x%08X' % status),
+                  ('description', consts.DESCRIPTIONS.get(status, 'Unknown status'))], count)
+            for status, count in sorted(self.errors.items())])
+        add('in_flight', 'gauge', 'Requests awaiting a response.', [('', [], self.in_flight)])
+        add('read_timeouts_total', 'counter', 'Socket reads which timed out.', [('', [], self.read_timeouts)])
+
+        samples = []
+        for command, histogram in sorted(self.latency.items()):
+            labels = [('command', command)]
+            for upper, count in histogram.cumulative()[:-1]:
+                samples.append(('_bucket', labels + [('le', '%.9g' % (upper / 1e9))], count))
+            samples.append(('_bucket', labels + [('le', '+Inf')], histogram.count))
+            samples.append(('_sum', labels, '%.9g' % (histogram.sum / 1e9)))
+            samples.append(('_count', labels, histogram.count))
+        add('response_latency_seconds', 'histogram', 'Time from a request to its response.', samples)
+
+        return '\n'.join(lines) + '\n'
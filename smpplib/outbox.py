@@ -0,0 +1,353 @@
+"""Disk-backed outbound queue
+
+Outbox keeps submit_sm PDUs in an append-only log until the SMSC has
+answered them, so messages survive a crash:
+
+    outbox = Outbox('/var/spool/smpp', window=10)
+    client = Client(host, port, outbox=outbox, allow_unknown_opt_params=True)
+    ...
+    outbox.put(source_addr='Sender', destination_addr='447700900123', short_message=b'hello')
+    outbox.fill(client)
+    client.listen()
+
+put() encodes the PDU and queues it; a background thread writes queued
+entries and makes them durable with one fsync per batch (group commit).
+Only durable entries are sent. fill() sends entries while fewer than
+window are awaiting their response; the client calls it again after
+every submit_sm_resp, which also marks the entry acked, and on every
+read timeout, so entries put while the window is idle go out within the
+client's timeout. Call fill() only from the thread reading the client. Temporary errors
+such as throttling put the entry back at the front of the queue; it is
+not sent again before retry_delay seconds, doubled on every further
+retry up to max_retry_delay, and the entries behind it wait with it.
+
+The log is split into segments of segment_entries entries. Each segment
+has a memory-mapped bitmap of its acked entries; a segment is deleted
+once every entry in it is acked. Reopening the directory after a crash
+queues every durable entry not acked. Acks are flushed after every
+batch, so a crash may resend the last acked entries.
+"""
+
+import collections
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+import six
+
+from smpplib import consts, smpp
+from smpplib.relay import rewrite_sequence
+
+# submit_sm_resp statuses after which an entry is sent again.
+RETRY_STATUSES = frozenset((
+    consts.SMPP_ESME_RTHROTTLED,
+    consts.SMPP_ESME_RMSGQFUL,
+    consts.SMPP_ESME_RX_T_APPN,
+))
+
+# length, crc32 of entry id and data, entry id
+_record_header = struct.Struct('>LLQ')
+_entry_id = struct.Struct('>Q')
+
+
+def _crc(entry_id, data):
+    return zlib.crc32(data, zlib.crc32(_entry_id.pack(entry_id))) & 0xFFFFFFFF
+
+
+class QueuedPDU(object):
+    """Encoded submit_sm of an outbox entry, sent by Client.send_pdu() as is"""
+
+    command = 'submit_sm'
+    status = consts.SMPP_ESME_ROK
+
+    def __init__(self, entry_id, data, sequence=0):
+        self.entry_id = entry_id
+        self.data = data
+        self.sequence = sequence
+        self.retries = 0
+        # clock() time before which the entry is not sent again
+        self.not_before = 0
+
+    def generate(self):
+        return rewrite_sequence(self.data, self.sequence)
+
+
+class _Segment(object):
+    """Log file and acked bitmap of entries base to base + size"""
+
+    def __init__(self, directory, base, size):
+        self.base = base
+        self.size = size
+        self.path = os.path.join(directory, '%020d.log' % base)
+        self.ack_path = os.path.join(directory, '%020d.ack' % base)
+        self.count = 0
+        self.acked = 0
+        self.file = open(self.path, 'ab')
+        with open(self.ack_path, 'ab') as f:
+            if f.tell() < size // 8 + 1:
+                f.truncate(size // 8 + 1)
+        self._ack_file = open(self.ack_path, 'r+b')
+        self.acks = mmap.mmap(self._ack_file.fileno(), size // 8 + 1)
+
+    def is_acked(self, index):
+        return six.indexbytes(self.acks[index >> 3:(index >> 3) + 1], 0) >> (index & 7) & 1
+
+    def ack(self, index):
+        """Set the bit of entry index, return False if it already was"""
+        if self.is_acked(index):
+            return False
+        position = index >> 3
+        byte = six.indexbytes(self.acks[position:position + 1], 0)
+        self.acks[position:position + 1] = six.int2byte(byte | 1 << (index & 7))
+        self.acked += 1
+        return True
+
+    def close(self):
+        self.file.close()
+        self.acks.close()
+        self._ack_file.close()
+
+    def delete(self):
+        self.close()
+        os.remove(self.path)
+        os.remove(self.ack_path)
+
+
+class Outbox(object):
+    """Durable queue of submit_sm feeding a client's send window"""
+
+    def __init__(
+        self,
+        directory,
+        window=10,
+        segment_entries=65536,
+        retry_delay=1.0,
+        max_retry_delay=60.0,
+        clock=time.time,
+        logger_name=None,
+    ):
+        self.directory = directory
+        self.window = window
+        self.segment_entries = segment_entries
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.clock = clock
+        self.logger = logging.getLogger(logger_name or 'smpp.Outbox.{}'.format(id(self)))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        self._segments = collections.OrderedDict()
+        # Durable entries waiting to be sent, as QueuedPDU
+        self._ready = collections.deque()
+        # sequence -> QueuedPDU awaiting submit_sm_resp
+        self._in_flight = {}
+        # (segment, QueuedPDU, record) not written yet
+        self._buffer = []
+        self._acks_dirty = set()
+        self._next_id = 0
+        self._committed = -1
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+        self._closed = False
+
+        self._recover()
+        self._thread = threading.Thread(target=self._commit_loop)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        """Return the number of entries not acked yet"""
+        with self._lock:
+            return sum(segment.count - segment.acked for segment in self._segments.values())
+
+    @property
+    def in_flight(self):
+        with self._lock:
+            return len(self._in_flight)
+
+    def _recover(self):
+        """Open the segments left in directory and queue their unacked entries"""
+        names = sorted(name for name in os.listdir(self.directory) if name.endswith('.log'))
+        for name in names:
+            base = int(name[:-4])
+            segment = _Segment(self.directory, base, self.segment_entries)
+            with open(segment.path, 'rb') as f:
+                data = f.read()
+            pos = 0
+            while pos + _record_header.size <= len(data):
+                length, crc, entry_id = _record_header.unpack_from(data, pos)
+                start = pos + _record_header.size
+                record = data[start:start + length]
+                if (len(record) < length or entry_id != base + segment.count or
+                        _crc(entry_id, record) != crc):
+                    break
+                if not segment.is_acked(segment.count):
+                    self._ready.append(QueuedPDU(entry_id, record))
+                segment.count += 1
+                pos = start + length
+            if pos < len(data):
+                self.logger.warning('Dropping %d bytes of a partly written entry in %s', len(data) - pos, name)
+                segment.file.truncate(pos)
+            segment.acked = sum(segment.is_acked(index) for index in range(segment.count))
+            self._segments[base] = segment
+            self._next_id = base + segment.count
+        self._committed = self._next_id - 1
+
+        for base, segment in list(self._segments.items()):
+            if segment.acked == segment.count and segment.count == segment.size:
+                del self._segments[base]
+                segment.delete()
+        if self._ready:
+            self.logger.info('Recovered %d unacked entries', len(self._ready))
+
+    def put(self, **kwargs):
+        """Queue a submit_sm with the given parameters, return its entry id"""
+        return self.put_pdu(smpp.make_pdu('submit_sm', **kwargs))
+
+    def put_pdu(self, p):
+        """Queue a submit_sm PDU, return its entry id"""
+        data = p.generate()
+        with self._lock:
+            if self._closed:
+                raise ValueError('Outbox is closed')
+            entry_id = self._next_id
+            self._next_id += 1
+            base = entry_id - entry_id % self.segment_entries
+            segment = self._segments.get(base)
+            if segment is None:
+                segment = self._segments[base] = _Segment(self.directory, base, self.segment_entries)
+                self._sync_directory()
+            segment.count += 1
+            record = _record_header.pack(len(data), _crc(entry_id, data), entry_id) + data
+            self._buffer.append((segment, QueuedPDU(entry_id, data), record))
+            self._condition.notify_all()
+        return entry_id
+
+    def wait(self, entry_id=None, timeout=None):
+        """Block until entry_id (by default every entry put so far) is durable, return True if it is"""
+        with self._lock:
+            if entry_id is None:
+                entry_id = self._next_id - 1
+            while self._committed < entry_id and not self._closed:
+                if not self._condition.wait(timeout) and timeout is not None:
+                    break
+            return self._committed >= entry_id
+
+    def _sync_directory(self):
+        if hasattr(os, 'O_DIRECTORY'):
+            fd = os.open(self.directory, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def _commit_loop(self):
+        """Write and fsync whatever accumulated during the previous fsync"""
+        while True:
+            with self._lock:
+                while not self._buffer and not self._acks_dirty and not self._closed:
+                    self._condition.wait()
+                if not self._buffer and not self._acks_dirty:
+                    return
+                batch, self._buffer = self._buffer, []
+                dirty, self._acks_dirty = self._acks_dirty, set()
+            self._commit(batch, dirty)
+
+    def _commit(self, batch, dirty):
+        segments = []
+        for segment, _entry, record in batch:
+            if not segments or segments[-1] is not segment:
+                segments.append(segment)
+            segment.file.write(record)
+        for segment in segments:
+            segment.file.flush()
+            os.fsync(segment.file.fileno())
+        for segment in dirty:
+            if segment.acked == segment.size:
+                with self._lock:
+                    del self._segments[segment.base]
+                segment.delete()
+            else:
+                segment.acks.flush()
+
+        with self._lock:
+            for _segment, entry, _record in batch:
+                self._ready.append(entry)
+            if batch:
+                self._committed = batch[-1][1].entry_id
+            self._condition.notify_all()
+
+    def ack(self, entry_id):
+        """Mark an entry done, it will not be sent again"""
+        with self._lock:
+            base = entry_id - entry_id % self.segment_entries
+            segment = self._segments.get(base)
+            if segment is None or not segment.ack(entry_id - base):
+                return
+            # The commit thread flushes the bitmap, or deletes a segment acked in full.
+            self._acks_dirty.add(segment)
+            self._condition.notify_all()
+
+    def fill(self, client):
+        """Send durable entries through client while fewer than window await a response
+
+        Client.send_pdu() is not thread-safe, so call this only from the
+        thread reading the client: the client calls it itself after every
+        submit_sm_resp and on every read timeout, which picks up entries
+        committed or due for a retry while the window was idle.
+        """
+        while True:
+            with self._lock:
+                if (len(self._in_flight) >= self.window or not self._ready or
+                        self._ready[0].not_before > self.clock()):
+                    return
+                entry = self._ready.popleft()
+                entry.sequence = client.next_sequence()
+                self._in_flight[entry.sequence] = entry
+            client.send_pdu(entry)
+
+    def response(self, pdu):
+        """Handle submit_sm_resp, return True if it answered an outbox entry"""
+        with self._lock:
+            entry = self._in_flight.pop(pdu.sequence, None)
+            if entry is None:
+                return False
+            if pdu.status in RETRY_STATUSES:
+                delay = min(self.retry_delay * 2 ** entry.retries, self.max_retry_delay)
+                entry.retries += 1
+                entry.not_before = self.clock() + delay
+                self._ready.appendleft(entry)
+                return True
+        self.ack(entry.entry_id)
+        return True
+
+    def connection_lost(self):
+        """Queue entries awaiting a response again, in their original order"""
+        with self._lock:
+            entries = sorted(self._in_flight.values(), key=lambda entry: entry.entry_id)
+            self._in_flight.clear()
+            self._ready.extendleft(reversed(entries))
+
+    def close(self):
+        """Write out everything queued and close the log"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+        with self._lock:
+            for segment in self._segments.values():
+                segment.acks.flush()
+                segment.close()
+            self._segments.clear()
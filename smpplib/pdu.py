@@ -36,6 +36,9 @@ class default_client(object):
     """Dummy client"""
     sequence = 0
 
+    def next_sequence(self):
+        return self.sequence
+
 
 class PDU(object):
     """PDU class"""
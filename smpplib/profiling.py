@@ -0,0 +1,90 @@
+"""Per-stage timing of the PDU lifecycle
+
+Stages timed while profiling is enabled:
+
+    make_pdu   -- PDU object construction (smpp.make_pdu)
+    generate   -- encoding a PDU to bytes
+    sendall    -- writing to the socket
+    recv       -- reading a PDU from the socket
+    parse_pdu  -- decoding received bytes
+    handler    -- read_once() dispatch including user handlers
+
+Use the profile() context manager, or enable() and disable(). While
+disabled every hook is a single check of the module level profiler.
+"""
+
+import contextlib
+import sys
+
+from smpplib.metrics import Histogram, now_ns
+
+STAGES = ('make_pdu', 'generate', 'sendall', 'recv', 'parse_pdu', 'handler')
+
+# The active Profiler, None while profiling is disabled.
+profiler = None
+
+
+class Profiler(object):
+    """Histograms of stage durations in nanoseconds"""
+
+    def __init__(self, clock=now_ns):
+        self.clock = clock
+        self.stages = {}
+
+    def lap(self, stage, start):
+        """Record stage as lasting from start until now, return now"""
+        now = self.clock()
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            histogram = self.stages[stage] = Histogram()
+        histogram.record(now - start)
+        return now
+
+    def report(self):
+        """Return a text table of the time spent in each stage"""
+        total = sum(histogram.sum for histogram in self.stages.values()) or 1
+        order = [stage for stage in STAGES if stage in self.stages]
+        order += sorted(set(self.stages) - set(STAGES))
+
+        lines = ['%-10s %9s %11s %10s %10s %10s %6s' % (
+            'stage', 'count', 'total ms', 'mean us', 'p50 us', 'p99 us', 'share')]
+        for stage in order:
+            histogram = self.stages[stage]
+            lines.append('%-10s %9d %11.3f %10.2f %10.2f %10.2f %5.1f%%' % (
+                stage,
+                histogram.count,
+                histogram.sum / 1e6,
+                histogram.sum / 1e3 / histogram.count,
+                histogram.percentile(50) / 1e3,
+                histogram.percentile(99) / 1e3,
+                100.0 * histogram.sum / total,
+            ))
+        return '\n'.join(lines) + '\n'
+
+
+def enable(clock=now_ns):
+    """Start profiling with a new Profiler and return it"""
+    global profiler
+    profiler = Profiler(clock)
+    return profiler
+
+
+def disable():
+    """Stop profiling and return the Profiler which was active"""
+    global profiler
+    previous, profiler = profiler, None
+    return previous
+
+
+@contextlib.contextmanager
+def profile(stream=None, quiet=False, clock=now_ns):
+    """Profile the block and write the report to stream (sys.stderr by default) unless quiet"""
+    global profiler
+    previous = profiler
+    current = profiler = Profiler(clock)
+    try:
+        yield current
+    finally:
+        profiler = previous
+        if not quiet:
+            (stream or sys.stderr).write(current.report())
@@ -0,0 +1,214 @@
+"""Reassembly of concatenated inbound messages
+
+A long mobile originated message arrives as several deliver_sm PDUs,
+linked either by a concatenation UDH (esm_class UDHI) or by the sar_*
+optional parameters. Reassembler collects them and returns the whole
+message, decoded according to data_coding, once the last part is in.
+"""
+
+import collections
+import struct
+import time
+
+import six
+
+from smpplib import consts, gsm
+
+# Message is a complete inbound message. text is None when data_coding
+# is not a text encoding, payload holds the joined data without UDH.
+Message = collections.namedtuple('Message', 'source_addr destination_addr data_coding payload text pdus')
+
+# Decoders of joined message data, by data_coding.
+DECODERS = {
+    consts.SMPP_ENCODING_IA5: lambda data: data.decode('ascii', 'replace'),
+    consts.SMPP_ENCODING_ISO88591: lambda data: data.decode('iso-8859-1'),
+    consts.SMPP_ENCODING_ISO88595: lambda data: data.decode('iso-8859-5', 'replace'),
+    consts.SMPP_ENCODING_ISO88598: lambda data: data.decode('iso-8859-8', 'replace'),
+    consts.SMPP_ENCODING_ISO10646: lambda data: data.decode('utf-16-be', 'replace'),
+}
+
+
+def parse_udh(data):
+    """Returns tuple(ies, payload) for a short message starting with a UDH
+
+    ies is a dict of information element data by IEI. Malformed headers
+    give ({}, data).
+    """
+    if not data:
+        return {}, data
+    udh_end = six.indexbytes(data, 0) + 1
+    if udh_end > len(data):
+        return {}, data
+
+    ies = {}
+    pos = 1
+    while pos + 2 <= udh_end:
+        iei = six.indexbytes(data, pos)
+        end = pos + 2 + six.indexbytes(data, pos + 1)
+        if end > udh_end:
+            return {}, data
+        ies[iei] = data[pos + 2:end]
+        pos = end
+    return ies, data[udh_end:]
+
+
+def get_segment(pdu):
+    """Returns tuple(reference, total, seqnum, payload, ies) or None for a whole message"""
+
+    data = pdu.short_message or getattr(pdu, 'message_payload', None) or b''
+
+    if pdu.esm_class & consts.SMPP_GSMFEAT_UDHI:
+        ies, payload = parse_udh(data)
+        concat = ies.get(consts.SMPP_UDHIEIE_CONCATENATED)
+        if concat is not None and len(concat) == 3:
+            reference, total, seqnum = struct.unpack('>BBB', concat)
+        else:
+            concat = ies.get(consts.SMPP_UDHIEIE_CONCATENATED16)
+            if concat is None or len(concat) != 4:
+                return None
+            reference, total, seqnum = struct.unpack('>HBB', concat)
+    elif getattr(pdu, 'sar_msg_ref_num', None) is not None:
+        ies, payload = {}, data
+        reference, total, seqnum = pdu.sar_msg_ref_num, pdu.sar_total_segments, pdu.sar_segment_seqnum
+    else:
+        return None
+
+    if not total or not seqnum or seqnum > total:
+        return None
+    return reference, total, seqnum, payload, ies
+
+
+def decode_message(payload, data_coding, ies=None):
+    """Returns text of message data, or None if data_coding is not a text encoding
+
+    ies are the UDH information elements of the message, the national
+    language shift tables of GSM 7-bit text are taken from them.
+    """
+    if data_coding == consts.SMPP_ENCODING_DEFAULT:
+        ies = ies or {}
+        locking_shift = six.indexbytes(ies.get(consts.SMPP_UDHIEIE_NATIONAL_LOCKING_SHIFT, b'\0'), 0)
+        single_shift = six.indexbytes(ies.get(consts.SMPP_UDHIEIE_NATIONAL_SINGLE_SHIFT, b'\0'), 0)
+        try:
+            return gsm.gsm_decode(payload, locking_shift, single_shift)
+        except KeyError:
+            # Shift tables this library does not know.
+            return gsm.gsm_decode(payload)
+
+    decode = DECODERS.get(data_coding)
+    if decode is None:
+        return None
+    return decode(payload)
+
+
+class _PendingMessage(object):
+    """Parts of a message received so far"""
+
+    __slots__ = ('created', 'total', 'parts', 'ies')
+
+    def __init__(self, created, total, ies):
+        self.created = created
+        self.total = total
+        self.parts = {}
+        self.ies = ies
+
+
+class Reassembler(object):
+    """Joins concatenated deliver_sm PDUs into messages
+
+    Incomplete messages are keyed by (source_addr, destination_addr,
+    reference). They are dropped ttl seconds after their first part
+    arrived, and the oldest is dropped when more than max_pending are
+    incomplete, so memory stays bounded whatever the SMSC sends.
+
+    The counters completed, expired, evicted and duplicates, together with
+    len() (incomplete messages) and fragments (parts held), are meant for
+    monitoring.
+    """
+
+    def __init__(self, ttl=300, max_pending=10000, clock=time.time):
+        self.ttl = ttl
+        self.max_pending = max_pending
+        self.clock = clock
+        # Ordered by arrival of the first part, so the oldest is first.
+        self._pending = collections.OrderedDict()
+        self.fragments = 0
+        self.completed = 0
+        self.expired = 0
+        self.evicted = 0
+        self.duplicates = 0
+
+    def __len__(self):
+        """Returns the number of incomplete messages"""
+        return len(self._pending)
+
+    def add(self, pdu):
+        """Takes a deliver_sm PDU, returns a Message once it is complete or None
+
+        PDUs which are not parts of a concatenated message are returned as
+        a Message right away.
+        """
+        now = self.clock()
+        self.expire(now)
+
+        segment = get_segment(pdu)
+        if segment is None:
+            data = pdu.short_message or getattr(pdu, 'message_payload', None) or b''
+            ies = {}
+            if pdu.esm_class & consts.SMPP_GSMFEAT_UDHI:
+                ies, data = parse_udh(data)
+            return self._message(pdu, data, ies, (pdu,))
+
+        reference, total, seqnum, payload, ies = segment
+        if total == 1:
+            return self._message(pdu, payload, ies, (pdu,))
+
+        key = (pdu.source_addr, pdu.destination_addr, reference)
+        pending = self._pending.get(key)
+        if pending is not None and pending.total != total:
+            # A new message reusing the reference of an unfinished one.
+            self._drop(key)
+            self.evicted += 1
+            pending = None
+        if pending is None:
+            pending = self._pending[key] = _PendingMessage(now, total, ies)
+            if len(self._pending) > self.max_pending:
+                self._drop(next(iter(self._pending)))
+                self.evicted += 1
+
+        if seqnum in pending.parts:
+            self.duplicates += 1
+            return None
+        pending.parts[seqnum] = (payload, pdu)
+        self.fragments += 1
+        if len(pending.parts) < total:
+            return None
+
+        self._drop(key)
+        parts = [pending.parts[i] for i in range(1, total + 1)]
+        return self._message(
+            pdu, b''.join(part[0] for part in parts), pending.ies, tuple(part[1] for part in parts))
+
+    def expire(self, now=None):
+        """Drops incomplete messages older than ttl, returns how many were dropped"""
+        if now is None:
+            now = self.clock()
+        deadline = now - self.ttl
+        count = 0
+        pending = self._pending
+        while pending:
+            key = next(iter(pending))
+            if pending[key].created > deadline:
+                break
+            self._drop(key)
+            count += 1
+        self.expired += count
+        return count
+
+    def _drop(self, key):
+        self.fragments -= len(self._pending.pop(key).parts)
+
+    def _message(self, pdu, payload, ies, pdus):
+        self.completed += 1
+        return Message(
+            pdu.source_addr, pdu.destination_addr, pdu.data_coding, payload,
+            decode_message(payload, pdu.data_coding, ies), pdus)
@@ -0,0 +1,175 @@
+"""Relaying PDUs between connections by rewriting only the header
+
+A relay forwards raw PDUs from one connection to another without
+parsing them. Only sequence_number has to change, since every
+connection numbers its requests on its own; status and body pass
+through untouched.
+
+SequenceMapper belongs to the connection requests are forwarded to. For
+an edge gateway with ESMEs on one side and an SMSC bind on the other:
+
+    upstream = SequenceMapper()
+    framer = PDUFramer()
+
+    # raw submit_sm from an ESME connection
+    smsc_socket.sendall(upstream.request(raw, origin=esme_connection))
+    for origin, nack in upstream.evicted():
+        origin.sendall(nack)
+
+    # raw submit_sm_resp from the SMSC
+    for raw in framer.feed_raw(data):
+        if is_response(raw):
+            esme_connection, raw = upstream.response(raw)
+            esme_connection.sendall(raw)
+
+deliver_sm from the SMSC goes the other way through the SequenceMapper
+of the ESME connection it is routed to. Binds and enquire_link are
+connection-local and should be answered, not relayed; rewrite_bind()
+helps when a bind is passed on with other credentials. Requests the
+connection never answers stay pending until expire() or nack_all(), or
+until the sequence numbers wrap around to them and evicted() nacks them.
+"""
+
+import logging
+import struct
+import time
+
+from smpplib import consts, smpp
+from smpplib.session import SimpleSequenceGenerator
+
+_uint32 = struct.Struct('>L')
+
+_RESPONSE_BIT = 0x80000000
+
+
+def command_id(data):
+    """Return command_id of a raw PDU"""
+    return _uint32.unpack_from(data, 4)[0]
+
+
+def sequence_number(data):
+    """Return sequence_number of a raw PDU"""
+    return _uint32.unpack_from(data, 12)[0]
+
+
+def is_response(data):
+    """Return True if the raw PDU is a response (generic_nack included)"""
+    return bool(command_id(data) & _RESPONSE_BIT)
+
+
+def rewrite_sequence(data, sequence):
+    """Return the raw PDU with another sequence_number, the rest copied as is"""
+    return data[:12] + _uint32.pack(sequence) + data[16:]
+
+
+def rewrite_bind(data, **kwargs):
+    """Return a raw bind_* PDU with parameters such as system_id or password replaced"""
+    p = smpp.parse_pdu(data, allow_unknown_opt_params=True)
+    # Parsed C-octet strings are bytes, generate() wants them as str.
+    for name, param in p.params.items():
+        value = getattr(p, name, None)
+        if param.type is str and isinstance(value, bytes) and not isinstance(value, str):
+            setattr(p, name, value.decode('latin-1'))
+    for name, value in kwargs.items():
+        setattr(p, name, value)
+    return p.generate()
+
+
+class SequenceMapper(object):
+    """Sequence numbers of requests forwarded to one connection
+
+    request() numbers a request for this connection and remembers where
+    it came from; response() puts the original sequence_number back into
+    the response and returns the origin with it.
+    """
+
+    def __init__(self, sequence_generator=None, clock=time.time, logger_name=None):
+        if sequence_generator is None:
+            sequence_generator = SimpleSequenceGenerator()
+        self.sequence_generator = sequence_generator
+        self.clock = clock
+        self.logger = logging.getLogger(logger_name or 'smpp.SequenceMapper.{}'.format(id(self)))
+        # our sequence -> (origin, original sequence, clock() when forwarded)
+        self._pending = {}
+        # (origin, original sequence) of requests replaced after a sequence wrap
+        self._evicted = []
+
+    def __len__(self):
+        """Return the number of requests awaiting their response"""
+        return len(self._pending)
+
+    def request(self, data, origin=None):
+        """Return the raw request renumbered for this connection
+
+        A request still pending under the new number, after the sequence
+        numbers wrapped around, is replaced and goes to evicted().
+        """
+        sequence = self.sequence_generator.next_sequence()
+        stale = self._pending.get(sequence)
+        if stale is not None:
+            self.logger.warning('Dropping request %d from %r, still unanswered after a sequence wrap',
+                                stale[1], stale[0])
+            self._evicted.append(stale[:2])
+        self._pending[sequence] = (origin, sequence_number(data), self.clock())
+        return rewrite_sequence(data, sequence)
+
+    def response(self, data):
+        """Return (origin, raw response renumbered for it)
+
+        origin is None for a response to no forwarded request, data is
+        then returned unchanged.
+        """
+        pending = self._pending.pop(sequence_number(data), None)
+        if pending is None:
+            return None, data
+        origin, sequence, _forwarded = pending
+        return origin, rewrite_sequence(data, sequence)
+
+    def forget(self, origin):
+        """Drop requests from origin, after its connection is lost"""
+        for sequence, pending in list(self._pending.items()):
+            if pending[0] is origin:
+                del self._pending[sequence]
+        self._evicted = [evicted for evicted in self._evicted if evicted[0] is not origin]
+
+    def clear(self):
+        """Drop all requests, after this connection is lost; return their (origin, sequence)"""
+        pending = [(origin, sequence) for origin, sequence, _forwarded in self._pending.values()]
+        pending.extend(self._evicted)
+        self._pending.clear()
+        del self._evicted[:]
+        return pending
+
+    def evicted(self, status=consts.SMPP_ESME_RSYSERR):
+        """Return [(origin, raw generic_nack)] for requests replaced since the last call
+
+        Call it after request() to answer the requests a sequence wrap
+        left without a response.
+        """
+        evicted = self._evicted
+        self._evicted = []
+        return _nacks(evicted, status)
+
+    def nack_all(self, status=consts.SMPP_ESME_RSYSERR):
+        """Clear and return [(origin, raw generic_nack)] for every request awaiting a response"""
+        return _nacks(self.clear(), status)
+
+    def expire(self, max_age, status=consts.SMPP_ESME_RSYSERR):
+        """Drop requests unanswered for max_age seconds, return [(origin, raw generic_nack)] for them"""
+        deadline = self.clock() - max_age
+        expired = []
+        for sequence, (origin, original, forwarded) in list(self._pending.items()):
+            if forwarded <= deadline:
+                del self._pending[sequence]
+                expired.append((origin, original))
+        return _nacks(expired, status)
+
+
+def _nacks(requests, status):
+    """Return [(origin, raw generic_nack)] for (origin, sequence) of requests"""
+    result = []
+    for origin, sequence in requests:
+        nack = smpp.make_pdu('generic_nack', status=status)
+        nack.sequence = sequence
+        result.append((origin, nack.generate()))
+    return result
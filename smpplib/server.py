@@ -0,0 +1,302 @@
+"""asyncio SMSC server
+
+SMSCServer accepts ESME connections, authenticates bind_* requests and
+passes submit_sm, submit_multi and data_sm to an async handler. The
+handler returns the message_id to answer with, or raises
+exceptions.PDUError(message, status) to answer with an error status:
+
+    async def handler(connection, pdu):
+        message_id = await store(pdu)
+        loop.create_task(connection.deliver(source_addr=..., short_message=...))
+        return message_id
+
+    server = SMSCServer(handler, authenticate=lambda system_id, password: password == 'secret')
+    await server.start('0.0.0.0', 2775)
+
+Each connection keeps at most window requests in its handler and window
+more waiting for it, further ones are answered with ESME_RTHROTTLED;
+reading never pauses, so responses from the ESME always get through. At
+most window deliver_sm await their response, and enquire_link is sent
+after enquire_link_interval idle seconds. query_sm, cancel_sm and
+replace_sm are answered with their failure status. One
+asyncio.Protocol per connection and a single keepalive task keep the
+cost of thousands of binds low.
+
+This module is Python 3 only (3.5 or later), it is not imported by the
+smpplib package and can not be imported on Python 2.
+"""
+
+import asyncio
+import collections
+import inspect
+import logging
+import time
+
+from smpplib import consts, exceptions, framer, smpp, smsc_common
+from smpplib.session import SimpleSequenceGenerator
+
+# Requests passed to the handler, answered with a message_id.
+HANDLED_COMMANDS = ('submit_sm', 'submit_multi', 'data_sm')
+
+# Requests the server does not support -> status of their response.
+UNSUPPORTED_COMMANDS = {
+    'query_sm': consts.SMPP_ESME_RQUERYFAIL,
+    'cancel_sm': consts.SMPP_ESME_RCANCELFAIL,
+    'replace_sm': consts.SMPP_ESME_RREPLACEFAIL,
+}
+
+
+class SMSCConnection(asyncio.Protocol):
+    """Server side of one ESME connection"""
+
+    def __init__(self, server):
+        self.server = server
+        self.state = consts.SMPP_CLIENT_STATE_CLOSED
+        self.system_id = None
+        self.peername = None
+        self.transport = None
+        self.sequence_generator = SimpleSequenceGenerator()
+        self.last_activity = time.monotonic()
+        self._framer = framer.PDUFramer(allow_unknown_opt_params=server.allow_unknown_opt_params)
+        # sequence -> Future of the response to a request sent to the ESME
+        self._pending = {}
+        self._window = asyncio.Semaphore(server.window)
+        self._handling = 0
+        # Requests waiting for a free place in the window, at most window of them.
+        self._backlog = collections.deque()
+
+    def __repr__(self):
+        return '<SMSCConnection %s %s>' % (self.peername, self.system_id)
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.peername = transport.get_extra_info('peername')
+        self.state = consts.SMPP_CLIENT_STATE_OPEN
+        self.server.connections.add(self)
+        self.server.logger.debug('Connection from %s', self.peername)
+
+    def connection_lost(self, exc):
+        self.state = consts.SMPP_CLIENT_STATE_CLOSED
+        self.server.connections.discard(self)
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(exceptions.ConnectionError())
+        self._pending.clear()
+        self.server.logger.debug('Connection from %s lost', self.peername)
+
+    def data_received(self, data):
+        self.last_activity = time.monotonic()
+        try:
+            for pdu in smsc_common.framed_pdus(self._framer, data):
+                self.pdu_received(pdu)
+        except (exceptions.PDUError, exceptions.UnknownCommandError) as e:
+            self.server.logger.warning('%s: %s', self, e)
+            nack = smpp.make_pdu('generic_nack', client=self.sequence_generator, status=(
+                e.args[1] if len(e.args) > 1 else consts.SMPP_ESME_RINVCMDID))
+            self.send_pdu(nack)
+            self.close()
+
+    def send_pdu(self, p):
+        """Write PDU to the ESME"""
+        if self.transport is None or self.transport.is_closing():
+            raise exceptions.ConnectionError()
+        self.transport.write(p.generate())
+        self.last_activity = time.monotonic()
+        return p
+
+    def respond(self, request, status=consts.SMPP_ESME_ROK, **kwargs):
+        """Send the response to a received request"""
+        resp = smpp.make_pdu(request.command + '_resp', status=status, **kwargs)
+        resp.sequence = request.sequence
+        if self.transport is not None and not self.transport.is_closing():
+            self.send_pdu(resp)
+        return resp
+
+    async def request(self, command_name, timeout=None, **kwargs):
+        """Send a request, wait for and return its response
+
+        At most window requests await their response at a time.
+        """
+        async with self._window:
+            p = smpp.make_pdu(command_name, client=self.sequence_generator, **kwargs)
+            future = asyncio.get_event_loop().create_future()
+            self._pending[p.sequence] = future
+            try:
+                self.send_pdu(p)
+                return await asyncio.wait_for(future, timeout or self.server.response_timeout)
+            finally:
+                self._pending.pop(p.sequence, None)
+
+    async def deliver(self, **kwargs):
+        """Send deliver_sm and return the deliver_sm_resp"""
+        if self.state not in smsc_common.RECEIVER_STATES:
+            raise exceptions.PDUError('Command deliver_sm failed: %s' % (
+                consts.DESCRIPTIONS[consts.SMPP_ESME_RINVBNDSTS]), consts.SMPP_ESME_RINVBNDSTS)
+        return await self.request('deliver_sm', **kwargs)
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+
+    def pdu_received(self, pdu):
+        if pdu.is_response():
+            future = self._pending.get(pdu.sequence)
+            if future is not None and not future.done():
+                future.set_result(pdu)
+        elif pdu.command in smsc_common.BIND_STATES:
+            self._bind(pdu)
+        elif pdu.command in HANDLED_COMMANDS:
+            if self.state not in consts.COMMAND_STATES[pdu.command]:
+                self.respond(pdu, consts.SMPP_ESME_RINVBNDSTS)
+            elif self._handling < self.server.window:
+                self._start(pdu)
+            elif len(self._backlog) < self.server.window:
+                self._backlog.append(pdu)
+            else:
+                self.respond(pdu, consts.SMPP_ESME_RTHROTTLED)
+        elif pdu.command == 'enquire_link':
+            self.respond(pdu)
+        elif pdu.command == 'unbind':
+            self.respond(pdu)
+            self.state = consts.SMPP_CLIENT_STATE_OPEN
+        elif pdu.command in UNSUPPORTED_COMMANDS:
+            self.respond(pdu, UNSUPPORTED_COMMANDS[pdu.command])
+        else:
+            nack = smpp.make_pdu('generic_nack', status=consts.SMPP_ESME_RINVCMDID)
+            nack.sequence = pdu.sequence
+            self.send_pdu(nack)
+
+    def _start(self, pdu):
+        """Pass a request to the handler"""
+        self._handling += 1
+        task = asyncio.get_event_loop().create_task(self._handle(pdu))
+        task.add_done_callback(self._done)
+
+    def _done(self, task):
+        self._handling -= 1
+        self._log_failure(task)
+        if self._backlog:
+            self._start(self._backlog.popleft())
+
+    def _log_failure(self, task):
+        if not task.cancelled() and task.exception() is not None:
+            self.server.logger.error('%s: handler failed', self, exc_info=task.exception())
+
+    def _bind(self, pdu):
+        authenticate = self.server.authenticate
+        if self.state != consts.SMPP_CLIENT_STATE_OPEN or authenticate is None:
+            self._bind_result(pdu, True)
+        else:
+            result = authenticate(smsc_common.as_str(pdu.system_id), smsc_common.as_str(pdu.password))
+            if inspect.isawaitable(result):
+                task = asyncio.ensure_future(self._bind_later(pdu, result))
+                task.add_done_callback(self._log_failure)
+            else:
+                self._bind_result(pdu, result)
+
+    async def _bind_later(self, pdu, result):
+        self._bind_result(pdu, await result)
+
+    def _bind_result(self, pdu, result):
+        """Answer a bind with the result of authenticate()"""
+        status = smsc_common.bind_status(self.state, result)
+        if status == consts.SMPP_ESME_ROK:
+            self.state = smsc_common.BIND_STATES[pdu.command]
+            self.system_id = smsc_common.as_str(pdu.system_id)
+            self.respond(pdu, system_id=self.server.system_id)
+        else:
+            self.respond(pdu, status)
+
+    async def _handle(self, pdu):
+        try:
+            message_id = await self.server.handler(self, pdu)
+        except exceptions.PDUError as e:
+            self.respond(pdu, e.args[1] if len(e.args) > 1 else consts.SMPP_ESME_RSYSERR)
+        except Exception:
+            self.respond(pdu, consts.SMPP_ESME_RSYSERR)
+            raise
+        else:
+            self.respond(pdu, message_id=message_id)
+
+
+class SMSCServer(object):
+    """SMPP server accepting ESME binds
+
+    handler is a coroutine function (connection, pdu) returning the
+    message_id of a submit_sm, submit_multi or data_sm. authenticate is
+    an optional function, possibly async, of (system_id, password)
+    returning True, False or an error status for the bind response; by
+    default every bind is accepted.
+    """
+
+    def __init__(
+        self,
+        handler,
+        authenticate=None,
+        system_id='SMSC',
+        window=10,
+        enquire_link_interval=30,
+        response_timeout=10,
+        allow_unknown_opt_params=True,
+        logger_name=None,
+    ):
+        self.handler = handler
+        self.authenticate = authenticate
+        self.system_id = system_id
+        self.window = window
+        self.enquire_link_interval = enquire_link_interval
+        self.response_timeout = response_timeout
+        self.allow_unknown_opt_params = allow_unknown_opt_params
+        self.logger = logging.getLogger(logger_name or 'smpp.SMSCServer.{}'.format(id(self)))
+        self.connections = set()
+        self._server = None
+        self._keepalive = None
+
+    @property
+    def address(self):
+        """(host, port) of the first listening socket"""
+        return self._server.sockets[0].getsockname()[:2]
+
+    def receivers(self, system_id):
+        """Return the connections bound as receiver or transceiver by system_id"""
+        return [connection for connection in self.connections
+                if connection.system_id == system_id and connection.state in smsc_common.RECEIVER_STATES]
+
+    async def start(self, host='127.0.0.1', port=2775, **kwargs):
+        """Start listening, kwargs are passed to loop.create_server()"""
+        loop = asyncio.get_event_loop()
+        self._server = await loop.create_server(lambda: SMSCConnection(self), host, port, **kwargs)
+        if self.enquire_link_interval:
+            self._keepalive = loop.create_task(self._keepalive_loop())
+        self.logger.info('Listening on %s:%s', *self.address)
+        return self._server
+
+    async def close(self):
+        """Stop listening and close every connection"""
+        if self._keepalive is not None:
+            self._keepalive.cancel()
+            self._keepalive = None
+        if self._server is not None:
+            self._server.close()
+            for connection in list(self.connections):
+                connection.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _keepalive_loop(self):
+        interval = self.enquire_link_interval
+        while True:
+            await asyncio.sleep(interval / 4.0)
+            idle_since = time.monotonic() - interval
+            for connection in list(self.connections):
+                if connection.last_activity < idle_since:
+                    # Mark active so the next pass does not send another one.
+                    connection.last_activity = time.monotonic()
+                    asyncio.get_event_loop().create_task(self._enquire_link(connection))
+
+    async def _enquire_link(self, connection):
+        try:
+            await connection.request('enquire_link')
+        except (asyncio.TimeoutError, exceptions.ConnectionError):
+            self.logger.warning('%s: no enquire_link_resp, closing', connection)
+            connection.close()
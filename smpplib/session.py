@@ -0,0 +1,383 @@
+"""Transport-agnostic SMPP ESME session
+
+Session implements the protocol rules of an ESME (bind state, which
+commands may be sent in which state, automatic responses) without doing
+any I/O. Feed it received bytes with receive_data(), send the bytes
+returned by data_to_send() and act on the returned events; this works the
+same way over blocking sockets, selectors or asyncio.
+"""
+
+import logging
+
+from smpplib import command, consts, exceptions, framer, smpp
+
+
+class SimpleSequenceGenerator(object):
+
+    MIN_SEQUENCE = 0x00000001
+    MAX_SEQUENCE = 0x7FFFFFFF
+
+    def __init__(self):
+        self._sequence = self.MIN_SEQUENCE
+
+    @property
+    def sequence(self):
+        return self._sequence
+
+    def next_sequence(self):
+        if self._sequence == self.MAX_SEQUENCE:
+            self._sequence = self.MIN_SEQUENCE
+        else:
+            self._sequence += 1
+        return self._sequence
+
+
+def check_command_state(command_name, state):
+    """Raise PDUError if command can not be sent in the given state"""
+
+    if state not in consts.COMMAND_STATES[command_name]:
+        raise exceptions.PDUError("Command %s failed: %s" % (
+            command_name,
+            consts.DESCRIPTIONS[consts.SMPP_ESME_RINVBNDSTS],
+        ))
+
+
+def next_state(pdu, state):
+    """Return session state after receiving a PDU"""
+
+    if pdu.is_error():
+        return state
+    return consts.STATE_SETTERS.get(pdu.command, state)
+
+
+class Event(object):
+    """Base class of session events, carries the received PDU"""
+
+    def __init__(self, pdu):
+        self.pdu = pdu
+
+    def __repr__(self):
+        return '<%s %s>' % (self.__class__.__name__, self.pdu.command)
+
+
+class Bound(Event):
+    """bind_*_resp with a successful status"""
+
+
+class Unbound(Event):
+    """unbind_resp received or unbind requested by the SMSC"""
+
+
+class MessageSent(Event):
+    """submit_sm_resp or submit_multi_resp received"""
+
+
+class MessageReceived(Event):
+    """deliver_sm received
+
+    With a reassembler, message is the complete reassembly.Message and the
+    event comes once per message, for its last part; the other parts give
+    PartReceived when auto_ack_deliver_sm is off.
+    """
+
+    def __init__(self, pdu, message=None):
+        super(MessageReceived, self).__init__(pdu)
+        self.message = message
+
+
+class PartReceived(Event):
+    """deliver_sm carrying a part of a message not complete yet
+
+    Only returned with a reassembler and auto_ack_deliver_sm off, so that
+    every part can be answered with respond().
+    """
+
+
+class QueryResp(Event):
+    """query_sm_resp received"""
+
+
+class AlertNotification(Event):
+    """alert_notification received"""
+
+
+class ErrorPDU(Event):
+    """PDU with an error status received"""
+
+
+class PDUReceived(Event):
+    """Any other PDU the session has no special handling for"""
+
+
+_EVENTS = {
+    'bind_transmitter_resp': Bound,
+    'bind_receiver_resp': Bound,
+    'bind_transceiver_resp': Bound,
+    'unbind': Unbound,
+    'unbind_resp': Unbound,
+    'submit_sm_resp': MessageSent,
+    'submit_multi_resp': MessageSent,
+    'deliver_sm': MessageReceived,
+    'query_sm_resp': QueryResp,
+    'alert_notification': AlertNotification,
+}
+
+
+class ESMEMixin(object):
+    """Protocol rules shared by Session and client.Client
+
+    Subclasses provide send_pdu(), logger, reassembler, message_payload
+    and a _payload_texts dict, cleared when the connection is lost.
+    """
+
+    def send_message(self, **kwargs):
+        """Send message
+
+        Required Arguments:
+            source_addr_ton -- Source address TON
+            source_addr -- Source address (string)
+            dest_addr_ton -- Destination address TON
+            destination_addr -- Destination address (string)
+            short_message -- Message text (string)
+        """
+
+        ssm = smpp.make_pdu('submit_sm', client=self, **kwargs)
+        self.send_pdu(ssm)
+        return ssm
+
+    def send_text(self, text, encoding=consts.SMPP_ENCODING_DEFAULT, use_udhi=True, references=None, **kwargs):
+        """Send text in as many submit_sm as needed, return the list of PDUs
+
+        Other arguments are passed to send_message(). With message_payload
+        set a long text goes in a single submit_sm; should the SMSC reject
+        it, message_payload is switched off and the text is sent again split.
+        """
+
+        esm_class = kwargs.get('esm_class', 0)
+        params = smpp.make_text_params(
+            text, encoding, use_udhi, self.message_payload, references, kwargs.get('destination_addr'))
+        pdus = []
+        for part_params in params:
+            part_params['esm_class'] |= esm_class
+            pdus.append(self.send_message(**dict(kwargs, **part_params)))
+        if 'message_payload' in params[0]:
+            self._payload_texts[pdus[0].sequence] = (
+                text, dict(kwargs, encoding=encoding, use_udhi=use_udhi, references=references))
+        return pdus
+
+    def send_multi(self, **kwargs):
+        """Send one message to several destinations
+
+        Required Arguments:
+            source_addr_ton -- Source address TON
+            source_addr -- Source address (string)
+            dest_address -- List of destinations: address strings,
+                command.SMEAddress or command.DistributionList tuples
+            short_message -- Message text (string)
+
+        Optional Arguments:
+            dest_addr_ton -- TON for destinations given as strings
+            dest_addr_npi -- NPI for destinations given as strings
+        """
+
+        kwargs['dest_address'] = command.make_dest_address(
+            kwargs.get('dest_address', ()),
+            kwargs.pop('dest_addr_ton', None),
+            kwargs.pop('dest_addr_npi', None),
+        )
+        smm = smpp.make_pdu('submit_multi', client=self, **kwargs)
+        self.send_pdu(smm)
+        return smm
+
+    def query_message(self, **kwargs):
+        """Query message state
+
+        Required Arguments:
+            message_id -- SMSC assigned Message ID
+            source_addr_ton -- Original source address TON
+            source_addr_npi -- Original source address NPI
+            source_addr -- Original source address (string)
+        """
+
+        qsm = smpp.make_pdu('query_sm', client=self, **kwargs)
+        self.send_pdu(qsm)
+        return qsm
+
+    def respond(self, pdu, status=consts.SMPP_ESME_ROK, **kwargs):
+        """Send the response to a received request"""
+
+        resp = smpp.make_pdu(pdu.command + '_resp', client=self, status=status, **kwargs)
+        resp.sequence = pdu.sequence
+        self.send_pdu(resp)
+        return resp
+
+    def _payload_rejected(self, pdu):
+        """Send the text of submit_sm_resp pdu again split if the SMSC rejected its message_payload
+
+        Return True if it did.
+        """
+
+        if not self._payload_texts:
+            return False
+        pending = self._payload_texts.pop(pdu.sequence, None)
+        if pending is None or pdu.status not in consts.MESSAGE_PAYLOAD_REJECTED_STATUSES:
+            return False
+        self.logger.warning('message_payload rejected (%d), splitting messages from now on', pdu.status)
+        self.message_payload = False
+        text, kwargs = pending
+        self.send_text(text, **kwargs)
+        return True
+
+    def _reassemble(self, pdu):
+        """Return (complete, message) for a received deliver_sm
+
+        Without a reassembler every deliver_sm is complete and message is None.
+        """
+
+        if self.reassembler is None:
+            return True, None
+        message = self.reassembler.add(pdu)
+        return message is not None, message
+
+
+class Session(ESMEMixin):
+    """SMPP ESME session state machine"""
+
+    state = consts.SMPP_CLIENT_STATE_CLOSED
+
+    def __init__(
+        self,
+        sequence_generator=None,
+        logger_name=None,
+        allow_unknown_opt_params=False,
+        max_pdu_length=consts.MAX_PDU_LENGTH,
+        auto_ack_deliver_sm=True,
+        reassembler=None,
+        message_payload=False,
+        metrics=None,
+    ):
+        if sequence_generator is None:
+            sequence_generator = SimpleSequenceGenerator()
+        self.sequence_generator = sequence_generator
+        self.logger = logging.getLogger(logger_name or 'smpp.Session.{}'.format(id(self)))
+        self.auto_ack_deliver_sm = auto_ack_deliver_sm
+        self.reassembler = reassembler
+        # The SMSC accepts long messages in message_payload, see send_text().
+        self.message_payload = message_payload
+        self._payload_texts = {}
+        # Optional metrics.Metrics, fed with every PDU sent and received.
+        self.metrics = metrics
+        self._framer = framer.PDUFramer(
+            max_length=max_pdu_length,
+            client=self,
+            allow_unknown_opt_params=allow_unknown_opt_params,
+        )
+        self._outbound = []
+
+    @property
+    def sequence(self):
+        return self.sequence_generator.sequence
+
+    def next_sequence(self):
+        return self.sequence_generator.next_sequence()
+
+    def connection_made(self):
+        """Transport is connected, binding is possible"""
+        self.state = consts.SMPP_CLIENT_STATE_OPEN
+
+    def connection_lost(self):
+        """Transport is gone, drop everything not sent yet"""
+        self.state = consts.SMPP_CLIENT_STATE_CLOSED
+        del self._outbound[:]
+        self._payload_texts.clear()
+        if self.metrics is not None:
+            self.metrics.connection_lost()
+
+    def make_pdu(self, command_name, **kwargs):
+        """Return PDU instance numbered by this session"""
+        return smpp.make_pdu(command_name, client=self, **kwargs)
+
+    def send_pdu(self, p):
+        """Queue PDU for sending"""
+
+        check_command_state(p.command, self.state)
+        self.logger.debug('Sending %s PDU', p.command)
+        self._outbound.append(p.generate())
+        if self.metrics is not None:
+            self.metrics.pdu_sent(p)
+        return p
+
+    def data_to_send(self):
+        """Return and forget all bytes queued for sending"""
+
+        data = b''.join(self._outbound)
+        del self._outbound[:]
+        return data
+
+    def bind_transmitter(self, **kwargs):
+        """Queue bind_transmitter"""
+        return self.send_pdu(self.make_pdu('bind_transmitter', **kwargs))
+
+    def bind_receiver(self, **kwargs):
+        """Queue bind_receiver"""
+        return self.send_pdu(self.make_pdu('bind_receiver', **kwargs))
+
+    def bind_transceiver(self, **kwargs):
+        """Queue bind_transceiver"""
+        return self.send_pdu(self.make_pdu('bind_transceiver', **kwargs))
+
+    def unbind(self):
+        """Queue unbind"""
+        return self.send_pdu(self.make_pdu('unbind'))
+
+    def enquire_link(self):
+        """Queue enquire_link, call it when the link has been idle"""
+        return self.send_pdu(self.make_pdu('enquire_link'))
+
+    def receive_data(self, data):
+        """Consume received bytes and return a list of events
+
+        The events of the PDUs before an invalid one are returned first
+        and the next call raises its error; after that, receive_data(b'')
+        returns the events of the PDUs following it.
+        """
+
+        events = []
+        for p in self._framer.feed(data):
+            event = self.pdu_received(p)
+            if event is not None:
+                events.append(event)
+        return events
+
+    def pdu_received(self, p):
+        """Apply a received PDU to the session, return an event or None"""
+
+        self.logger.debug('Read %s PDU', p.command)
+        if self.metrics is not None:
+            self.metrics.pdu_received(p)
+
+        if p.command == 'submit_sm_resp' and self._payload_rejected(p):
+            return None
+
+        if p.is_error():
+            return ErrorPDU(p)
+
+        if p.command == 'enquire_link':
+            self.respond(p)
+            return None
+        elif p.command == 'enquire_link_resp':
+            return None
+        elif p.command == 'unbind':
+            self.respond(p)
+            self.state = consts.SMPP_CLIENT_STATE_OPEN
+        elif p.command == 'deliver_sm':
+            if self.auto_ack_deliver_sm:
+                self.respond(p)
+            complete, message = self._reassemble(p)
+            if not complete:
+                return None if self.auto_ack_deliver_sm else PartReceived(p)
+            return MessageReceived(p, message)
+
+        self.state = next_state(p, self.state)
+
+        return _EVENTS.get(p.command, PDUReceived)(p)
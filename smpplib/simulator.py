@@ -0,0 +1,400 @@
+"""Local SMSC simulator for load and fault testing
+
+SMSCSimulator listens on localhost, accepts binds and answers submit_sm
+and submit_multi with generated message_ids, using the same command
+classes as the client. Faults are switched on by constructor arguments:
+
+    latency          -- seconds before every response, or a function returning them
+    max_rate         -- submits per second per connection before RTHROTTLED
+    error_rate       -- share of submits answered with one of error_statuses
+    max_write_size   -- write PDUs in random pieces of at most this many bytes
+    drop_rate        -- share of received PDUs on which the connection is dropped
+    receipts         -- send delivery receipts over deliver_sm when requested
+    undeliverable_rate -- share of receipts reporting UNDELIV instead of DELIVRD
+
+Example:
+
+    with SMSCSimulator(latency=0.01, max_rate=500) as smsc:
+        client = Client(*smsc.address, allow_unknown_opt_params=True)
+        ...
+
+It can also be run standalone: python -m smpplib.simulator --help
+"""
+
+import heapq
+import itertools
+import logging
+import random
+import socket
+import threading
+import time
+
+from smpplib import consts, exceptions, framer, smpp, smsc_common
+
+RECEIPT_TEXT = 'id:%s sub:001 dlvrd:%03d submit date:%s done date:%s stat:%s err:%03d text:%s'
+
+DEFAULT_ERROR_STATUSES = (
+    consts.SMPP_ESME_RSYSERR,
+    consts.SMPP_ESME_RMSGQFUL,
+    consts.SMPP_ESME_RINVDSTADR,
+    consts.SMPP_ESME_RX_T_APPN,
+)
+
+
+class _Connection(object):
+    """One ESME connection: a reader thread answering PDUs and a writer thread sending them when due"""
+
+    def __init__(self, smsc, sock):
+        self.smsc = smsc
+        self.sock = sock
+        self.state = consts.SMPP_CLIENT_STATE_OPEN
+        self.system_id = None
+        self._framer = framer.PDUFramer(allow_unknown_opt_params=True)
+        self._sequences = itertools.count(1)
+        # heap of (due time, order, raw PDU) waiting to be written
+        self._queue = []
+        self._order = itertools.count()
+        self._condition = threading.Condition()
+        self._closed = False
+        self._tokens = float(smsc.max_rate or 0)
+        self._refilled = time.time()
+
+    def start(self):
+        for target in (self._read_loop, self._write_loop):
+            thread = threading.Thread(target=target)
+            thread.daemon = True
+            thread.start()
+
+    def close(self):
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify()
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+        self.sock.close()
+        self.smsc._connection_closed(self)
+
+    def _read_loop(self):
+        try:
+            while not self._closed:
+                data = self.sock.recv(65536)
+                if not data:
+                    break
+                for pdu in smsc_common.framed_pdus(self._framer, data):
+                    self.handle(pdu)
+                    if self._closed:
+                        break
+        except (socket.error, exceptions.PDUError, exceptions.UnknownCommandError) as e:
+            self.smsc.logger.debug('Connection error: %s', e)
+        finally:
+            self.close()
+
+    def _write_loop(self):
+        queue = self._queue
+        while True:
+            with self._condition:
+                while not self._closed and (not queue or queue[0][0] > time.time()):
+                    self._condition.wait(queue[0][0] - time.time() if queue else None)
+                if self._closed:
+                    return
+                data = heapq.heappop(queue)[2]
+            try:
+                self._write(data)
+            except socket.error:
+                self.close()
+                return
+
+    def _write(self, data):
+        max_write_size = self.smsc.max_write_size
+        if not max_write_size:
+            self.sock.sendall(data)
+            return
+        pos = 0
+        while pos < len(data):
+            end = pos + self.smsc.random.randint(1, max_write_size)
+            self.sock.sendall(data[pos:end])
+            pos = end
+
+    def send(self, pdu, delay=0):
+        """Write PDU after delay seconds"""
+        with self._condition:
+            heapq.heappush(self._queue, (time.time() + delay, next(self._order), pdu.generate()))
+            self._condition.notify()
+
+    def respond(self, request, command_name, status=consts.SMPP_ESME_ROK, **kwargs):
+        resp = smpp.make_pdu(command_name, status=status, **kwargs)
+        resp.sequence = request.sequence
+        self.send(resp, self.smsc.delay())
+        return resp
+
+    def handle(self, pdu):
+        smsc = self.smsc
+        if smsc.drop_rate and smsc.random.random() < smsc.drop_rate:
+            smsc.count('dropped')
+            self.close()
+            return
+
+        if pdu.command in smsc_common.BIND_STATES:
+            self._bind(pdu)
+        elif pdu.command in ('submit_sm', 'submit_multi'):
+            self._submit(pdu)
+        elif pdu.command == 'enquire_link':
+            self.respond(pdu, 'enquire_link_resp')
+        elif pdu.command == 'unbind':
+            self.state = consts.SMPP_CLIENT_STATE_OPEN
+            self.respond(pdu, 'unbind_resp')
+        elif pdu.is_request():
+            self.respond(pdu, 'generic_nack', consts.SMPP_ESME_RINVCMDID)
+
+    def _bind(self, pdu):
+        smsc = self.smsc
+        system_id = smsc_common.as_str(pdu.system_id)
+        status = smsc_common.bind_status(self.state, smsc_common.check_credentials(
+            smsc.credentials, system_id, smsc_common.as_str(pdu.password)))
+        if status == consts.SMPP_ESME_ROK:
+            self.state = smsc_common.BIND_STATES[pdu.command]
+            self.system_id = system_id
+            smsc.count('binds')
+            self.respond(pdu, pdu.command + '_resp', system_id=smsc.system_id)
+        else:
+            smsc.count('bind_failures')
+            self.respond(pdu, pdu.command + '_resp', status)
+
+    def _submit(self, pdu):
+        smsc = self.smsc
+        smsc.count('submits')
+        resp_name = pdu.command + '_resp'
+        if self.state not in consts.COMMAND_STATES[pdu.command]:
+            self.respond(pdu, resp_name, consts.SMPP_ESME_RINVBNDSTS)
+            return
+
+        if smsc.max_rate and not self._take_token():
+            smsc.count('throttled')
+            self.respond(pdu, resp_name, consts.SMPP_ESME_RTHROTTLED)
+            return
+
+        if smsc.error_rate and smsc.random.random() < smsc.error_rate:
+            smsc.count('errors')
+            self.respond(pdu, resp_name, smsc.random.choice(smsc.error_statuses))
+            return
+
+        message_id = smsc.next_message_id()
+        self.respond(pdu, resp_name, message_id=message_id)
+        if pdu.command == 'submit_sm' and smsc.receipts:
+            smsc.send_receipt(self, pdu, message_id)
+
+    def _take_token(self):
+        """Token bucket allowing max_rate submits per second, bursts of up to one second's worth"""
+        max_rate = self.smsc.max_rate
+        now = time.time()
+        self._tokens = min(max_rate, self._tokens + (now - self._refilled) * max_rate)
+        self._refilled = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    def deliver(self, delay, **kwargs):
+        """Send deliver_sm after delay seconds"""
+        p = smpp.make_pdu('deliver_sm', **kwargs)
+        p.sequence = next(self._sequences)
+        self.send(p, delay)
+        return p
+
+
+class SMSCSimulator(object):
+    """Threaded SMSC on localhost
+
+    credentials is a dict of system_id to password, None accepts any bind.
+    stats counts connections, binds, bind_failures, submits, throttled,
+    errors, receipts and dropped events.
+    """
+
+    def __init__(
+        self,
+        host='127.0.0.1',
+        port=0,
+        system_id='SMSC',
+        credentials=None,
+        latency=0,
+        max_rate=None,
+        error_rate=0,
+        error_statuses=DEFAULT_ERROR_STATUSES,
+        max_write_size=None,
+        drop_rate=0,
+        receipts=True,
+        receipt_delay=0,
+        undeliverable_rate=0,
+        seed=None,
+        logger_name=None,
+    ):
+        self.host = host
+        self.port = port
+        self.system_id = system_id
+        self.credentials = credentials
+        self.latency = latency
+        self.max_rate = max_rate
+        self.error_rate = error_rate
+        self.error_statuses = error_statuses
+        self.max_write_size = max_write_size
+        self.drop_rate = drop_rate
+        self.receipts = receipts
+        self.receipt_delay = receipt_delay
+        self.undeliverable_rate = undeliverable_rate
+        self.random = random.Random(seed)
+        self.logger = logging.getLogger(logger_name or 'smpp.SMSCSimulator.{}'.format(id(self)))
+        self.stats = dict.fromkeys((
+            'connections', 'binds', 'bind_failures', 'submits', 'throttled', 'errors', 'receipts', 'dropped'), 0)
+        self.connections = set()
+        self._message_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._socket = None
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    @property
+    def address(self):
+        """(host, port) the simulator listens on"""
+        return self._socket.getsockname()[:2]
+
+    def start(self):
+        """Listen and accept connections in a background thread"""
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind((self.host, self.port))
+        self._socket.listen(128)
+        self._socket.settimeout(0.1)
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._accept_loop)
+        self._thread.daemon = True
+        self._thread.start()
+        self.logger.info('Listening on %s:%s', *self.address)
+
+    def stop(self):
+        """Stop listening and drop all connections"""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+        for connection in list(self.connections):
+            connection.close()
+
+    def _accept_loop(self):
+        while not self._stopped.is_set():
+            try:
+                sock, address = self._socket.accept()
+            except socket.timeout:
+                continue
+            except socket.error:
+                break
+            sock.settimeout(None)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.logger.debug('Connection from %s:%s', *address[:2])
+            connection = _Connection(self, sock)
+            with self._lock:
+                self.connections.add(connection)
+            self.count('connections')
+            connection.start()
+
+    def _connection_closed(self, connection):
+        with self._lock:
+            self.connections.discard(connection)
+
+    def count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def delay(self):
+        """Return the latency of the next response in seconds"""
+        return self.latency() if callable(self.latency) else self.latency
+
+    def next_message_id(self):
+        with self._lock:
+            return '%010x' % next(self._message_ids)
+
+    def _receiver(self, connection):
+        """Return the connection delivery receipts for a submit on connection go to"""
+        if connection.state in smsc_common.RECEIVER_STATES:
+            return connection
+        with self._lock:
+            for other in self.connections:
+                if other.system_id == connection.system_id and other.state in smsc_common.RECEIVER_STATES:
+                    return other
+        return None
+
+    def send_receipt(self, connection, submit, message_id):
+        """Send a delivery receipt for submit_sm if it asked for one"""
+        failed = self.undeliverable_rate and self.random.random() < self.undeliverable_rate
+        wanted = submit.registered_delivery & consts.SMPP_SMSC_DELIVERY_RECEIPT_BITMASK
+        if not (wanted == consts.SMPP_SMSC_DELIVERY_RECEIPT_BOTH or
+                (failed and wanted == consts.SMPP_SMSC_DELIVERY_RECEIPT_FAILURE)):
+            return
+        receiver = self._receiver(connection)
+        if receiver is None:
+            return
+
+        date = time.strftime('%y%m%d%H%M')
+        text = RECEIPT_TEXT % (
+            message_id, 0 if failed else 1, date, date, 'UNDELIV' if failed else 'DELIVRD', 1 if failed else 0,
+            (submit.short_message or b'')[:20].decode('latin-1'))
+        self.count('receipts')
+        receiver.deliver(
+            self.delay() + self.receipt_delay,
+            source_addr_ton=submit.dest_addr_ton,
+            source_addr_npi=submit.dest_addr_npi,
+            source_addr=smsc_common.as_str(submit.destination_addr),
+            dest_addr_ton=submit.source_addr_ton,
+            dest_addr_npi=submit.source_addr_npi,
+            destination_addr=smsc_common.as_str(submit.source_addr),
+            esm_class=consts.SMPP_MSGTYPE_SMSC_RECEIPT,
+            short_message=text.encode('latin-1'),
+            receipted_message_id=message_id,
+            message_state=consts.SMPP_MESSAGE_STATE_UNDELIVERABLE if failed else consts.SMPP_MESSAGE_STATE_DELIVERED,
+        )
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Local SMSC simulator')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=2775)
+    parser.add_argument('--latency', type=float, default=0, help='seconds before every response')
+    parser.add_argument('--max-rate', type=float, help='submits per second per connection before RTHROTTLED')
+    parser.add_argument('--error-rate', type=float, default=0, help='share of submits answered with an error')
+    parser.add_argument('--max-write-size', type=int, help='write PDUs in pieces of at most this many bytes')
+    parser.add_argument('--drop-rate', type=float, default=0, help='share of PDUs on which the connection is dropped')
+    parser.add_argument('--receipt-delay', type=float, default=0, help='seconds from response to delivery receipt')
+    parser.add_argument('--undeliverable-rate', type=float, default=0, help='share of UNDELIV receipts')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level='INFO')
+    smsc = SMSCSimulator(
+        args.host, args.port, latency=args.latency, max_rate=args.max_rate, error_rate=args.error_rate,
+        max_write_size=args.max_write_size, drop_rate=args.drop_rate, receipt_delay=args.receipt_delay,
+        undeliverable_rate=args.undeliverable_rate)
+    smsc.start()
+    try:
+        while True:
+            time.sleep(10)
+            smsc.logger.info('%s', smsc.stats)
+    except KeyboardInterrupt:
+        smsc.stop()
+
+
+if __name__ == '__main__':
+    main()
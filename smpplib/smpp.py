@@ -18,13 +18,24 @@
 
 """SMPP module"""
 
-from smpplib import command, pdu
+import array
+import random
+import struct
+
+from smpplib import command, command_codes, consts, exceptions, gsm, pdu, profiling
+
+_pdu_head = struct.Struct('>LL')
 
 
 def make_pdu(command_name, **kwargs):
     """Return PDU instance"""
 
+    profiler = profiling.profiler
+    if profiler is not None:
+        start = profiler.clock()
     f = command.factory(command_name, **kwargs)
+    if profiler is not None:
+        profiler.lap('make_pdu', start)
 
     return f
 
@@ -32,12 +43,122 @@ def make_pdu(command_name, **kwargs):
 def parse_pdu(data, **kwargs):
     """Parse binary PDU"""
 
-    command = pdu.extract_command(data)
+    command_name = pdu.extract_command(data)
 
-    if command is None:
+    if command_name is None:
         return None
 
-    new_pdu = make_pdu(command, **kwargs)
+    # Not make_pdu(), its profiling lap would nest in the parse_pdu one.
+    new_pdu = command.factory(command_name, **kwargs)
     new_pdu.parse(data)
 
     return new_pdu
+
+
+def make_text_params(text, encoding=consts.SMPP_ENCODING_DEFAULT, use_udhi=True, message_payload=False,
+                     references=None, destination=None):
+    """Return a list of submit_sm keyword arguments carrying text
+
+    A text needing several parts goes whole in the message_payload TLV if
+    message_payload is true, or is split by gsm.make_parts() otherwise;
+    without UDH the parts carry sar_* parameters. references is an optional
+    gsm.ReferenceAllocator numbering the parts (use bits=16 for SAR).
+    """
+    if message_payload and gsm.estimate_parts(text, encoding, use_udhi)[0] > 1:
+        payload, data_coding, esm_class = gsm.make_payload(text, encoding)
+        return [dict(message_payload=payload, data_coding=data_coding, esm_class=esm_class)]
+
+    parts, data_coding, esm_class = gsm.make_parts(
+        text, encoding, use_udhi, references=references, destination=destination)
+    params = [dict(short_message=part, data_coding=data_coding, esm_class=esm_class) for part in parts]
+
+    if len(parts) > 1 and not esm_class & consts.SMPP_GSMFEAT_UDHI:
+        if references is None:
+            reference = random.randint(0, 0xFFFF)
+        else:
+            reference = references.next_reference(destination)
+        for seqnum, part_params in enumerate(params, start=1):
+            part_params.update(
+                sar_msg_ref_num=reference, sar_total_segments=len(parts), sar_segment_seqnum=seqnum)
+
+    return params
+
+
+def make_pdus_buffer(messages, command_name='submit_sm', **kwargs):
+    """Generate PDUs for a batch of messages into one contiguous buffer.
+
+    Every item of messages is a dict of PDU parameters; kwargs are shared
+    by all of them. Return tuple(buffer, offsets) where offsets is an array
+    with the start position of every PDU in the buffer.
+    """
+
+    command_class = command.get_command_class(command_name)
+    chunks = []
+    offsets = array.array('L')
+    offset = 0
+
+    for message in messages:
+        params = dict(kwargs)
+        params.update(message)
+        raw_pdu = command_class(command_name, **params).generate()
+        offsets.append(offset)
+        offset += len(raw_pdu)
+        chunks.append(raw_pdu)
+
+    return b''.join(chunks), offsets
+
+
+def iter_parse_pdus_buffer(data, offsets=None, **kwargs):
+    """Parse PDUs from a contiguous buffer one at a time.
+
+    Without offsets the buffer is walked using command_length of each PDU.
+    """
+
+    if offsets is None:
+        offsets = _walk_pdus_buffer(data)
+
+    command_classes = {}
+    size = len(data)
+
+    for offset in offsets:
+        if offset < 0 or offset + consts.PDU_HEADER_SIZE > size:
+            raise exceptions.PDUError('No PDU header at offset %d' % offset)
+        length, code = _pdu_head.unpack_from(data, offset)
+        if length < consts.PDU_HEADER_SIZE:
+            raise exceptions.PDUError(
+                'Invalid command_length %d at offset %d' % (length, offset),
+                consts.SMPP_ESME_RINVCMDLEN,
+            )
+        if offset + length > size:
+            raise exceptions.PDUError('Truncated PDU at offset %d' % offset)
+
+        try:
+            command_name, command_class = command_classes[code]
+        except KeyError:
+            command_name = command_codes.get_command_name(code)
+            command_class = command.get_command_class(command_name)
+            command_classes[code] = command_name, command_class
+
+        new_pdu = command_class(command_name, **kwargs)
+        new_pdu.parse(data[offset:offset + length])
+        yield new_pdu
+
+
+def parse_pdus_buffer(data, offsets=None, **kwargs):
+    """Parse all PDUs from a contiguous buffer into a list"""
+    return list(iter_parse_pdus_buffer(data, offsets, **kwargs))
+
+
+def _walk_pdus_buffer(data):
+    """Yield start offsets of PDUs laid out back to back in data"""
+    offset = 0
+    size = len(data)
+    while offset < size:
+        yield offset
+        length = _pdu_head.unpack_from(data, offset)[0]
+        if length < consts.PDU_HEADER_SIZE:
+            raise exceptions.PDUError(
+                'Invalid command_length %d at offset %d' % (length, offset),
+                consts.SMPP_ESME_RINVCMDLEN,
+            )
+        offset += length
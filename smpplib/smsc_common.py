@@ -0,0 +1,65 @@
+"""Protocol rules shared by the SMSC side: simulator and server
+
+Bind states, bind status and reading PDUs off a framer, for
+simulator.SMSCSimulator and the asyncio server.SMSCServer.
+"""
+
+from smpplib import consts
+
+BIND_STATES = {
+    'bind_transmitter': consts.SMPP_CLIENT_STATE_BOUND_TX,
+    'bind_receiver': consts.SMPP_CLIENT_STATE_BOUND_RX,
+    'bind_transceiver': consts.SMPP_CLIENT_STATE_BOUND_TRX,
+}
+
+# States in which the ESME receives deliver_sm.
+RECEIVER_STATES = (consts.SMPP_CLIENT_STATE_BOUND_RX, consts.SMPP_CLIENT_STATE_BOUND_TRX)
+
+
+def as_str(value):
+    """Return a parsed C-octet string as str"""
+    if value is not None and not isinstance(value, str):
+        value = value.decode('ascii', 'replace')
+    return value
+
+
+def check_credentials(credentials, system_id, password):
+    """Return True if a dict of system_id to password, or None for any, accepts a bind
+
+    Otherwise return the status to refuse it with.
+    """
+    if credentials is None:
+        return True
+    if system_id not in credentials:
+        return consts.SMPP_ESME_RINVSYSID
+    if credentials[system_id] != password:
+        return consts.SMPP_ESME_RINVPASWD
+    return True
+
+
+def bind_status(state, result=True):
+    """Return the status answering a bind received in connection state
+
+    result is that of authenticating the bind: True, False or None for a
+    failure, or the status to refuse it with.
+    """
+    if state != consts.SMPP_CLIENT_STATE_OPEN:
+        return consts.SMPP_ESME_RALYBND
+    if result is True:
+        return consts.SMPP_ESME_ROK
+    if result is False or result is None:
+        return consts.SMPP_ESME_RBINDFAIL
+    return result
+
+
+def framed_pdus(pdu_framer, data):
+    """Yield the PDUs of data fed to pdu_framer and those buffered after them
+
+    The framer returns the PDUs before an invalid one first, and raises
+    its error on the next call; the PDUs after it stay buffered.
+    """
+    pdus = pdu_framer.feed(data)
+    while pdus:
+        for pdu in pdus:
+            yield pdu
+        pdus = pdu_framer.feed(b'')
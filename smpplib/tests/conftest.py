@@ -0,0 +1,20 @@
+import six
+
+from smpplib.smpp import make_pdu
+
+collect_ignore = []
+if six.PY2:
+    # smpplib.server uses async/await, Python 3 only.
+    collect_ignore.append('test_server.py')
+
+
+def numbered_pdu(command_name, sequence, **kwargs):
+    """Return make_pdu(command_name, **kwargs) with sequence as its sequence_number"""
+    p = make_pdu(command_name, **kwargs)
+    p.sequence = sequence
+    return p
+
+
+def raw_pdu(command_name, sequence, **kwargs):
+    """Return the bytes of numbered_pdu(command_name, sequence, **kwargs)"""
+    return numbered_pdu(command_name, sequence, **kwargs).generate()
@@ -0,0 +1,127 @@
+import threading
+
+import pytest
+from mock import Mock
+
+from smpplib import consts, exceptions
+from smpplib.capture import INBOUND, MAGIC, OUTBOUND, CaptureReader, CaptureWriter, replay
+from smpplib.client import Client
+from smpplib.session import MessageSent, Session
+from smpplib.tests.conftest import raw_pdu
+
+
+def test_write_and_read(tmpdir):
+    path = str(tmpdir.join('traffic.cap'))
+    submit = raw_pdu('submit_sm', 1, short_message=b'hello')
+    resp = raw_pdu('submit_sm_resp', 1, message_id='id1')
+
+    with CaptureWriter(path) as writer:
+        writer.write(submit, OUTBOUND, 3, timestamp=1000)
+        writer.write(resp, INBOUND, 3, timestamp=2000)
+
+    with CaptureReader(path) as reader:
+        records = list(reader)
+        pdus = [p for _record, p in reader.pdus(direction=INBOUND)]
+
+    assert [(r.timestamp, r.direction, r.bind_id, r.data) for r in records] == [
+        (1000, OUTBOUND, 3, submit), (2000, INBOUND, 3, resp)]
+    assert records[0].parse().short_message == b'hello'
+    assert [p.message_id for p in pdus] == [b'id1']
+
+
+def test_concurrent_flushes_keep_order(tmpdir):
+    path = str(tmpdir.join('traffic.cap'))
+    raw = raw_pdu('enquire_link', 1)
+
+    def write(writer, bind_id):
+        for timestamp in range(200):
+            writer.write(raw, OUTBOUND, bind_id, timestamp)
+            writer.flush()
+
+    with CaptureWriter(path, flush_interval=0.001) as writer:
+        threads = [threading.Thread(target=write, args=(writer, bind_id)) for bind_id in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    with CaptureReader(path) as reader:
+        records = list(reader)
+    assert len(records) == 800
+    for bind_id in range(4):
+        assert [r.timestamp for r in records if r.bind_id == bind_id] == list(range(200))
+
+
+def test_truncated_record_ends_capture(tmpdir):
+    path = str(tmpdir.join('traffic.cap'))
+    with CaptureWriter(path) as writer:
+        writer.write(raw_pdu('enquire_link', 1), OUTBOUND)
+        writer.write(raw_pdu('enquire_link', 2), OUTBOUND)
+    with open(path, 'rb+') as f:
+        f.truncate(len(f.read()) - 3)
+
+    with CaptureReader(path) as reader:
+        assert [r.parse().sequence for r in reader] == [1]
+
+
+def test_not_a_capture(tmpdir):
+    path = tmpdir.join('other')
+    path.write(b'')
+    with pytest.raises(exceptions.PDUError):
+        CaptureReader(str(path))
+    path.write(b'x' * 100)
+    with pytest.raises(exceptions.PDUError):
+        CaptureReader(str(path))
+
+
+def test_client_records_traffic(tmpdir):
+    path = str(tmpdir.join('traffic.cap'))
+    writer = CaptureWriter(path)
+    client = Client("localhost", 5679, allow_unknown_opt_params=True, capture=writer)
+    client.state = consts.SMPP_CLIENT_STATE_BOUND_TX
+    client._socket = Mock()
+
+    ssm = client.send_message(destination_addr='123', short_message=b'hello')
+    resp = raw_pdu('submit_sm_resp', ssm.sequence, message_id='id')
+    client._socket.recv.side_effect = [resp[:4], resp[4:]]
+    client.read_pdu()
+    client._socket = None
+    writer.close()
+
+    with open(path, 'rb') as f:
+        assert f.read(len(MAGIC)) == MAGIC
+    with CaptureReader(path) as reader:
+        records = list(reader)
+    assert [(r.direction, r.bind_id) for r in records] == [(OUTBOUND, 1), (INBOUND, 1)]
+    assert records[0].data == ssm.generate()
+    assert records[1].data == resp
+
+
+def test_replay_pacing(tmpdir):
+    path = str(tmpdir.join('traffic.cap'))
+    with CaptureWriter(path) as writer:
+        for i, timestamp in enumerate((0, 10 ** 9, 3 * 10 ** 9)):
+            writer.write(raw_pdu('submit_sm', i + 1), OUTBOUND, timestamp=timestamp)
+            writer.write(raw_pdu('submit_sm_resp', i + 1, message_id='id'), INBOUND, timestamp=timestamp)
+
+    now = [100.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    sent = []
+    with CaptureReader(path) as reader:
+        count = replay(reader, sent.append, speed=2, clock=lambda: now[0], sleep=sleep)
+
+    assert count == 3
+    assert sleeps == [0.5, 1.0]
+    assert sent == [raw_pdu('submit_sm', i) for i in (1, 2, 3)]
+
+    session = Session(allow_unknown_opt_params=True)
+    session.state = consts.SMPP_CLIENT_STATE_BOUND_TX
+    events = []
+    with CaptureReader(path) as reader:
+        replay(reader, lambda data: events.extend(session.receive_data(data)), direction=INBOUND, speed=None)
+    assert [type(event) for event in events] == [MessageSent] * 3
@@ -3,6 +3,8 @@ import pytest
 from mock import Mock, call
 
 from smpplib.client import Client
+from smpplib.gsm import make_parts
+from smpplib.reassembly import Reassembler
 from smpplib.smpp import make_pdu
 from smpplib import consts
 from smpplib import exceptions
@@ -44,3 +46,62 @@ def test_client_error_pdu_custom_handler():
     client.read_once()
 
     assert mock_error_pdu_handler.mock_calls == [call(error_pdu)]
+
+
+def test_client_send_multi():
+    client = Client("localhost", 5679, allow_unknown_opt_params=True)
+    client.state = consts.SMPP_CLIENT_STATE_BOUND_TX
+    sock = client._socket = Mock()
+
+    pdu = client.send_multi(
+        source_addr='src',
+        dest_address=['123', '456'],
+        dest_addr_ton=consts.SMPP_TON_INTL,
+        short_message=b'hello',
+    )
+    client._socket = None
+
+    assert pdu.command == 'submit_multi'
+    assert [dest.destination_addr for dest in pdu.dest_address] == ['123', '456']
+    assert pdu.dest_address[0].dest_addr_ton == consts.SMPP_TON_INTL
+    assert sock.sendall.mock_calls == [call(pdu.generate())]
+
+
+def test_client_reassembles_deliver_sm():
+    client = Client("localhost", 5679, allow_unknown_opt_params=True, reassembler=Reassembler())
+    client.state = consts.SMPP_CLIENT_STATE_BOUND_TRX
+    client.send_pdu = Mock()
+    handler = Mock(return_value=None)
+    client.set_message_received_handler(handler)
+
+    parts, encoding, esm_class = make_parts(u'a' * 200)
+    pdus = [make_pdu('deliver_sm', short_message=part, data_coding=encoding, esm_class=esm_class)
+            for part in parts]
+    client.read_pdu = Mock(side_effect=pdus)
+    client.read_once()
+    client.read_once()
+
+    (_, _, kwargs), = handler.mock_calls
+    assert kwargs['pdu'] is pdus[1]
+    assert kwargs['message'].text == u'a' * 200
+    assert [p.command for (p,), _ in client.send_pdu.call_args_list] == ['deliver_sm_resp'] * 2
+
+
+def test_client_send_text_message_payload_fallback():
+    client = Client("localhost", 5679, allow_unknown_opt_params=True, message_payload=True)
+    client.state = consts.SMPP_CLIENT_STATE_BOUND_TX
+    client.send_pdu = Mock()
+    client.set_message_sent_handler(Mock())
+
+    ssm, = client.send_text(u'@' * 400, destination_addr='123')
+    assert ssm.message_payload == b'\x00' * 400
+
+    resp = make_pdu('submit_sm_resp', status=consts.SMPP_ESME_ROPTPARNOTALLWD)
+    resp.sequence = ssm.sequence
+    client.read_pdu = Mock(return_value=resp)
+    client.read_once()
+
+    assert client.message_payload is False
+    assert client.message_sent_handler.mock_calls == []
+    parts = [p for (p,), _ in client.send_pdu.call_args_list[1:]]
+    assert [len(p.short_message) for p in parts] == [159, 159, 100]
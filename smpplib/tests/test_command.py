@@ -1,6 +1,8 @@
 from smpplib import consts, exceptions
 from smpplib.client import Client
-from smpplib.command import DeliverSM
+from smpplib.command import (
+    DeliverSM, DistributionList, SMEAddress, SubmitMulti, SubmitMultiResp, UnsuccessSME,
+)
 
 import pytest
 
@@ -47,3 +49,50 @@ def test_unrecognised_optional_parameters():
                   b'submit date:200319131913 done date:200319131913 stat:DELIVRD err:000 text:'
                   b'\x14\x03\x00\x07(null)\x00\x14\x02\x00\x04612\x00'
         )
+
+
+def test_submit_multi_roundtrip():
+    pdu = SubmitMulti(
+        'submit_multi',
+        source_addr='src',
+        dest_address=[
+            SMEAddress(consts.SMPP_TON_INTL, consts.SMPP_NPI_ISDN, '31600000000'),
+            DistributionList('friends'),
+        ],
+        short_message=b'hello',
+    )
+    pdu.sequence = 3
+
+    parsed = SubmitMulti('submit_multi')
+    parsed.parse(pdu.generate())
+
+    assert parsed.number_of_dests == 2
+    assert parsed.dest_address == [
+        SMEAddress(consts.SMPP_TON_INTL, consts.SMPP_NPI_ISDN, b'31600000000'),
+        DistributionList(b'friends'),
+    ]
+    assert parsed.source_addr == b'src'
+    assert parsed.short_message == b'hello'
+    assert parsed.sm_length == 5
+
+
+def test_submit_multi_too_many_destinations():
+    pdu = SubmitMulti('submit_multi', dest_address=[SMEAddress(0, 0, '1')] * 256)
+
+    with pytest.raises(ValueError):
+        pdu.generate()
+
+
+def test_submit_multi_resp_roundtrip():
+    pdu = SubmitMultiResp(
+        'submit_multi_resp',
+        message_id='id',
+        unsuccess_sme=[UnsuccessSME(1, 1, '123', consts.SMPP_ESME_RINVDSTADR)],
+    )
+
+    parsed = SubmitMultiResp('submit_multi_resp')
+    parsed.parse(pdu.generate())
+
+    assert parsed.message_id == b'id'
+    assert parsed.no_unsuccess == 1
+    assert parsed.unsuccess_sme == [UnsuccessSME(1, 1, b'123', consts.SMPP_ESME_RINVDSTADR)]
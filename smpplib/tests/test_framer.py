@@ -0,0 +1,97 @@
+import struct
+
+import mock
+import pytest
+
+from smpplib import consts, exceptions
+from smpplib.framer import PDUFramer
+from smpplib.smpp import make_pdu
+from smpplib.tests.conftest import raw_pdu
+
+
+def test_feed_byte_by_byte():
+    framer = PDUFramer()
+    raw = raw_pdu('submit_sm_resp', 7, message_id='abc')
+
+    pdus = []
+    for i in range(len(raw)):
+        pdus.extend(framer.feed(raw[i:i + 1]))
+
+    assert len(pdus) == 1
+    assert pdus[0].command == 'submit_sm_resp'
+    assert pdus[0].sequence == 7
+    assert pdus[0].message_id == b'abc'
+    assert len(framer) == 0
+
+
+def test_feed_several_pdus_in_one_chunk():
+    framer = PDUFramer()
+    first, second = raw_pdu('submit_sm_resp', 1, message_id='a'), raw_pdu('submit_sm_resp', 2, message_id='b')
+
+    assert framer.feed_raw(first + second[:5]) == [first]
+    assert len(framer) == 5
+    assert framer.feed_raw(second[5:]) == [second]
+
+
+def test_feed_parses_requests_without_client():
+    framer = PDUFramer()
+    p = make_pdu('enquire_link')
+    p.sequence = 42
+    raw = p.generate()
+
+    pdu, = framer.feed(raw)
+
+    assert pdu.command == 'enquire_link'
+    assert pdu.sequence == 42
+
+
+@pytest.mark.parametrize('header', [
+    b'\x00\x00\x00\x08',
+    b'\xff\xff\xff\xff',
+])
+def test_invalid_command_length(header):
+    framer = PDUFramer()
+
+    with pytest.raises(exceptions.PDUError) as exec_info:
+        framer.feed(header)
+
+    assert exec_info.value.args[1] == consts.SMPP_ESME_RINVCMDLEN
+
+
+def test_custom_max_length():
+    framer = PDUFramer(max_length=20)
+
+    with pytest.raises(exceptions.PDUError):
+        framer.feed(raw_pdu('submit_sm_resp', 1, message_id='message id'))
+
+
+def test_pdus_before_invalid_command_length():
+    framer = PDUFramer()
+    first = raw_pdu('submit_sm_resp', 1, message_id='a')
+
+    assert framer.feed_raw(first + b'\x00\x00\x00\x08') == [first]
+    for _ in range(2):
+        with pytest.raises(exceptions.PDUError):
+            framer.feed(b'')
+
+
+def test_parse_error_keeps_later_pdus():
+    framer = PDUFramer()
+    unknown = struct.pack('>LLLL', 16, 0x999, 0, 3)
+
+    data = raw_pdu('submit_sm_resp', 1, message_id='a') + unknown + raw_pdu('submit_sm_resp', 2, message_id='b')
+    first, = framer.feed(data)
+    assert first.sequence == 1
+    with pytest.raises(exceptions.UnknownCommandError):
+        framer.feed(b'')
+    second, = framer.feed(b'')
+    assert second.sequence == 2
+    assert len(framer) == 0
+
+
+def test_unparsed_pdus_are_left_out():
+    framer = PDUFramer()
+
+    data = raw_pdu('submit_sm_resp', 1, message_id='a') + raw_pdu('submit_sm_resp', 2, message_id='b')
+    with mock.patch('smpplib.smpp.parse_pdu', side_effect=[None, 'pdu']):
+        assert framer.feed(data) == ['pdu']
@@ -1,10 +1,14 @@
 # -*- coding: utf8 -*-
 
 import mock
-from pytest import mark, raises
+from pytest import importorskip, mark, raises
 
-from smpplib import consts
-from smpplib.gsm import gsm_encode, make_parts, make_parts_encoded
+from smpplib import consts, exceptions
+from smpplib.gsm import (
+    PLAN_ENCODINGS, TRANSLITERATION_TABLE, PartsCache, ReferenceAllocator, estimate_parts, estimate_parts_batch,
+    gsm_decode, gsm_encode, gsm_pack, gsm_unpack, is_gsm_text, make_parts, make_parts_batch, make_parts_encoded,
+    make_parts_from_plan, make_payload, plan_encoding, select_national_language, split_encoded, udh_fill_bits,
+)
 
 
 @mark.parametrize('plaintext, encoded_text', [
@@ -16,13 +20,34 @@ def test_gsm_encode(plaintext, encoded_text):
 
 
 @mark.parametrize('plaintext', [
-    (u'Ая',),
+    u'Ая',
+    u'abc\u00a0',
 ])
 def test_gsm_encode_unicode_error(plaintext):
+    assert not is_gsm_text(plaintext)
     with raises(UnicodeError):
         gsm_encode(plaintext)
 
 
+@mark.parametrize('plaintext', [
+    u'',
+    u'Hello @ world!\n',
+    u'{[~^]} \\ | \u20ac 10',
+    u'\xc5ngstr\xf6m \u0394\u03a6\u0393 \xbf\xa1',
+])
+def test_gsm_decode(plaintext):
+    assert is_gsm_text(plaintext)
+    assert gsm_decode(gsm_encode(plaintext)) == plaintext
+
+
+@mark.parametrize('encoded_text, plaintext', [
+    (b'\x1B\x41', u'A'),
+    (b'a\x1B\x1Bb', u'a b'),
+])
+def test_gsm_decode_unknown_escape(encoded_text, plaintext):
+    assert gsm_decode(encoded_text) == plaintext
+
+
 @mark.parametrize('plaintext, encoding, expected_parts, expected_encoding', [
     (u'@', consts.SMPP_ENCODING_DEFAULT, [b'\x00'], consts.SMPP_ENCODING_DEFAULT),
     (u'Ая', consts.SMPP_ENCODING_DEFAULT, [b'\x04\x10\x04O'], consts.SMPP_ENCODING_ISO10646),
@@ -60,3 +85,470 @@ def test_make_parts_encoded(encoded_text, part_size, expected):
 def test_part_number(text, expected):
     parts, _, _ = make_parts(text)
     assert len(parts) == expected
+
+
+def test_make_parts_keeps_escape_sequences():
+    text = u'@' * (consts.SEVENBIT_PART_SIZE - 1) + u'€' + u'@' * 10
+
+    parts, encoding, _ = make_parts(text)
+
+    assert encoding == consts.SMPP_ENCODING_DEFAULT
+    assert len(parts[0]) == 6 + consts.SEVENBIT_PART_SIZE - 1
+    assert parts[1][6:8] == b'\x1B\x65'
+    assert u''.join(gsm_decode(part[6:]) for part in parts) == text
+
+
+def test_make_parts_fills_parts_with_escape_sequences():
+    text = u'€' * 200
+
+    parts, _, _ = make_parts(text)
+
+    assert [len(part) - 6 for part in parts] == [152, 152, 96]
+
+
+@mark.parametrize('encoded_text, part_size, expected', [
+    (b'\x1B\x1B\x1B\x65', 3, [b'\x1B\x1B', b'\x1B\x65']),
+    (b'\x1B\x1B\x1B\x1B', 3, [b'\x1B\x1B', b'\x1B\x1B']),
+    (b'@@\x1B\x65', 3, [b'@@', b'\x1B\x65']),
+])
+def test_split_encoded_gsm(encoded_text, part_size, expected):
+    assert split_encoded(encoded_text, part_size, consts.SMPP_ENCODING_DEFAULT) == expected
+
+
+def test_make_parts_keeps_surrogate_pairs():
+    text = u'a' * (consts.UCS2_PART_SIZE // 2 - 1) + u'\U0001F600' + u'b' * 10
+
+    parts, encoding, _ = make_parts(text)
+
+    assert encoding == consts.SMPP_ENCODING_ISO10646
+    assert len(parts[0]) == 6 + consts.UCS2_PART_SIZE - 2
+    assert u''.join(part[6:].decode('utf-16-be') for part in parts) == text
+
+
+@mark.parametrize('plaintext, packed', [
+    (u'hellohello', b'\xe8\x32\x9b\xfd\x46\x97\xd9\xec\x37'),
+    # 7 spare bits are padded with CR.
+    (u'1234567', b'\x31\xd9\x8c\x56\xb3\xdd\x1a'),
+    (u'', b''),
+])
+def test_gsm_pack(plaintext, packed):
+    assert gsm_pack(gsm_encode(plaintext)) == packed
+    assert gsm_unpack(packed) == gsm_encode(plaintext)
+
+
+@mark.parametrize('plaintext', [u'1234567\r', u'123456789012345\r', u'123456\r\r', u'12345\r'])
+def test_gsm_pack_keeps_final_cr(plaintext):
+    septets = gsm_encode(plaintext)
+    packed = gsm_pack(septets)
+    assert gsm_unpack(packed) == septets
+    if len(septets) % 8 == 0:
+        # Another CR is added after a CR on an octet boundary.
+        assert len(packed) == len(septets) * 7 // 8 + 1
+
+
+def test_gsm_pack_final_cr_without_room():
+    septets = gsm_encode(u'a' * (consts.SEVENBIT_LENGTH - 1) + u'\r')
+    assert len(gsm_pack(septets, max_octets=consts.EIGHTBIT_LENGTH)) == consts.EIGHTBIT_LENGTH
+
+
+@mark.parametrize('fill_bits', range(7))
+def test_gsm_pack_fill_bits(fill_bits):
+    septets = gsm_encode(u'{Fill bits} €' * 11)
+    packed = gsm_pack(septets, fill_bits)
+    assert len(packed) == (len(septets) * 7 + fill_bits + 7) // 8
+    assert gsm_unpack(packed, fill_bits, len(septets)) == septets
+
+
+def test_make_parts_packed_single():
+    parts, encoding, esm_class = make_parts(u'@' * consts.SEVENBIT_LENGTH, packed=True)
+
+    assert parts == [b'\x00' * consts.EIGHTBIT_LENGTH]
+    assert encoding == consts.SMPP_ENCODING_DEFAULT
+    assert esm_class == consts.SMPP_MSGTYPE_DEFAULT
+
+
+def test_make_parts_packed_multiple():
+    text = u'hello world ' * 30
+
+    with mock.patch('random.randint') as randint:
+        randint.return_value = 0x42
+        parts, _, esm_class = make_parts(text, packed=True)
+
+    assert esm_class == consts.SMPP_GSMFEAT_UDHI
+    assert [len(part) for part in parts] == [140, 140, 54]
+    assert parts[0][:6] == b'\x05\x00\x03\x42\x03\x01'
+    assert b''.join(gsm_unpack(part[6:], udh_fill_bits(6)) for part in parts) == gsm_encode(text)
+
+
+def test_make_parts_packed_ignored_for_ucs2():
+    parts, encoding, _ = make_parts(u'Ая', packed=True)
+
+    assert parts == [b'\x04\x10\x04O']
+    assert encoding == consts.SMPP_ENCODING_ISO10646
+
+
+@mark.parametrize('plaintext, languages, locking_shift, single_shift', [
+    (u'Ağır şey ığdır', [consts.SMPP_GSM_LANG_TURKISH], consts.SMPP_GSM_LANG_TURKISH, 0),
+    (u'Ağır {şey}', [consts.SMPP_GSM_LANG_TURKISH], consts.SMPP_GSM_LANG_TURKISH, 0),
+    (u'Ação não', [consts.SMPP_GSM_LANG_PORTUGUESE], consts.SMPP_GSM_LANG_PORTUGUESE, 0),
+    (u'¿Cómo estás?', [consts.SMPP_GSM_LANG_TURKISH, consts.SMPP_GSM_LANG_SPANISH], 0, consts.SMPP_GSM_LANG_SPANISH),
+])
+def test_select_national_language(plaintext, languages, locking_shift, single_shift):
+    selected = select_national_language(plaintext, languages)
+
+    assert selected[:2] == (locking_shift, single_shift)
+    assert gsm_decode(selected[2], locking_shift, single_shift) == plaintext
+
+
+def test_select_national_language_prefers_fewer_parts():
+    # Single shift costs 2 septets per letter, locking shift only one.
+    text = u'ş' * 100
+
+    assert select_national_language(text, [consts.SMPP_GSM_LANG_TURKISH])[:2] == (consts.SMPP_GSM_LANG_TURKISH, 0)
+
+
+def test_select_national_language_keeps_default_alphabet():
+    # The Turkish locking shift table has no '¿'.
+    text = u'ğ¿'
+
+    selected = select_national_language(text, [consts.SMPP_GSM_LANG_TURKISH])
+
+    assert selected[:2] == (0, consts.SMPP_GSM_LANG_TURKISH)
+
+
+def test_select_national_language_unsupported():
+    assert select_national_language(u'Привет', [consts.SMPP_GSM_LANG_TURKISH]) is None
+
+
+def test_make_parts_national_single():
+    parts, encoding, esm_class = make_parts(u'ağ', national_languages=[consts.SMPP_GSM_LANG_TURKISH])
+
+    assert parts == [b'\x03\x25\x01\x01' + b'a\x0c']
+    assert encoding == consts.SMPP_ENCODING_DEFAULT
+    assert esm_class == consts.SMPP_GSMFEAT_UDHI
+
+
+def test_make_parts_national_multiple():
+    text = u'Ağır ' * 55
+
+    with mock.patch('random.randint') as randint:
+        randint.return_value = 0x42
+        parts, encoding, esm_class = make_parts(text, national_languages=[consts.SMPP_GSM_LANG_TURKISH])
+
+    assert encoding == consts.SMPP_ENCODING_DEFAULT
+    assert esm_class == consts.SMPP_GSMFEAT_UDHI
+    assert len(parts) == 2
+    assert parts[0][:9] == b'\x08\x00\x03\x42\x02\x01\x25\x01\x01'
+    assert max(len(part) - 9 for part in parts) <= 160 - 11
+    assert u''.join(gsm_decode(part[9:], consts.SMPP_GSM_LANG_TURKISH) for part in parts) == text
+
+
+def test_make_parts_national_fallback_to_ucs2():
+    parts, encoding, _ = make_parts(u'Ağır', use_udhi=False, national_languages=[consts.SMPP_GSM_LANG_TURKISH])
+
+    assert encoding == consts.SMPP_ENCODING_ISO10646
+
+
+@mark.parametrize('plaintext, encoding, part_count', [
+    (u'@' * 160, consts.SMPP_ENCODING_DEFAULT, 1),
+    (u'café ' * 30, consts.SMPP_ENCODING_DEFAULT, 1),
+    (u'ô' * 140, consts.SMPP_ENCODING_ISO88591, 1),
+    (u'Привет', consts.SMPP_ENCODING_ISO10646, 1),
+])
+def test_plan_encoding(plaintext, encoding, part_count):
+    plan = plan_encoding(plaintext)
+
+    assert plan.encoding == encoding
+    assert plan.part_count == part_count
+    assert len(make_parts_from_plan(plan)[0]) == part_count
+
+
+def test_plan_encoding_transliteration():
+    text = u'It’s “done” – see you soon…' * 5
+
+    plan = plan_encoding(text, encodings=PLAN_ENCODINGS[::2])
+    assert plan.encoding == consts.SMPP_ENCODING_ISO10646
+    assert plan.part_count == 3
+
+    plan = plan_encoding(text, transliteration=TRANSLITERATION_TABLE)
+    assert plan.encoding == consts.SMPP_ENCODING_DEFAULT
+    assert plan.part_count == 1
+    assert gsm_decode(plan.encoded_text) == u'It\'s "done" - see you soon...' * 5
+
+
+def test_plan_encoding_national_language():
+    text = u'Ağır ' * 40
+
+    plan = plan_encoding(text, national_languages=[consts.SMPP_GSM_LANG_TURKISH])
+
+    assert plan.encoding == consts.SMPP_ENCODING_DEFAULT
+    assert plan.locking_shift == consts.SMPP_GSM_LANG_TURKISH
+    parts, encoding, esm_class = make_parts_from_plan(plan)
+    assert len(parts) == plan.part_count == 2
+    assert esm_class == consts.SMPP_GSMFEAT_UDHI
+
+
+def test_plan_encoding_no_encoding():
+    with raises(UnicodeError):
+        plan_encoding(u'Привет', encodings=[consts.SMPP_ENCODING_DEFAULT])
+
+
+@mark.parametrize('plaintext', [
+    u'@' * 306,
+    u'@' * 152 + u'€' + u'@' * 153,
+    u'€' * 500,
+    u'Привет мир!\n' * 30,
+    u'\U0001F600' * 50,
+])
+def test_plan_encoding_part_count_matches_make_parts(plaintext):
+    plan = plan_encoding(plaintext, encodings=PLAN_ENCODINGS[::2])
+
+    assert plan.part_count == len(make_parts(plaintext)[0])
+
+
+@mark.parametrize('plaintext, encoding', [
+    (u'', consts.SMPP_ENCODING_DEFAULT),
+    (u'@' * 160, consts.SMPP_ENCODING_DEFAULT),
+    (u'@' * 161, consts.SMPP_ENCODING_DEFAULT),
+    (u'@' * 152 + u'€' + u'@' * 153, consts.SMPP_ENCODING_DEFAULT),
+    (u'{}' * 300, consts.SMPP_ENCODING_DEFAULT),
+    (u'é' * 141, consts.SMPP_ENCODING_ISO88591),
+    (u'Привет мир!\n' * 30, consts.SMPP_ENCODING_DEFAULT),
+    (u'a' * 66 + u'\U0001F600' * 40, consts.SMPP_ENCODING_DEFAULT),
+    (u'Ая' * 35, consts.SMPP_ENCODING_ISO88591),
+])
+def test_estimate_parts(plaintext, encoding):
+    parts, expected_encoding, _ = make_parts(plaintext, encoding)
+
+    assert estimate_parts(plaintext, encoding) == (len(parts), expected_encoding)
+
+
+@mark.parametrize('plaintext, encoding', [
+    (u'@' * 306, consts.SMPP_ENCODING_DEFAULT),
+    (u'é' * 268, consts.SMPP_ENCODING_ISO88591),
+    (u'Привет мир!\n' * 30, consts.SMPP_ENCODING_DEFAULT),
+    (u'Ağır ' * 60, consts.SMPP_ENCODING_DEFAULT),
+])
+def test_estimate_parts_16bit_references(plaintext, encoding):
+    languages = [consts.SMPP_GSM_LANG_TURKISH]
+    parts, _, _ = make_parts(
+        plaintext, encoding, references=ReferenceAllocator(bits=16), national_languages=languages)
+
+    assert estimate_parts(plaintext, encoding, national_languages=languages, reference_bits=16)[0] == len(parts)
+    plan = plan_encoding(plaintext, national_languages=languages, reference_bits=16)
+    assert plan.part_count == len(make_parts_from_plan(plan, references=ReferenceAllocator(bits=16))[0])
+
+
+def test_estimate_parts_national_language():
+    text = u'Ağır ' * 40
+    languages = [consts.SMPP_GSM_LANG_TURKISH]
+    parts, _, _ = make_parts(text, national_languages=languages)
+
+    assert estimate_parts(text, national_languages=languages) == (len(parts), consts.SMPP_ENCODING_DEFAULT)
+
+
+def test_estimate_parts_batch():
+    assert estimate_parts_batch([u'hi', u'@' * 200, u'Ая']) == [
+        (1, consts.SMPP_ENCODING_DEFAULT),
+        (2, consts.SMPP_ENCODING_DEFAULT),
+        (1, consts.SMPP_ENCODING_ISO10646),
+    ]
+
+
+def test_reference_allocator_counts_per_destination():
+    references = ReferenceAllocator()
+    with mock.patch('random.randint') as randint:
+        randint.side_effect = [0xFE, 0x10]
+        assert [references.next_reference('a') for _ in range(3)] == [0xFE, 0xFF, 0x00]
+        assert references.next_reference('b') == 0x10
+        assert references.next_reference('a') == 0x01
+
+
+def test_reference_allocator_forgets_least_recently_used():
+    references = ReferenceAllocator(max_destinations=2)
+    with mock.patch('random.randint') as randint:
+        randint.side_effect = [1, 10, 20, 30]
+        references.next_reference('a')
+        references.next_reference('b')
+        references.next_reference('a')
+        references.next_reference('c')
+        assert len(references) == 2
+        assert references.next_reference('a') == 3
+        assert references.next_reference('b') == 30
+
+
+def test_reference_allocator_16_bit():
+    references = ReferenceAllocator(bits=16)
+    with mock.patch('random.randint') as randint:
+        randint.return_value = 0xFFFF
+        assert references.next_reference(u'123') == 0xFFFF
+        assert references.next_reference(u'123') == 0
+        randint.assert_called_once_with(0, 0xFFFF)
+
+
+def test_make_parts_with_references():
+    references = ReferenceAllocator()
+    with mock.patch('random.randint') as randint:
+        randint.return_value = 0x42
+        first, _, _ = make_parts(u'@' * 200, references=references, destination='123')
+        second, _, _ = make_parts(u'@' * 200, references=references, destination='123')
+
+    assert [part[:6] for part in first] == [b'\x05\x00\x03\x42\x02\x01', b'\x05\x00\x03\x42\x02\x02']
+    assert [part[:6] for part in second] == [b'\x05\x00\x03\x43\x02\x01', b'\x05\x00\x03\x43\x02\x02']
+
+
+@mark.parametrize('plaintext, encoding, part_size', [
+    (u'@' * 400, consts.SMPP_ENCODING_DEFAULT, consts.SEVENBIT_PART16_SIZE),
+    (u'é' * 300, consts.SMPP_ENCODING_ISO88591, consts.EIGHTBIT_PART16_SIZE),
+    (u'Я' * 150, consts.SMPP_ENCODING_ISO10646, consts.UCS2_PART16_SIZE),
+])
+def test_make_parts_16_bit_reference(plaintext, encoding, part_size):
+    references = ReferenceAllocator(bits=16)
+    with mock.patch('random.randint') as randint:
+        randint.return_value = 0x1234
+        parts, _, esm_class = make_parts(plaintext, encoding, references=references)
+
+    assert esm_class == consts.SMPP_GSMFEAT_UDHI
+    assert parts[0][:7] == b'\x06\x08\x04\x12\x34' + bytes(bytearray([len(parts), 1]))
+    assert len(parts[0]) == consts.MULTIPART16_HEADER_SIZE + part_size
+
+
+def test_make_parts_16_bit_reference_packed():
+    references = ReferenceAllocator(bits=16)
+    parts, _, _ = make_parts(u'@' * 400, packed=True, references=references)
+
+    # 7 octet UDH plus 152 septets fill exactly 140 octets.
+    assert [len(part) for part in parts] == [140, 140, 91]
+
+
+def test_make_parts_national_16_bit_reference():
+    references = ReferenceAllocator(bits=16)
+    with mock.patch('random.randint') as randint:
+        randint.return_value = 0x1234
+        parts, _, _ = make_parts(
+            u'Ağır ' * 55, national_languages=[consts.SMPP_GSM_LANG_TURKISH], references=references)
+
+    assert parts[0][:10] == b'\x09\x08\x04\x12\x34\x02\x01\x25\x01\x01'
+
+
+BATCH_TEXTS = [
+    u'', u'Your code is 123456', u'@' * 161, u'{€}' * 40, u'é' * 141, u'Привет мир!\n' * 30,
+    u'a\U0001F600', u'Ağır ' * 40, u'x' * 1000,
+]
+
+
+@mark.parametrize('encoding', [
+    consts.SMPP_ENCODING_DEFAULT, consts.SMPP_ENCODING_ISO88591, consts.SMPP_ENCODING_ISO10646,
+])
+@mark.parametrize('national_languages', [(), (consts.SMPP_GSM_LANG_TURKISH,)])
+@mark.parametrize('numpy_min_chars', [0, 10 ** 9])
+def test_make_parts_batch(encoding, national_languages, numpy_min_chars):
+    # 0 takes the NumPy path for any batch, 10 ** 9 characters never.
+    if not numpy_min_chars:
+        importorskip('numpy')
+
+    with mock.patch('random.randint') as randint, mock.patch('smpplib.gsm._NUMPY_MIN_CHARS', numpy_min_chars):
+        randint.return_value = 0x42
+        expected = [make_parts(text, encoding, national_languages=national_languages) for text in BATCH_TEXTS]
+        assert make_parts_batch(BATCH_TEXTS, encoding, national_languages=national_languages) == expected
+
+
+def test_make_parts_batch_numpy_crossover():
+    importorskip('numpy')
+    with mock.patch('smpplib.gsm._batch_encode_numpy') as batch_encode:
+        # Texts without an alphabet go through make_parts().
+        batch_encode.return_value = [None] * 1000, [None] * 1000
+        make_parts_batch([u'Your code is 123456'] * 10)
+        assert not batch_encode.called
+        make_parts_batch([u'Your code is 123456'] * 1000)
+        assert batch_encode.called
+
+
+def test_make_parts_batch_references():
+    importorskip('numpy')
+    references = ReferenceAllocator()
+    with mock.patch('random.randint') as randint, mock.patch('smpplib.gsm._NUMPY_MIN_CHARS', 0):
+        randint.return_value = 0x42
+        results = make_parts_batch([u'a' * 200, u'b' * 200, u'c' * 200], references=references,
+                                   destinations=['1', '2', '1'])
+
+    assert [parts[0][:4] for parts, _, _ in results] == [
+        b'\x05\x00\x03\x42', b'\x05\x00\x03\x42', b'\x05\x00\x03\x43',
+    ]
+
+
+@mark.parametrize('text, kwargs', [
+    (u'Your code is 123456', {}),
+    (u'@' * 400, {}),
+    (u'@' * 400, {'packed': True}),
+    (u'Привет мир!\n' * 30, {}),
+    (u'Ağır ' * 55, {'national_languages': [consts.SMPP_GSM_LANG_TURKISH]}),
+    (u'x' * 500, {'reference_bits': 16}),
+])
+def test_make_parts_cached(text, kwargs):
+    reference_bits = kwargs.pop('reference_bits', None)
+    if reference_bits:
+        # Separate allocators, so both calls get the same reference.
+        make_kwargs = lambda: dict(kwargs, references=ReferenceAllocator(bits=reference_bits))
+    else:
+        make_kwargs = lambda: kwargs
+    cache = PartsCache()
+    with mock.patch('random.randint') as randint:
+        randint.return_value = 0x42
+        expected = make_parts(text, **make_kwargs())
+        assert make_parts(text, cache=cache, **make_kwargs()) == expected
+        randint.return_value = 0x43
+        expected = make_parts(text, **make_kwargs())
+        assert make_parts(text, cache=cache, **make_kwargs()) == expected
+
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_make_parts_cached_fresh_reference():
+    cache = PartsCache()
+    references = ReferenceAllocator()
+    first, _, _ = make_parts(u'@' * 200, references=references, cache=cache)
+    second, _, _ = make_parts(u'@' * 200, references=references, cache=cache)
+
+    assert cache.hits == 1
+    assert first[0][3] != second[0][3]
+    assert first[0][4:] == second[0][4:]
+
+
+def test_make_parts_cached_returns_copies():
+    cache = PartsCache()
+    first, _, _ = make_parts(u'hello', cache=cache)
+    first.append(b'changed')
+    second, _, _ = make_parts(u'hello', cache=cache)
+
+    assert cache.hits == 1
+    assert second == [b'hello']
+
+
+def test_parts_cache_evicts_by_size():
+    cache = PartsCache(max_size=300)
+    cache.put('a', 1, 100)
+    cache.put('b', 2, 100)
+    cache.get('a')
+    cache.put('c', 3, 150)
+    cache.put('d', 4, 1000)
+
+    assert cache.get('a') == 1
+    assert cache.get('b') is None
+    assert cache.get('c') == 3
+    assert cache.get('d') is None
+    assert cache.size == 250
+
+
+@mark.parametrize('plaintext, encoding, packed, expected', [
+    (u'@' * 400, consts.SMPP_ENCODING_DEFAULT, False, (b'\x00' * 400, consts.SMPP_ENCODING_DEFAULT)),
+    (u'@' * 8, consts.SMPP_ENCODING_DEFAULT, True, (b'\x00' * 7, consts.SMPP_ENCODING_DEFAULT)),
+    (u'Я' * 100, consts.SMPP_ENCODING_DEFAULT, False, (b'\x04\x2f' * 100, consts.SMPP_ENCODING_ISO10646)),
+])
+def test_make_payload(plaintext, encoding, packed, expected):
+    assert make_payload(plaintext, encoding, packed) == expected + (consts.SMPP_MSGTYPE_DEFAULT,)
+
+
+def test_make_payload_too_long():
+    with raises(exceptions.MessageTooLong):
+        make_payload(u'Я' * 40000)
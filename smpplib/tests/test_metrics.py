@@ -0,0 +1,147 @@
+from mock import Mock
+import pytest
+
+from smpplib import consts
+from smpplib.client import Client
+from smpplib.metrics import Histogram, Metrics
+from smpplib.tests.conftest import numbered_pdu
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def test_histogram_buckets():
+    histogram = Histogram(sub_bits=3, max_bits=20)
+    # 1 << 30 is past max_bits and lands in the last bucket.
+    for value in (0, 7, 8, 15, 16, 17, 18, 1000, 1 << 30):
+        histogram.record(value)
+
+    assert histogram.count == 9
+    assert histogram.snapshot()['buckets'] == [
+        ((0, 1), 1), ((7, 8), 1), ((8, 9), 1), ((15, 16), 1), ((16, 18), 2), ((18, 20), 1),
+        ((960, 1024), 1), ((15 << 16, 16 << 16), 1),
+    ]
+
+
+def test_histogram_negative_value():
+    histogram = Histogram()
+    histogram.record(-5)
+
+    assert histogram.snapshot() == {'count': 1, 'sum': 0, 'overflow_max': 0, 'buckets': [((0, 1), 1)]}
+
+
+def test_histogram_relative_error():
+    histogram = Histogram()
+    for value in range(1, 100000, 7):
+        histogram.record(value)
+        index = max(i for i, count in enumerate(histogram.counts) if count)
+        lower, upper = histogram.bucket_bounds(index)
+        assert lower <= value < upper
+        assert upper - lower <= max(1, value / 8.0)
+        histogram.counts[index] = 0
+
+
+def test_histogram_percentile():
+    histogram = Histogram()
+    for value in range(1, 101):
+        histogram.record(value * 1000)
+
+    assert 48000 <= histogram.percentile(50) <= 56000
+    assert histogram.percentile(100) >= 100000
+
+
+def test_histogram_percentile_past_last_bucket():
+    histogram = Histogram(sub_bits=3, max_bits=20)
+    histogram.record(1000)
+    histogram.record(5 << 30)
+
+    assert histogram.percentile(100) == 5 << 30
+    assert histogram.snapshot()['overflow_max'] == 5 << 30
+
+
+def test_histogram_merge():
+    merged, first, second = Histogram(max_bits=20), Histogram(max_bits=20), Histogram(max_bits=20)
+    for value in (1, 100, 1 << 25):
+        first.record(value)
+        merged.record(value)
+    for value in (100, 5000, 1 << 30):
+        second.record(value)
+        merged.record(value)
+
+    first.merge(second)
+    assert first.snapshot() == merged.snapshot()
+    with pytest.raises(ValueError):
+        first.merge(Histogram())
+
+
+def test_metrics_counts_and_latency():
+    clock = Clock()
+    metrics = Metrics(clock=clock)
+
+    metrics.pdu_sent(numbered_pdu('submit_sm', 1, short_message=b'a'))
+    metrics.pdu_sent(numbered_pdu('submit_sm', 2, short_message=b'b'))
+    assert metrics.in_flight == 2
+
+    clock.now = 5000000
+    metrics.pdu_received(numbered_pdu('submit_sm_resp', 1, message_id='id'))
+    metrics.pdu_received(numbered_pdu('submit_sm_resp', 2, status=consts.SMPP_ESME_RTHROTTLED))
+    metrics.pdu_received(numbered_pdu('deliver_sm', 9))
+    metrics.pdu_sent(numbered_pdu('deliver_sm_resp', 9))
+
+    snapshot = metrics.snapshot()
+    assert snapshot['sent'] == {'submit_sm': 2, 'deliver_sm_resp': 1}
+    assert snapshot['received'] == {'submit_sm_resp': 2, 'deliver_sm': 1}
+    assert snapshot['errors'] == {consts.SMPP_ESME_RTHROTTLED: 1}
+    assert snapshot['in_flight'] == 0
+    assert snapshot['latency']['submit_sm']['count'] == 2
+    assert snapshot['latency']['submit_sm']['sum'] == 10000000
+
+
+def test_metrics_prometheus():
+    clock = Clock()
+    metrics = Metrics(clock=clock)
+    metrics.pdu_sent(numbered_pdu('submit_sm', 1, short_message=b'a'))
+    clock.now = 3000000
+    metrics.pdu_received(numbered_pdu('submit_sm_resp', 1, status=consts.SMPP_ESME_RTHROTTLED))
+
+    text = metrics.prometheus()
+
+    assert 'smpp_pdus_sent_total{command="submit_sm"} 1\n' in text
+    assert 'smpp_errors_total{status="0x00000058",description="Throttling error (ESME has exceeded allowed message limits)"} 1\n' in text
+    assert 'smpp_in_flight 0\n' in text
+    assert 'smpp_response_latency_seconds_bucket{command="submit_sm",le="0.002097152"} 0\n' in text
+    assert 'smpp_response_latency_seconds_bucket{command="submit_sm",le="0.004194304"} 1\n' in text
+    assert 'smpp_response_latency_seconds_bucket{command="submit_sm",le="+Inf"} 1\n' in text
+    assert 'smpp_response_latency_seconds_count{command="submit_sm"} 1\n' in text
+
+
+def test_metrics_prometheus_escapes_labels(monkeypatch):
+    monkeypatch.setitem(consts.DESCRIPTIONS, consts.SMPP_ESME_RTHROTTLED, 'Say "slow"\\down\nnow')
+    metrics = Metrics(clock=Clock())
+    metrics.pdu_sent(numbered_pdu('submit_sm', 1, short_message=b'a'))
+    metrics.pdu_received(numbered_pdu('submit_sm_resp', 1, status=consts.SMPP_ESME_RTHROTTLED))
+
+    assert 'description="Say \\"slow\\"\\\\down\\nnow"} 1\n' in metrics.prometheus()
+
+
+def test_client_feeds_metrics():
+    metrics = Metrics()
+    client = Client("localhost", 5679, allow_unknown_opt_params=True, metrics=metrics)
+    client.state = consts.SMPP_CLIENT_STATE_BOUND_TX
+    client._socket = Mock()
+
+    ssm = client.send_message(destination_addr='123', short_message=b'hello')
+    resp = numbered_pdu('submit_sm_resp', ssm.sequence, message_id='id')
+    client._socket.recv.side_effect = [resp.generate()[:4], resp.generate()[4:]]
+    client.read_pdu()
+    client._socket = None
+
+    assert metrics.sent == {'submit_sm': 1}
+    assert metrics.received == {'submit_sm_resp': 1}
+    assert metrics.latency['submit_sm'].count == 1
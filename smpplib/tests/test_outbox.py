@@ -0,0 +1,227 @@
+import itertools
+import os
+import socket
+import threading
+
+from mock import Mock
+
+from smpplib import consts
+from smpplib.client import Client
+from smpplib.outbox import Outbox
+from smpplib.smpp import make_pdu, parse_pdu
+
+
+def _client(outbox):
+    client = Client("localhost", 5679, allow_unknown_opt_params=True, outbox=outbox)
+    client.state = consts.SMPP_CLIENT_STATE_BOUND_TX
+    client._socket = Mock()
+    return client
+
+
+def _sent(client):
+    return [parse_pdu(c[0][0]) for c in client._socket.sendall.call_args_list]
+
+
+def _resp(client, p, status=consts.SMPP_ESME_ROK):
+    resp = make_pdu('submit_sm_resp', status=status, message_id='id' if not status else None)
+    resp.sequence = p.sequence
+    raw = resp.generate()
+    client._socket.recv.side_effect = [raw[:4], raw[4:]]
+    client.read_once()
+
+
+def test_window_and_acks(tmpdir):
+    outbox = Outbox(str(tmpdir), window=2)
+    for i in range(3):
+        outbox.put(destination_addr='123', short_message=b'message %d' % i)
+    assert outbox.wait()
+
+    client = _client(outbox)
+    client.message_sent_handler = Mock()
+    outbox.fill(client)
+    sent = _sent(client)
+    assert [p.short_message for p in sent] == [b'message 0', b'message 1']
+    assert outbox.in_flight == 2
+
+    _resp(client, sent[0])
+    sent = _sent(client)
+    assert [p.short_message for p in sent] == [b'message 0', b'message 1', b'message 2']
+    assert len(outbox) == 2
+    client._socket = None
+    outbox.close()
+
+
+def test_read_timeout_fills_idle_window(tmpdir):
+    outbox = Outbox(str(tmpdir), window=2)
+    client = _client(outbox)
+    outbox.put(destination_addr='123', short_message=b'late')
+    outbox.wait()
+
+    client._socket.recv.side_effect = socket.timeout()
+    client.read_once()
+    assert [p.command for p in _sent(client)] == ['submit_sm', 'enquire_link']
+    assert _sent(client)[0].short_message == b'late'
+    assert outbox.in_flight == 1
+    client._socket = None
+    outbox.close()
+
+
+class _Sender(object):
+    """Just enough of a client for fill()"""
+
+    def __init__(self):
+        self.sent = []
+        self._sequences = itertools.count(1)
+
+    def next_sequence(self):
+        return next(self._sequences)
+
+    def send_pdu(self, entry):
+        self.sent.append(entry)
+
+
+class _LockedDict(dict):
+    """Dict failing every change made without holding lock"""
+
+    def __init__(self, lock):
+        super(_LockedDict, self).__init__()
+        self.lock = lock
+
+    def __setitem__(self, key, value):
+        assert self.lock.locked()
+        super(_LockedDict, self).__setitem__(key, value)
+
+    def pop(self, *args):
+        assert self.lock.locked()
+        return super(_LockedDict, self).pop(*args)
+
+    def clear(self):
+        assert self.lock.locked()
+        super(_LockedDict, self).clear()
+
+
+def test_in_flight_changes_hold_the_lock(tmpdir):
+    outbox = Outbox(str(tmpdir))
+    outbox._in_flight = _LockedDict(outbox._lock)
+    outbox.put(destination_addr='123', short_message=b'x')
+    outbox.put(destination_addr='123', short_message=b'y')
+    outbox.wait()
+    sender = _Sender()
+
+    outbox.fill(sender)
+    assert outbox.response(Mock(sequence=sender.sent[0].sequence, status=consts.SMPP_ESME_ROK))
+    outbox.connection_lost()
+    assert outbox.in_flight == 0
+    outbox.close()
+
+
+def test_fill_and_response_from_two_threads(tmpdir):
+    outbox = Outbox(str(tmpdir), window=5)
+    for i in range(500):
+        outbox.put(destination_addr='123', short_message=b'x')
+    outbox.wait()
+    sender = _Sender()
+
+    def respond():
+        answered = 0
+        while answered < 500:
+            if answered < len(sender.sent):
+                outbox.response(Mock(sequence=sender.sent[answered].sequence, status=consts.SMPP_ESME_ROK))
+                answered += 1
+
+    thread = threading.Thread(target=respond)
+    thread.start()
+    while len(sender.sent) < 500:
+        outbox.fill(sender)
+    thread.join()
+
+    assert sorted(entry.entry_id for entry in sender.sent) == list(range(500))
+    assert outbox.in_flight == 0
+    outbox.close()
+    with Outbox(str(tmpdir)) as reopened:
+        assert len(reopened) == 0
+
+
+def test_retry_and_connection_lost(tmpdir):
+    now = [100.0]
+    outbox = Outbox(str(tmpdir), window=1, retry_delay=2, max_retry_delay=3, clock=lambda: now[0])
+    outbox.put(destination_addr='123', short_message=b'first')
+    outbox.put(destination_addr='123', short_message=b'second')
+    outbox.wait()
+
+    client = _client(outbox)
+    client.error_pdu_handler = Mock()
+    outbox.fill(client)
+    _resp(client, _sent(client)[-1], consts.SMPP_ESME_RTHROTTLED)
+    # Not resent, nor the entry behind it, before retry_delay.
+    assert [p.short_message for p in _sent(client)] == [b'first']
+    now[0] += 1.9
+    outbox.fill(client)
+    assert [p.short_message for p in _sent(client)] == [b'first']
+    now[0] += 0.1
+    outbox.fill(client)
+    assert [p.short_message for p in _sent(client)] == [b'first', b'first']
+
+    # The delay doubles up to max_retry_delay.
+    _resp(client, _sent(client)[-1], consts.SMPP_ESME_RTHROTTLED)
+    now[0] += 2.9
+    outbox.fill(client)
+    assert len(_sent(client)) == 2
+    now[0] += 0.1
+    outbox.fill(client)
+    assert [p.short_message for p in _sent(client)] == [b'first', b'first', b'first']
+
+    client.disconnect()
+    client._socket = Mock()
+    client.state = consts.SMPP_CLIENT_STATE_BOUND_TX
+    outbox.fill(client)
+    assert [p.short_message for p in _sent(client)] == [b'first']
+    client._socket = None
+    outbox.close()
+
+
+def test_recovery(tmpdir):
+    directory = str(tmpdir)
+    outbox = Outbox(directory, window=10)
+    for i in range(5):
+        outbox.put(destination_addr='123', short_message=b'message %d' % i)
+    outbox.wait()
+    outbox.ack(1)
+    outbox.ack(3)
+    outbox.close()
+
+    # A crash in the middle of writing an entry leaves part of it behind.
+    log = os.path.join(directory, '%020d.log' % 0)
+    with open(log, 'ab') as f:
+        f.write(b'\x00\x00\x01\x00partial')
+
+    outbox = Outbox(directory, window=10)
+    assert len(outbox) == 3
+    client = _client(outbox)
+    outbox.fill(client)
+    assert [p.short_message for p in _sent(client)] == [b'message 0', b'message 2', b'message 4']
+    assert outbox.put(destination_addr='123', short_message=b'message 5') == 5
+    client._socket = None
+    outbox.close()
+
+    outbox = Outbox(directory)
+    assert len(outbox) == 4
+    outbox.close()
+
+
+def test_acked_segments_are_deleted(tmpdir):
+    outbox = Outbox(str(tmpdir), segment_entries=8)
+    for i in range(10):
+        outbox.put(destination_addr='123', short_message=b'x')
+    outbox.wait()
+    assert sorted(os.listdir(str(tmpdir))) == [
+        '%020d.ack' % 0, '%020d.log' % 0, '%020d.ack' % 8, '%020d.log' % 8]
+
+    for entry_id in range(8):
+        outbox.ack(entry_id)
+    outbox.close()
+
+    assert sorted(os.listdir(str(tmpdir))) == ['%020d.ack' % 8, '%020d.log' % 8]
+    outbox = Outbox(str(tmpdir), segment_entries=8)
+    assert len(outbox) == 2
+    outbox.close()
@@ -0,0 +1,60 @@
+import six
+from mock import Mock
+
+from smpplib import consts, profiling
+from smpplib.client import Client
+from smpplib.smpp import make_pdu
+
+
+class Clock(object):
+    """Advances by a microsecond on every reading"""
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        self.now += 1000
+        return self.now
+
+
+def test_disabled_by_default():
+    assert profiling.profiler is None
+
+
+def test_profile_client_stages():
+    client = Client("localhost", 5679, allow_unknown_opt_params=True)
+    client.state = consts.SMPP_CLIENT_STATE_BOUND_TX
+    client._socket = Mock()
+    handler = Mock(return_value=None)
+    client.set_message_sent_handler(handler)
+    stream = six.StringIO()
+
+    with profiling.profile(stream, clock=Clock()) as profiler:
+        ssm = client.send_message(destination_addr='123', short_message=b'hello')
+        resp = make_pdu('submit_sm_resp', message_id='id')
+        resp.sequence = ssm.sequence
+        raw = resp.generate()
+        client._socket.recv.side_effect = [raw[:4], raw[4:]]
+        client.read_once()
+    client._socket = None
+
+    assert profiling.profiler is None
+    assert handler.called
+    assert set(profiler.stages) == {'make_pdu', 'generate', 'sendall', 'recv', 'parse_pdu', 'handler'}
+    # submit_sm and the response built here; parse_pdu() is timed on its own.
+    assert profiler.stages['make_pdu'].count == 2
+    assert profiler.stages['sendall'].sum == 1000
+    report = stream.getvalue()
+    assert report.splitlines()[0].split()[0] == 'stage'
+    assert [line.split()[0] for line in report.splitlines()[1:]] == list(profiling.STAGES)
+
+
+def test_enable_disable():
+    profiler = profiling.enable()
+    try:
+        make_pdu('enquire_link')
+    finally:
+        assert profiling.disable() is profiler
+
+    assert profiler.stages['make_pdu'].count == 1
+    assert profiling.profiler is None
@@ -0,0 +1,138 @@
+# -*- coding: utf8 -*-
+
+from pytest import mark
+
+from smpplib import consts
+from smpplib.gsm import ReferenceAllocator, make_parts
+from smpplib.reassembly import Reassembler, decode_message, parse_udh
+from smpplib.smpp import make_pdu, parse_pdu
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _deliver_sm(short_message, source_addr='111', destination_addr='222', **kwargs):
+    p = make_pdu(
+        'deliver_sm', source_addr=source_addr, destination_addr=destination_addr,
+        short_message=short_message, **kwargs)
+    return parse_pdu(p.generate(), allow_unknown_opt_params=True)
+
+
+def _deliver_parts(text, **kwargs):
+    parts, encoding, esm_class = make_parts(text, **kwargs)
+    return [_deliver_sm(part, data_coding=encoding, esm_class=esm_class) for part in parts]
+
+
+@mark.parametrize('text, kwargs', [
+    (u'@{}' * 100, {}),
+    (u'Привет мир!\n' * 30, {}),
+    (u'a' * 66 + u'\U0001F600' * 40, {}),
+    (u'Ağır ' * 55, {'national_languages': [consts.SMPP_GSM_LANG_TURKISH]}),
+    (u'x' * 500, {'references': ReferenceAllocator(bits=16)}),
+])
+def test_reassemble_in_any_order(text, kwargs):
+    pdus = _deliver_parts(text, **kwargs)
+    assert len(pdus) > 1
+    reassembler = Reassembler()
+
+    results = [reassembler.add(p) for p in reversed(pdus)]
+
+    assert results[:-1] == [None] * (len(pdus) - 1)
+    message = results[-1]
+    assert message.text == text
+    assert message.source_addr == b'111'
+    assert message.pdus == tuple(pdus)
+    assert len(reassembler) == 0
+    assert reassembler.fragments == 0
+
+
+def test_reassemble_sar():
+    reassembler = Reassembler()
+    first = _deliver_sm(b'Hello, ', sar_msg_ref_num=7, sar_total_segments=2, sar_segment_seqnum=1)
+    second = _deliver_sm(b'world', sar_msg_ref_num=7, sar_total_segments=2, sar_segment_seqnum=2)
+
+    assert reassembler.add(second) is None
+    assert reassembler.add(first).text == u'Hello, world'
+
+
+def test_whole_message_passes_through():
+    reassembler = Reassembler()
+
+    message = reassembler.add(_deliver_sm(b'\x00\x01\x02', data_coding=consts.SMPP_ENCODING_BINARY))
+
+    assert message.payload == b'\x00\x01\x02'
+    assert message.text is None
+    assert reassembler.completed == 1
+
+
+def test_keys_do_not_mix():
+    reassembler = Reassembler()
+    first = _deliver_parts(u'a' * 200)
+    second = _deliver_parts(u'b' * 200)
+    for p in second:
+        p.source_addr = b'333'
+
+    assert reassembler.add(first[0]) is None
+    assert reassembler.add(second[0]) is None
+    assert len(reassembler) == 2
+    assert reassembler.add(second[1]).text == u'b' * 200
+    assert reassembler.add(first[1]).text == u'a' * 200
+
+
+def test_duplicates_are_counted():
+    reassembler = Reassembler()
+    pdus = _deliver_parts(u'a' * 200)
+
+    assert reassembler.add(pdus[0]) is None
+    assert reassembler.add(pdus[0]) is None
+    assert reassembler.duplicates == 1
+    assert reassembler.add(pdus[1]).text == u'a' * 200
+
+
+def test_ttl_expiry():
+    clock = Clock()
+    reassembler = Reassembler(ttl=60, clock=clock)
+    pdus = _deliver_parts(u'a' * 200)
+
+    reassembler.add(pdus[0])
+    clock.now += 61
+
+    assert reassembler.add(pdus[1]) is None
+    assert reassembler.expired == 1
+    assert len(reassembler) == 1
+    assert reassembler.fragments == 1
+
+
+def test_max_pending_evicts_oldest():
+    reassembler = Reassembler(max_pending=2)
+    references = ReferenceAllocator()
+    messages = [_deliver_parts(u'a' * 200, references=references) for _ in range(3)]
+
+    for pdus in messages:
+        reassembler.add(pdus[0])
+
+    assert len(reassembler) == 2
+    assert reassembler.evicted == 1
+    assert reassembler.add(messages[0][1]) is None
+    assert reassembler.add(messages[2][1]).text == u'a' * 200
+
+
+def test_parse_udh():
+    assert parse_udh(b'\x05\x00\x03\x42\x02\x01abc') == ({0: b'\x42\x02\x01'}, b'abc')
+    assert parse_udh(b'\x09\x00\x03abc') == ({}, b'\x09\x00\x03abc')
+
+
+@mark.parametrize('payload, data_coding, expected', [
+    (b'\x00', consts.SMPP_ENCODING_DEFAULT, u'@'),
+    (b'\xe9', consts.SMPP_ENCODING_ISO88591, u'é'),
+    (b'\x04\x1f', consts.SMPP_ENCODING_ISO10646, u'П'),
+    (b'\x00', consts.SMPP_ENCODING_BINARY, None),
+])
+def test_decode_message(payload, data_coding, expected):
+    assert decode_message(payload, data_coding) == expected
@@ -0,0 +1,79 @@
+from smpplib import consts, relay
+from smpplib.session import SimpleSequenceGenerator
+from smpplib.smpp import parse_pdu
+from smpplib.tests.conftest import raw_pdu
+
+
+def test_sequence_mapper_round_trip():
+    upstream = relay.SequenceMapper()
+    submit_a = raw_pdu('submit_sm', 7, short_message=b'from a')
+    submit_b = raw_pdu('submit_sm', 7, short_message=b'from b')
+
+    forwarded_a = upstream.request(submit_a, origin='a')
+    forwarded_b = upstream.request(submit_b, origin='b')
+
+    assert relay.sequence_number(forwarded_a) != relay.sequence_number(forwarded_b)
+    assert forwarded_a[:12] == submit_a[:12] and forwarded_a[16:] == submit_a[16:]
+    assert len(upstream) == 2
+
+    resp = raw_pdu('submit_sm_resp', relay.sequence_number(forwarded_b), status=consts.SMPP_ESME_RTHROTTLED)
+    origin, returned = upstream.response(resp)
+
+    assert origin == 'b'
+    assert relay.is_response(returned)
+    assert returned == raw_pdu('submit_sm_resp', 7, status=consts.SMPP_ESME_RTHROTTLED)
+    assert len(upstream) == 1
+
+
+def test_unknown_response_passes_through():
+    resp = raw_pdu('submit_sm_resp', 99, message_id='id')
+    assert relay.SequenceMapper().response(resp) == (None, resp)
+
+
+def test_forget_and_nack_all():
+    upstream = relay.SequenceMapper()
+    upstream.request(raw_pdu('submit_sm', 1), origin='a')
+    upstream.request(raw_pdu('submit_sm', 2), origin='b')
+    upstream.request(raw_pdu('submit_sm', 3), origin='b')
+
+    upstream.forget('a')
+    nacks = upstream.nack_all()
+
+    assert len(upstream) == 0
+    assert sorted((origin, parse_pdu(raw).sequence) for origin, raw in nacks) == [('b', 2), ('b', 3)]
+    assert all(parse_pdu(raw).status == consts.SMPP_ESME_RSYSERR for _origin, raw in nacks)
+
+
+def test_expire_and_sequence_wrap():
+    now = [100.0]
+    generator = SimpleSequenceGenerator()
+    upstream = relay.SequenceMapper(generator, clock=lambda: now[0])
+    upstream.request(raw_pdu('submit_sm', 1), origin='a')
+    now[0] += 10
+    upstream.request(raw_pdu('submit_sm', 2), origin='b')
+
+    nacks = upstream.expire(5)
+    assert [(origin, parse_pdu(raw).sequence) for origin, raw in nacks] == [('a', 1)]
+    assert len(upstream) == 1
+
+    # After a wrap, the request of b still pending under its number is replaced.
+    generator._sequence = generator.MAX_SEQUENCE
+    for sequence in (3, 4, 5):
+        forwarded = upstream.request(raw_pdu('submit_sm', sequence), origin='c')
+    assert len(upstream) == 3
+    origin, resp = upstream.response(raw_pdu('submit_sm_resp', relay.sequence_number(forwarded)))
+    assert (origin, relay.sequence_number(resp)) == ('c', 5)
+
+    # b gets a generic_nack for it, once.
+    nacks = upstream.evicted(consts.SMPP_ESME_RTHROTTLED)
+    assert [(origin, parse_pdu(raw).sequence, parse_pdu(raw).status) for origin, raw in nacks] == [
+        ('b', 2, consts.SMPP_ESME_RTHROTTLED)]
+    assert upstream.evicted() == []
+
+
+def test_rewrite_bind():
+    bind = raw_pdu('bind_transceiver', 4, system_id='esme', password='pw', system_type='CMT')
+
+    p = parse_pdu(relay.rewrite_bind(bind, system_id='upstream', password='secret'))
+
+    assert (p.system_id, p.password, p.system_type, p.sequence) == (b'upstream', b'secret', b'CMT', 4)
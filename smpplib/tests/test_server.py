@@ -0,0 +1,212 @@
+import asyncio
+
+from smpplib import consts, exceptions, smpp
+from smpplib.server import SMSCServer
+from smpplib.session import Bound, ErrorPDU, MessageReceived, MessageSent, Session
+
+
+class ESME(object):
+    """Session over an asyncio stream"""
+
+    async def connect(self, server):
+        self.reader, self.writer = await asyncio.open_connection(*server.address)
+        self.session = Session(allow_unknown_opt_params=True)
+        self.session.connection_made()
+        return self
+
+    async def events(self, count):
+        self.writer.write(self.session.data_to_send())
+        events = []
+        while len(events) < count:
+            data = await asyncio.wait_for(self.reader.read(65536), 5)
+            assert data
+            events.extend(self.session.receive_data(data))
+            self.writer.write(self.session.data_to_send())
+        return events
+
+    def close(self):
+        self.writer.close()
+
+
+def _run(test, handler, **kwargs):
+    async def main():
+        server = SMSCServer(handler, **kwargs)
+        await server.start('127.0.0.1', 0)
+        try:
+            return await test(server)
+        finally:
+            await server.close()
+
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(main())
+    finally:
+        loop.close()
+
+
+def test_bind_and_submit():
+    received = []
+
+    async def handler(connection, pdu):
+        received.append((connection.system_id, pdu.short_message))
+        return 'id%d' % len(received)
+
+    async def test(server):
+        esme = await ESME().connect(server)
+        esme.session.bind_transmitter(system_id='esme', password='secret')
+        assert [type(e) for e in await esme.events(1)] == [Bound]
+        esme.session.send_message(destination_addr='123', short_message=b'hello')
+        esme.session.send_message(destination_addr='123', short_message=b'world')
+        events = await esme.events(2)
+        esme.close()
+        return events
+
+    events = _run(test, handler)
+
+    assert received == [('esme', b'hello'), ('esme', b'world')]
+    assert [type(e) for e in events] == [MessageSent, MessageSent]
+    assert sorted(e.pdu.message_id for e in events) == [b'id1', b'id2']
+
+
+def test_authentication():
+    async def authenticate(system_id, password):
+        return password == 'secret' or consts.SMPP_ESME_RINVPASWD
+
+    async def test(server):
+        esme = await ESME().connect(server)
+        esme.session.bind_transceiver(system_id='esme', password='wrong')
+        failed = await esme.events(1)
+        esme.session.bind_transceiver(system_id='esme', password='secret')
+        bound = await esme.events(1)
+        esme.close()
+        return failed + bound
+
+    failed, bound = _run(test, None, authenticate=authenticate)
+
+    assert isinstance(failed, ErrorPDU)
+    assert failed.pdu.status == consts.SMPP_ESME_RINVPASWD
+    assert isinstance(bound, Bound)
+
+
+def test_handler_error_and_deliver():
+    responses = []
+
+    async def handler(connection, pdu):
+        if pdu.short_message == b'bad':
+            raise exceptions.PDUError('rejected', consts.SMPP_ESME_RINVDSTADR)
+        responses.append(await connection.deliver(source_addr='123', short_message=b'reply'))
+        return 'id'
+
+    async def test(server):
+        esme = await ESME().connect(server)
+        esme.session.bind_transceiver(system_id='esme', password='secret')
+        await esme.events(1)
+        esme.session.send_message(destination_addr='123', short_message=b'bad')
+        esme.session.send_message(destination_addr='123', short_message=b'good')
+        events = await esme.events(3)
+        # Let the server read the deliver_sm_resp.
+        while not responses:
+            await asyncio.sleep(0.01)
+        esme.close()
+        return events
+
+    events = _run(test, handler)
+
+    assert sorted(type(e).__name__ for e in events) == ['ErrorPDU', 'MessageReceived', 'MessageSent']
+    error = [e for e in events if isinstance(e, ErrorPDU)][0]
+    assert error.pdu.status == consts.SMPP_ESME_RINVDSTADR
+    assert [e for e in events if isinstance(e, MessageReceived)][0].pdu.short_message == b'reply'
+    assert responses[0].command == 'deliver_sm_resp'
+
+
+def test_window_limits_running_handlers():
+    running = []
+    peak = []
+
+    async def handler(connection, pdu):
+        running.append(pdu)
+        peak.append(len(running))
+        await asyncio.sleep(0.01)
+        running.remove(pdu)
+        return 'id'
+
+    async def test(server):
+        esme = await ESME().connect(server)
+        esme.session.bind_transmitter(system_id='esme', password='secret')
+        await esme.events(1)
+        for _ in range(20):
+            esme.session.send_message(destination_addr='123', short_message=b'hi')
+        events = await esme.events(20)
+        esme.close()
+        return events
+
+    events = _run(test, handler, window=3)
+
+    assert len(events) == 20
+    assert max(peak) == 3
+    # window running and window waiting, the rest is throttled.
+    sent = [e for e in events if isinstance(e, MessageSent)]
+    assert len(sent) >= 6
+    assert all(e.pdu.status == consts.SMPP_ESME_RTHROTTLED for e in events if e not in sent)
+
+
+def test_deliver_with_full_window():
+    async def handler(connection, pdu):
+        await connection.deliver(source_addr='123', short_message=pdu.short_message)
+        return 'id'
+
+    async def test(server):
+        esme = await ESME().connect(server)
+        esme.session.bind_transceiver(system_id='esme', password='secret')
+        await esme.events(1)
+        esme.session.send_message(destination_addr='123', short_message=b'one')
+        esme.session.send_message(destination_addr='123', short_message=b'two')
+        events = await esme.events(4)
+        esme.close()
+        return events
+
+    # Reading goes on while the window is full, so deliver_sm_resp gets through.
+    events = _run(test, handler, window=1, response_timeout=2)
+
+    assert sorted(type(e).__name__ for e in events) == [
+        'MessageReceived', 'MessageReceived', 'MessageSent', 'MessageSent']
+    assert all(e.pdu.status == consts.SMPP_ESME_ROK for e in events)
+
+
+def test_unsupported_requests_get_their_response():
+    async def test(server):
+        esme = await ESME().connect(server)
+        esme.session.bind_transmitter(system_id='esme', password='secret')
+        await esme.events(1)
+        p = smpp.make_pdu('query_sm', message_id='1', source_addr='123')
+        p.sequence = 50
+        esme.writer.write(p.generate())
+        events = await esme.events(1)
+        esme.close()
+        return events
+
+    error, = _run(test, None)
+
+    assert error.pdu.command == 'query_sm_resp'
+    assert error.pdu.sequence == 50
+    assert error.pdu.status == consts.SMPP_ESME_RQUERYFAIL
+
+
+def test_keepalive():
+    async def test(server):
+        esme = await ESME().connect(server)
+        esme.session.bind_transceiver(system_id='esme', password='secret')
+        await esme.events(1)
+        # Session answers enquire_link itself and returns no event for it.
+        esme.writer.write(esme.session.data_to_send())
+        data = await asyncio.wait_for(esme.reader.read(65536), 5)
+        esme.session.receive_data(data)
+        esme.writer.write(esme.session.data_to_send())
+        await asyncio.sleep(0.05)
+        esme.close()
+        return data, list(server.connections)
+
+    data, connections = _run(test, None, enquire_link_interval=0.1)
+
+    assert data[4:8] == b'\x00\x00\x00\x15'  # enquire_link
+    assert len(connections) == 1
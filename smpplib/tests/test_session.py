@@ -0,0 +1,163 @@
+import pytest
+
+from smpplib import consts, exceptions
+from smpplib.gsm import make_parts
+from smpplib.reassembly import Reassembler
+from smpplib.session import Session, Bound, ErrorPDU, MessageReceived, MessageSent, PartReceived, Unbound
+from smpplib.smpp import parse_pdus_buffer
+from smpplib.tests.conftest import raw_pdu
+
+
+def _bound_session():
+    session = Session()
+    session.connection_made()
+    bind = session.bind_transceiver(system_id='login', password='secret')
+    session.data_to_send()
+    session.receive_data(raw_pdu('bind_transceiver_resp', bind.sequence))
+    return session
+
+
+def test_bind():
+    session = Session()
+    session.connection_made()
+
+    bind = session.bind_transceiver(system_id='login', password='secret')
+    sent, = parse_pdus_buffer(session.data_to_send())
+    assert sent.command == 'bind_transceiver'
+    assert sent.system_id == b'login'
+
+    event, = session.receive_data(raw_pdu('bind_transceiver_resp', bind.sequence))
+    assert isinstance(event, Bound)
+    assert session.state == consts.SMPP_CLIENT_STATE_BOUND_TRX
+
+
+def test_bind_error_keeps_state():
+    session = Session()
+    session.connection_made()
+    bind = session.bind_transmitter()
+
+    event, = session.receive_data(
+        raw_pdu('bind_transmitter_resp', bind.sequence, status=consts.SMPP_ESME_RBINDFAIL))
+
+    assert isinstance(event, ErrorPDU)
+    assert session.state == consts.SMPP_CLIENT_STATE_OPEN
+
+
+def test_command_not_allowed_in_state():
+    session = Session()
+    session.connection_made()
+
+    with pytest.raises(exceptions.PDUError):
+        session.send_message(short_message=b'hello')
+    assert session.data_to_send() == b''
+
+
+def test_submit_sm():
+    session = _bound_session()
+
+    ssm = session.send_message(destination_addr='123', short_message=b'hello')
+    assert parse_pdus_buffer(session.data_to_send())[0].short_message == b'hello'
+
+    event, = session.receive_data(raw_pdu('submit_sm_resp', ssm.sequence, message_id='id'))
+    assert isinstance(event, MessageSent)
+    assert event.pdu.message_id == b'id'
+
+
+def test_deliver_sm_is_acknowledged():
+    session = _bound_session()
+
+    event, = session.receive_data(raw_pdu('deliver_sm', 77, short_message=b'hi'))
+
+    assert isinstance(event, MessageReceived)
+    resp, = parse_pdus_buffer(session.data_to_send())
+    assert resp.command == 'deliver_sm_resp'
+    assert resp.sequence == 77
+    assert resp.status == consts.SMPP_ESME_ROK
+
+
+def test_deliver_sm_manual_ack():
+    session = _bound_session()
+    session.auto_ack_deliver_sm = False
+
+    event, = session.receive_data(raw_pdu('deliver_sm', 77, short_message=b'hi'))
+    assert session.data_to_send() == b''
+
+    session.respond(event.pdu, status=consts.SMPP_ESME_RX_T_APPN)
+    resp, = parse_pdus_buffer(session.data_to_send())
+    assert resp.status == consts.SMPP_ESME_RX_T_APPN
+
+
+def test_deliver_sm_reassembled():
+    session = _bound_session()
+    session.reassembler = Reassembler()
+    parts, encoding, esm_class = make_parts(u'a' * 200)
+
+    assert session.receive_data(raw_pdu(
+        'deliver_sm', 1, short_message=parts[0], data_coding=encoding, esm_class=esm_class)) == []
+    event, = session.receive_data(raw_pdu(
+        'deliver_sm', 2, short_message=parts[1], data_coding=encoding, esm_class=esm_class))
+
+    assert isinstance(event, MessageReceived)
+    assert event.message.text == u'a' * 200
+    assert [resp.sequence for resp in parse_pdus_buffer(session.data_to_send())] == [1, 2]
+
+
+def test_deliver_sm_reassembled_manual_ack():
+    session = _bound_session()
+    session.auto_ack_deliver_sm = False
+    session.reassembler = Reassembler()
+    parts, encoding, esm_class = make_parts(u'a' * 200)
+
+    part, = session.receive_data(raw_pdu(
+        'deliver_sm', 1, short_message=parts[0], data_coding=encoding, esm_class=esm_class))
+    event, = session.receive_data(raw_pdu(
+        'deliver_sm', 2, short_message=parts[1], data_coding=encoding, esm_class=esm_class))
+    assert isinstance(part, PartReceived)
+    assert isinstance(event, MessageReceived)
+    assert event.message.text == u'a' * 200
+    assert session.data_to_send() == b''
+
+    session.respond(part.pdu)
+    session.respond(event.pdu)
+    assert [resp.sequence for resp in parse_pdus_buffer(session.data_to_send())] == [1, 2]
+
+
+def test_enquire_link_is_answered_without_event():
+    session = _bound_session()
+
+    data = raw_pdu('enquire_link', 5)
+    assert session.receive_data(data[:7]) == []
+    assert session.receive_data(data[7:]) == []
+
+    resp, = parse_pdus_buffer(session.data_to_send())
+    assert resp.command == 'enquire_link_resp'
+    assert resp.sequence == 5
+
+
+def test_unbind_from_smsc():
+    session = _bound_session()
+
+    event, = session.receive_data(raw_pdu('unbind', 9))
+
+    assert isinstance(event, Unbound)
+    assert session.state == consts.SMPP_CLIENT_STATE_OPEN
+    assert parse_pdus_buffer(session.data_to_send())[0].command == 'unbind_resp'
+
+
+def test_send_text_message_payload_fallback():
+    session = _bound_session()
+    session.message_payload = True
+
+    ssm, = session.send_text(u'@' * 400, destination_addr='123')
+    sent, = parse_pdus_buffer(session.data_to_send())
+    assert sent.message_payload == b'\x00' * 400
+
+    events = session.receive_data(raw_pdu(
+        'submit_sm_resp', ssm.sequence, status=consts.SMPP_ESME_ROPTPARNOTALLWD))
+
+    assert events == []
+    assert session.message_payload is False
+    parts = parse_pdus_buffer(session.data_to_send())
+    assert len(parts) == 3
+    assert all(p.destination_addr == b'123' for p in parts)
+    assert all(p.esm_class == consts.SMPP_GSMFEAT_UDHI for p in parts)
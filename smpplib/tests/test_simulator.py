@@ -0,0 +1,80 @@
+import pytest
+
+from smpplib import consts, exceptions
+from smpplib.client import Client
+from smpplib.simulator import SMSCSimulator
+
+
+def _client(smsc, **kwargs):
+    client = Client(*smsc.address, timeout=5, allow_unknown_opt_params=True, **kwargs)
+    client.connect()
+    return client
+
+
+def _submit(client, **kwargs):
+    client.send_message(source_addr='Sender', destination_addr='447700900123', short_message=b'hello', **kwargs)
+    return client.read_pdu()
+
+
+def test_bind_submit_and_receipt():
+    with SMSCSimulator() as smsc:
+        client = _client(smsc)
+        client.bind_transceiver(system_id='esme', password='secret')
+
+        resp = _submit(client, registered_delivery=1)
+        receipt = client.read_pdu()
+        client.disconnect()
+
+    assert resp.command == 'submit_sm_resp'
+    assert resp.status == consts.SMPP_ESME_ROK
+    assert resp.message_id == b'0000000001'
+    assert receipt.command == 'deliver_sm'
+    assert receipt.esm_class == consts.SMPP_MSGTYPE_SMSC_RECEIPT
+    assert receipt.receipted_message_id == b'0000000001'
+    assert receipt.message_state == consts.SMPP_MESSAGE_STATE_DELIVERED
+    assert b'stat:DELIVRD' in receipt.short_message
+    assert receipt.source_addr == b'447700900123'
+    assert smsc.stats['receipts'] == 1
+
+
+def test_bind_credentials():
+    with SMSCSimulator(credentials={'esme': 'secret'}) as smsc:
+        client = _client(smsc)
+        with pytest.raises(exceptions.PDUError) as exc_info:
+            client.bind_transmitter(system_id='esme', password='wrong')
+        client.bind_transmitter(system_id='esme', password='secret')
+        client.disconnect()
+
+    assert exc_info.value.args[1] == consts.SMPP_ESME_RINVPASWD
+    assert smsc.stats['bind_failures'] == 1
+    assert smsc.stats['binds'] == 1
+
+
+def test_throttling_and_errors():
+    with SMSCSimulator(max_rate=2, error_rate=1, error_statuses=(consts.SMPP_ESME_RSYSERR,)) as smsc:
+        client = _client(smsc)
+        client.bind_transmitter(system_id='esme', password='secret')
+        statuses = [_submit(client).status for _ in range(3)]
+        client.disconnect()
+
+    assert statuses == [consts.SMPP_ESME_RSYSERR, consts.SMPP_ESME_RSYSERR, consts.SMPP_ESME_RTHROTTLED]
+
+
+def test_partial_writes():
+    with SMSCSimulator(max_write_size=3, seed=1) as smsc:
+        client = _client(smsc)
+        client.bind_transmitter(system_id='esme', password='secret')
+        resp = _submit(client)
+        client.disconnect()
+
+    assert resp.message_id == b'0000000001'
+
+
+def test_dropped_connection():
+    with SMSCSimulator(drop_rate=1) as smsc:
+        client = _client(smsc)
+        with pytest.raises(exceptions.ConnectionError):
+            client.bind_transmitter(system_id='esme', password='secret')
+        client.disconnect()
+
+    assert smsc.stats['dropped'] == 1
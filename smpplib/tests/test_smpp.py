@@ -0,0 +1,92 @@
+import pytest
+
+from smpplib import consts, exceptions
+from smpplib.gsm import ReferenceAllocator
+from smpplib.smpp import make_pdu, make_pdus_buffer, make_text_params, iter_parse_pdus_buffer, parse_pdus_buffer
+
+
+def test_make_pdus_buffer():
+    messages = [
+        {'destination_addr': '123', 'short_message': b'hello'},
+        {'destination_addr': '456', 'short_message': b'world!'},
+    ]
+
+    data, offsets = make_pdus_buffer(messages, source_addr='src')
+
+    expected = [
+        make_pdu('submit_sm', source_addr='src', **message).generate()
+        for message in messages
+    ]
+    assert data == b''.join(expected)
+    assert list(offsets) == [0, len(expected[0])]
+
+
+def test_parse_pdus_buffer_roundtrip():
+    messages = [{'short_message': b'x' * n} for n in range(1, 5)]
+    data, offsets = make_pdus_buffer(messages)
+
+    parsed = parse_pdus_buffer(data)
+
+    assert [p.command for p in parsed] == ['submit_sm'] * 4
+    assert [p.short_message for p in parsed] == [b'x', b'xx', b'xxx', b'xxxx']
+    assert [p.sm_length for p in parse_pdus_buffer(data, offsets)] == [1, 2, 3, 4]
+
+
+def test_iter_parse_pdus_buffer_mixed_commands():
+    data = make_pdu('enquire_link').generate() + make_pdu('submit_sm_resp', message_id='id').generate()
+
+    parsed = iter_parse_pdus_buffer(data)
+
+    assert next(parsed).command == 'enquire_link'
+    assert next(parsed).message_id == b'id'
+    with pytest.raises(StopIteration):
+        next(parsed)
+
+
+def test_parse_pdus_buffer_truncated():
+    data, _ = make_pdus_buffer([{'short_message': b'hello'}])
+
+    with pytest.raises(exceptions.PDUError):
+        parse_pdus_buffer(data[:-1])
+
+
+@pytest.mark.parametrize('offset', [-1, 4, 1000])
+def test_parse_pdus_buffer_offset_out_of_range(offset):
+    data, _ = make_pdus_buffer([{'short_message': b'hello'}])
+
+    with pytest.raises(exceptions.PDUError):
+        parse_pdus_buffer(data, [0, len(data) - offset if offset > 0 else offset])
+
+
+def test_parse_pdus_buffer_trailing_bytes():
+    data, _ = make_pdus_buffer([{'short_message': b'hello'}])
+
+    with pytest.raises(exceptions.PDUError):
+        parse_pdus_buffer(data + b'\x00\x00')
+
+
+def test_make_text_params_message_payload():
+    params, = make_text_params(u'@' * 400, message_payload=True)
+
+    assert params == {
+        'message_payload': b'\x00' * 400,
+        'data_coding': consts.SMPP_ENCODING_DEFAULT,
+        'esm_class': consts.SMPP_MSGTYPE_DEFAULT,
+    }
+    p = make_pdu('submit_sm', destination_addr='123', **params)
+    assert parse_pdus_buffer(p.generate())[0].message_payload == b'\x00' * 400
+
+
+def test_make_text_params_short_text_ignores_message_payload():
+    params, = make_text_params(u'hello', message_payload=True)
+
+    assert params['short_message'] == b'hello'
+
+
+def test_make_text_params_sar():
+    params = make_text_params(u'@' * 400, use_udhi=False, references=ReferenceAllocator(bits=16))
+
+    assert len(params) == 3
+    assert len(set(p['sar_msg_ref_num'] for p in params)) == 1
+    assert [(p['sar_total_segments'], p['sar_segment_seqnum']) for p in params] == [(3, 1), (3, 2), (3, 3)]
+    assert all(p['esm_class'] == consts.SMPP_MSGTYPE_DEFAULT for p in params)
@@ -0,0 +1,17 @@
+from smpplib import consts, smsc_common
+
+
+def test_bind_status():
+    credentials = {'esme': 'secret'}
+    open_state = consts.SMPP_CLIENT_STATE_OPEN
+
+    assert smsc_common.bind_status(open_state) == consts.SMPP_ESME_ROK
+    assert smsc_common.bind_status(open_state, None) == consts.SMPP_ESME_RBINDFAIL
+    assert smsc_common.bind_status(consts.SMPP_CLIENT_STATE_BOUND_TX) == consts.SMPP_ESME_RALYBND
+    assert smsc_common.bind_status(
+        open_state, smsc_common.check_credentials(credentials, 'esme', 'secret')) == consts.SMPP_ESME_ROK
+    assert smsc_common.bind_status(
+        open_state, smsc_common.check_credentials(credentials, 'esme', 'guess')) == consts.SMPP_ESME_RINVPASWD
+    assert smsc_common.bind_status(
+        open_state, smsc_common.check_credentials(credentials, 'other', 'secret')) == consts.SMPP_ESME_RINVSYSID
+    assert smsc_common.check_credentials(None, 'anyone', '') is True